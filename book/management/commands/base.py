@@ -1,21 +1,52 @@
 import csv
-from distutils.dir_util import copy_tree
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from os.path import isfile, join
-from subprocess import call
 from tempfile import mkdtemp
 
 from django.conf import settings
-from django.core import sort_by
 from django.core.management.base import CommandError
 from django.template import Template
-from django.utils import translation
+from django.utils import timezone, translation
 
 from django_countries import countries
 
+from core.utils import sort_by
 from hosting.models import Place
 
 COUNTRIES_WITH_REGIONS = ('BE', 'BR', 'CA', 'DE', 'FR', 'GB', 'US')
 
+TEMPLATES_DIR = 'book/templates/book/'
+
+
+def compile_pdf(build_dir: str, passes: int) -> tuple[bool, float]:
+    """
+    Runs XeLaTeX on the prepared directory (in a worker process) and returns
+    whether the PDF was generated, together with the duration of the runs.
+    """
+    start = time.perf_counter()
+    for _ in range(passes):
+        subprocess.run(
+            ['xelatex', '-interaction=nonstopmode', 'PasportaServo.tex'],
+            cwd=build_dir,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return isfile(join(build_dir, 'PasportaServo.pdf')), time.perf_counter() - start
+
+
+def _link_or_copy(source: str, destination: str):
+    # The static assets are not modified, thus can be shared with the templates.
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
 
 class LatexCommand(object):
     template_name = 'PasportaServo.tex'
@@ -27,83 +58,223 @@ class LatexCommand(object):
         'pages/address.tex',
     ]
 
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        if self.address_only:
+            parser.add_argument(
+                '--jobs', '-j',
+                type=int, default=os.cpu_count(),
+                help="number of countries compiled in parallel (default: number of CPUs).")
+            parser.add_argument(
+                '--force',
+                action='store_true',
+                help="build also the countries whose data did not change since the last build.")
+            parser.add_argument(
+                '--build-dir',
+                default=settings.BOOK_BUILD_DIR,
+                help="directory of the per-country builds and their manifest.")
+
     def activate_translation(self):
         translation.activate(settings.LANGUAGE_CODE)
 
-    def handle(self, *args, **options):
+    def handle(self, *labels, **options):
         self.activate_translation()
-        super().handle(*args, **options)
-
-    def handle_label(self, country, **options):
-        self.country = country.upper()
-        if self.country == 'ALL':
-            self.countries = sorted(set(
-                Place.objects
-                .filter(in_book=True, visibility__visible_in_book=True, checked=True)
-                .values_list('country', flat=True)
-            ))
-            for country in self.countries[:8]:
-                print(country)
-                self.country = country
-                self.make()
-            return
-        if self.country not in countries:
-            raise CommandError("Unknown country: {}".format(self.country))
-        self.make()
+        if not self.address_only:
+            return super().handle(*labels, **options)
+        self.make_countries(self.get_countries(labels), options)
+
+    def get_countries(self, labels):
+        selected_countries = []
+        for label in labels:
+            country = label.upper()
+            if country == 'ALL':
+                selected_countries.extend(
+                    Place.objects
+                    .filter(in_book=True, visibility__visible_in_book=True, checked=True)
+                    .values_list('country', flat=True)
+                    .distinct()
+                )
+            elif country not in countries:
+                raise CommandError("Unknown country: {}".format(country))
+            else:
+                selected_countries.append(country)
+        return sorted(set(selected_countries))
 
     def make(self):
-        prefix = 'ps-{}-'.format(self.country) if self.address_only else 'ps-'
-        tempdir = mkdtemp(prefix=prefix)
+        tempdir = mkdtemp(prefix='ps-')
         print('Copying in temp directory', tempdir)
-        copy_tree('book/templates/book/', tempdir)
-        self.context = self.get_context_data()
+        shutil.copytree(TEMPLATES_DIR, tempdir, dirs_exist_ok=True)
+        self.context = self.get_context_data(self.get_objects())
         print('Exportorting latlng.csv...')
         self.export_latlng(tempdir)
         print('Rendering Tex files...')
         for template_name in self.tex_files:
             self.render_tex(tempdir, template_name)
         if self.make_pdf:
-            n = 1 if self.address_only else 2
-            for i in range(n):
-                call(['xelatex', 'PasportaServo.tex'], cwd=tempdir)
-            if not isfile(join(tempdir, 'PasportaServo.pdf')):
+            success, _ = compile_pdf(tempdir, 2)
+            if not success:
                 print('\nCould not generate the PDF')
             else:
-                call(['evince', 'PasportaServo.pdf'], cwd=tempdir)
+                subprocess.call(['evince', 'PasportaServo.pdf'], cwd=tempdir)
             print('\n', tempdir)
 
+    def make_countries(self, selected_countries, options):
+        """
+        Builds the address pages of each of the countries in its own directory.
+        The places are fetched all at once; the pages are rendered in order and
+        compiled in parallel. A country is skipped when the rendered pages and
+        the templates did not change since its last build (as recorded in the
+        manifest of the build directory).
+        """
+        build_dir = options['build_dir']
+        os.makedirs(build_dir, exist_ok=True)
+        manifest_path = join(build_dir, 'manifest.json')
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        templates_fingerprint = self.get_templates_fingerprint()
+        output_name = 'PasportaServo.pdf' if self.make_pdf else 'PasportaServo.tex'
+
+        places_by_country = defaultdict(list)
+        for place in self.get_objects(selected_countries):
+            places_by_country[place.country.code].append(place)
+
+        pending_compilation = {}
+        for country in selected_countries:
+            start = time.perf_counter()
+            self.context = self.get_context_data(places_by_country[country])
+            sources = {
+                template_name: self.render_tex_source(template_name)
+                for template_name in self.tex_files
+            }
+            sources['latlng.csv'] = self.get_latlng_csv()
+            data_hash = hashlib.sha256(templates_fingerprint.encode())
+            data_hash.update(b'pdf' if self.make_pdf else b'tex')
+            for name in sorted(sources):
+                data_hash.update(name.encode() + b'\0' + sources[name].encode() + b'\0')
+            previous_build = manifest.get(country, {})
+            if (not options['force']
+                    and previous_build.get('hash') == data_hash.hexdigest()
+                    and previous_build.get('status') == 'built'
+                    and isfile(join(build_dir, previous_build['output']))):
+                print(country, 'unchanged, skipped')
+                continue
+
+            country_dir = join(build_dir, country)
+            shutil.rmtree(country_dir, ignore_errors=True)
+            shutil.copytree(TEMPLATES_DIR, country_dir, copy_function=_link_or_copy)
+            for name, content in sources.items():
+                if os.path.exists(join(country_dir, name)):
+                    # The linked template is replaced rather than overwritten.
+                    os.unlink(join(country_dir, name))
+                with open(join(country_dir, name), 'w') as f:
+                    f.write(content)
+            manifest[country] = {
+                'hash': data_hash.hexdigest(),
+                'output': join(country, output_name),
+                'places': len(places_by_country[country]),
+                'built_on': timezone.now().isoformat(),
+                'render_duration': round(time.perf_counter() - start, 3),
+                'compile_duration': None,
+                'status': 'built',
+            }
+            if self.make_pdf:
+                manifest[country]['status'] = 'pending'
+                pending_compilation[country] = country_dir
+            print(country, 'rendered')
+
+        if pending_compilation:
+            with ProcessPoolExecutor(max_workers=max(1, options['jobs'])) as pool:
+                compilations = {
+                    pool.submit(compile_pdf, country_dir, 1): country
+                    for country, country_dir in pending_compilation.items()
+                }
+                for compilation in as_completed(compilations):
+                    country = compilations[compilation]
+                    success, duration = compilation.result()
+                    manifest[country]['compile_duration'] = round(duration, 3)
+                    manifest[country]['status'] = 'built' if success else 'failed'
+                    print(country, 'compiled' if success else 'could not generate the PDF')
+
+        with open(f'{manifest_path}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(f'{manifest_path}.tmp', manifest_path)
+
+        print(f"\n{'country':<8} {'places':>6} {'render (s)':>11} {'compile (s)':>12}  output")
+        for country in selected_countries:
+            build = manifest.get(country, {})
+            print(
+                f"{country:<8} {build.get('places', 0):>6} {build.get('render_duration') or 0:>11.2f} "
+                f"{build.get('compile_duration') or 0:>12.2f}  "
+                + (join(build_dir, build['output']) if build.get('status') == 'built' else build.get('status', '-'))
+            )
+
+    def get_templates_fingerprint(self):
+        """
+        Identifies the current state of the templates and the static assets,
+        by the names, sizes and modification times of the files.
+        """
+        fingerprint = hashlib.sha256()
+        for directory, dirnames, filenames in sorted(os.walk(TEMPLATES_DIR)):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_stat = os.stat(join(directory, filename))
+                fingerprint.update(f'{directory}/{filename}:{file_stat.st_size}:{file_stat.st_mtime_ns};'.encode())
+        return fingerprint.hexdigest()
+
+    def get_latlng_csv(self):
+        output = io.StringIO()
+        writer = csv.DictWriter(output, ['lat', 'lng'])
+        writer.writeheader()
+        for place in self.context['places']:
+            if place.location and all(place.location.coords):
+                writer.writerow({'lat': place.location.y, 'lng': place.location.x})
+        return output.getvalue()
+
     def export_latlng(self, tempdir):
         with open(join(tempdir, 'latlng.csv'), 'w') as f:
-            writer = csv.DictWriter(f, ['lat', 'lng'])
-            writer.writeheader()
-            for place in self.context['places']:
-                if place.location and all(place.location.coords):
-                    writer.writerow({'lat': place.location.y, 'lng': place.location.x})
+            f.write(self.get_latlng_csv())
 
-    def get_objects(self):
+    def get_objects(self, selected_countries=None):
         print('Grabbing data...')
         conditions = dict(
             in_book=True, visibility__visible_in_book=True,
             owner__death_date__isnull=True,
             checked=True,
         )
-        places = Place.objects.filter(**conditions).order_by('city')
-        if self.address_only:
-            print('  for', self.country)
-            places = places.filter(country=self.country)
-        return sort_by(["closest_city", "subregion.translated_or_latin_name", "country.name"], places)
+        places = (
+            Place.objects
+            .filter(**conditions)
+            .select_related('owner__user')
+            .prefetch_related('family_members', 'owner__phones', 'conditions')
+            .order_by('city')
+        )
+        if selected_countries is not None:
+            print('  for', ', '.join(selected_countries))
+            places = places.filter(country__in=selected_countries)
+        # The regions are resolved at once instead of for each place.
+        places = list(places.with_subregions())
+        return list(sort_by(["closest_city", "subregion.translated_or_latin_name", "country.name"], places))
 
-    def get_context_data(self):
+    def get_context_data(self, places):
         return {
             'year': 2017,
-            'places': self.get_objects(),
+            'places': places,
             'INVALID_PREFIX': settings.INVALID_PREFIX,
             'ADDRESS_ONLY': self.address_only,
             'COUNTRIES_WITH_REGIONS': COUNTRIES_WITH_REGIONS,
         }
 
+    def render_tex_source(self, template_name):
+        # The templates are compiled once, and rendered for each country.
+        templates = self.__dict__.setdefault('_templates', {})
+        if template_name not in templates:
+            with open(join(TEMPLATES_DIR, template_name), 'r') as f:
+                templates[template_name] = Template(f.read())
+        return templates[template_name].render(self.context)
+
     def render_tex(self, tmp, template_name):
-        with open(join(tmp, template_name), 'r') as f:
-            template = Template(f.read())
         with open(join(tmp, template_name), 'w') as f:
-            f.write(template.render(self.context))
+            f.write(self.render_tex_source(template_name))
@@ -4,5 +4,5 @@ from .base import LatexCommand
 
 
 class Command(LatexCommand, LabelCommand):
-    help = """Usage: ./manage.py makelatexfor FR DE HU"""
+    help = """Usage: ./manage.py makelatexfor FR DE HU (or ALL)"""
     address_only = True
@@ -4,6 +4,6 @@ from .base import LatexCommand
 
 
 class Command(LatexCommand, LabelCommand):
-    help = """Usage: ./manage.py makepdffor FR DE HU"""
+    help = """Usage: ./manage.py makepdffor FR DE HU (or ALL)"""
     make_pdf = True
     address_only = True
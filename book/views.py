@@ -1,22 +1,33 @@
 import csv
-import tempfile
-from os.path import join
 
 from django.conf import settings
-from django.db.models import Q
-from django.http.response import HttpResponse
+from django.db.models import Prefetch, Q
+from django.http.response import StreamingHttpResponse
 from django.template.defaultfilters import yesno
 from django.utils.translation import gettext_lazy as _
 from django.views import generic
 
 from core.auth import AuthMixin, AuthRole
-from hosting.models import Place
+from core.models import SiteConfiguration
+from hosting.models import CountryRegion, Phone, Place, Profile
 from links.utils import create_unique_url
 
 
+class EchoBuffer:
+    """
+    A file-like object which returns the written value instead of storing it,
+    to allow the CSV writer to produce the rows one by one.
+    """
+    def write(self, value):
+        return value
+
+
 class ContactExportView(AuthMixin, generic.ListView):
-    response_class = HttpResponse
+    response_class = StreamingHttpResponse
     content_type = 'text/csv'
+    # The places are fetched from the database in chunks, each with the
+    # related objects prefetched in bulk.
+    chunk_size = 500
     display_permission_denied = False
     exact_role = AuthRole.ADMIN
 
@@ -35,7 +46,21 @@ class ContactExportView(AuthMixin, generic.ListView):
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        places = Place.objects.prefetch_related('owner__user')
+        places = (
+            Place.objects
+            .select_related('owner__user')
+            .prefetch_related(
+                Prefetch(
+                    'owner__phones',
+                    queryset=Phone.objects.all(),
+                    to_attr='export_phones'),
+                Prefetch(
+                    'family_members',
+                    queryset=Profile.all_objects.select_related('user').order_by('birth_date'),
+                    to_attr='export_family_members'),
+                'conditions',
+            )
+        )
         places = places.filter(available=True).exclude(
             Q(owner__user__email__startswith=settings.INVALID_PREFIX)
             | Q(owner__death_date__isnull=False)
@@ -44,21 +69,19 @@ class ContactExportView(AuthMixin, generic.ListView):
 
     def render_to_response(self, context, **response_kwargs):
         response_kwargs.setdefault('content_type', self.content_type)
-        response = self.response_class(**response_kwargs)
-        csv_file = self.generate_csv(context)
-        response.write(csv_file)
-        return response
+        return self.response_class(self.generate_csv(context), **response_kwargs)
 
     def generate_csv(self, context):
-        with tempfile.TemporaryDirectory() as tempdir:
-            with open(join(tempdir, 'contacts.csv'), 'w+') as f:
-                writer = csv.writer(f)
-                writer.writerow(self.user_fields + self.owner_fields + self.place_fields + self.other_fields)
-                for place in context['place_list']:
-                    row = self.get_row(place)
-                    writer.writerow(row)
-                f.seek(0)
-                return f.read()
+        self.region_names = {
+            (country, iso_code): latin_code
+            for country, iso_code, latin_code
+            in CountryRegion.objects.values_list('country', 'iso_code', 'latin_code')
+        }
+        self.url_salt = SiteConfiguration.get_solo().salt
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(self.user_fields + self.owner_fields + self.place_fields + self.other_fields)
+        for place in context['place_list'].iterator(chunk_size=self.chunk_size):
+            yield writer.writerow(self.get_row(place))
 
     def get_row(self, place):
         from_user, from_owner, from_place = [], [], []
@@ -66,9 +89,12 @@ class ContactExportView(AuthMixin, generic.ListView):
         from_owner = self.build_row(place.owner, self.owner_fields)
         from_place = self.build_row(place, self.place_fields)
         others = [
-            place.owner.rawdisplay_phones(),
-            place.rawdisplay_family_members(),
-            place.rawdisplay_conditions(),
+            ", ".join(phone.rawdisplay() for phone in place.owner.export_phones),
+            ", ".join(
+                member.rawdisplay() for member in place.export_family_members
+                if member.pk != place.owner_id
+            ),
+            ", ".join(str(condition) for condition in place.conditions.all()),
             self.get_url(place, 'update'),
             self.get_url(place, 'confirm'),
         ]
@@ -88,11 +114,11 @@ class ContactExportView(AuthMixin, generic.ListView):
                 if f == 'postcode':
                     value = obj.get_postcode_display()
                 if f == 'state_province':
-                    value = obj.subregion.latin_code
+                    value = self.region_names.get((obj.country.code, value), value)
                 if f == 'confirmed_on':
                     value = "01/01/1970"
                 row.append(value.strip() if isinstance(value, str) else value)
         return row
 
     def get_url(self, place, action):
-        return create_unique_url({'place': place.pk, 'action': action})[0]
+        return create_unique_url({'place': place.pk, 'action': action}, salt=self.url_salt)[0]
@@ -1,5 +1,6 @@
 from django.apps import AppConfig
 from django.conf import settings
+from django.db.models import signals
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
@@ -12,6 +13,14 @@ class ChatConfig(AppConfig):
     name = "chat"
     verbose_name = _("Communicator")
 
+    def ready(self):
+        # The cached numbers of unread messages are discarded when the messages change.
+        from .unread import message_changed
+        signals.post_save.connect(
+            message_changed, sender='postman.Message', dispatch_uid='unread-count--save')
+        signals.post_delete.connect(
+            message_changed, sender='postman.Message', dispatch_uid='unread-count--delete')
+
 
 @receiver(pre_send)
 def enrich_envelope(sender: type[AnymailBaseBackend], message: AnymailMessage, **kwargs):
@@ -0,0 +1,14 @@
+from django.utils.functional import lazy
+
+from .unread import get_unread_count
+
+
+def inbox(request):
+    """
+    Provides the number of unread messages of an authenticated user, similar to
+    `postman.context_processors.inbox`, but from the cache.
+    """
+    if request.user.is_authenticated:
+        return {'postman_unread_count': lazy(get_unread_count, int)(request.user)}
+    else:
+        return {}
@@ -0,0 +1,49 @@
+"""
+Number of unread messages in the inbox of each user, kept in the cache so that
+rendering the pages (which show this number in the header) does not query the
+messages. The number is discarded whenever the messages of the user change: by
+saving or deleting a message, and by the actions in the message views which
+update the messages directly in the database (reading, archiving, deleting,
+undeleting, and marking as read or unread).
+"""
+
+from collections.abc import Iterable
+
+from django.contrib.auth.models import AbstractBaseUser
+from django.core.cache import cache
+from django.db import transaction
+
+from postman.models import Message
+
+# The number is re-counted from time to time in any case, in case a change was
+# made some other way.
+UNREAD_COUNT_CACHE_TIMEOUT = 3600
+
+
+def unread_count_cache_key(user_pk: int) -> str:
+    return f'postman-unread-count:{user_pk}'
+
+
+def get_unread_count(user: AbstractBaseUser) -> int:
+    cache_key = unread_count_cache_key(user.pk)
+    unread_count = cache.get(cache_key)
+    if unread_count is None:
+        unread_count = Message.objects.inbox_unread_count(user)
+        cache.set(cache_key, unread_count, UNREAD_COUNT_CACHE_TIMEOUT)
+    return unread_count
+
+
+def forget_unread_count(user_pks: Iterable[int | None]):
+    """
+    Discards the numbers of unread messages of the given users, now and once
+    the current transaction is committed.
+    """
+    cache_keys = [unread_count_cache_key(user_pk) for user_pk in set(user_pks) if user_pk is not None]
+    if not cache_keys:
+        return
+    cache.delete_many(cache_keys)
+    transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+def message_changed(sender, instance: Message, **kwargs):
+    forget_unread_count([instance.recipient_id])
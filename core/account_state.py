@@ -0,0 +1,55 @@
+"""
+The data about the user's account which the checks of each request depend on
+(see `core.middleware.AccountFlagsMiddleware`), kept in the cache.
+"""
+
+from datetime import date
+from typing import TypedDict
+
+from django.core.cache import cache
+
+from hosting.models import Profile
+
+from .models import Agreement
+
+
+class AccountState(TypedDict):
+    has_profile: bool
+    birth_date: date | None
+    agreements: list[str]
+
+
+ACCOUNT_STATE_CACHE_KEY = 'account-state_{user_id}'
+
+
+def get_account_state(user) -> AccountState:
+    """
+    Returns the data about the user's account that the checks of the
+    AccountFlagsMiddleware depend on. The data is kept in the cache until
+    the user's profile or agreements change (see `core.hooks`).
+    """
+    cache_key = ACCOUNT_STATE_CACHE_KEY.format(user_id=user.pk)
+    state: AccountState | None = cache.get(cache_key)
+    if state is None:
+        birth_date = Profile.all_objects.filter(user=user).values_list('birth_date', flat=True)[0:1]
+        state = {
+            # For users with a profile, the result will not be empty and will
+            # hold some value (either a date or None).
+            'has_profile': len(birth_date) > 0,
+            'birth_date': birth_date[0] if birth_date else None,
+            'agreements': list(
+                Agreement.objects
+                .filter(
+                    user=user,
+                    withdrawn__isnull=True,
+                )
+                .order_by('-created')
+                .values_list('policy_version', flat=True)
+            ),
+        }
+        cache.set(cache_key, state, 7 * 24 * 60 * 60)
+    return state
+
+
+def invalidate_account_state(user_id: int):
+    cache.delete(ACCOUNT_STATE_CACHE_KEY.format(user_id=user_id))
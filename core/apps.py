@@ -1,10 +1,9 @@
 from django.apps import AppConfig
 from django.conf import settings
+from django.db.models import signals
 from django.utils.translation import gettext_lazy as _
 
-from gql import Client as GQLClient, gql
-from gql.transport.exceptions import TransportError, TransportQueryError
-from gql.transport.requests import RequestsHTTPTransport as GQLHttpTransport
+from gql import gql
 
 
 class CoreConfig(AppConfig):
@@ -12,18 +11,26 @@ class CoreConfig(AppConfig):
     verbose_name = _("Hosting Service Core")
 
     def ready(self):
-        # Connect the signals.
+        # The cached flat pages and compiled templates are discarded when the
+        # pages or the policies change.
+        from .flatpages import flat_page_changed, forget_compiled_templates
+        for sender, receiver_func, uid in (
+                ('flatpages.FlatPage', flat_page_changed, 'flat-pages'),
+                ('core.Policy', forget_compiled_templates, 'policies')):
+            signals.post_save.connect(receiver_func, sender=sender, dispatch_uid=f'{uid}--save')
+            signals.post_delete.connect(receiver_func, sender=sender, dispatch_uid=f'{uid}--delete')
+
+        # Connect the other signals.
         from . import hooks  # noqa: F401
 
         if getattr(settings, 'GITHUB_DISABLE_PREFETCH', False):
             return
 
         # Iterate over the user feedback endpoints enabled and fetch their
-        # current URLs from the remote forum (GitHub at present).
+        # current URLs from the remote forum (GitHub at present). The shared
+        # client is used, so that its connection is ready for the feedback.
+        from .feedback import GRAPHQL_ERRORS, github_client
         from .models import FEEDBACK_TYPES
-        transport = GQLHttpTransport(
-            settings.GITHUB_GRAPHQL_HOST, auth=settings.GITHUB_ACCESS_TOKEN)
-        client = GQLClient(transport=transport, fetch_schema_from_transport=True)
         query = gql("""
             query($disc_id: ID!) {
                 node (id: $disc_id) { ... on Discussion {
@@ -33,10 +40,10 @@ class CoreConfig(AppConfig):
         """)
         for feedback_key, feedback in FEEDBACK_TYPES.items():
             try:
-                discussion = client.execute(
+                discussion = github_client.execute(
                     query,
                     variable_values={'disc_id': feedback.foreign_id})
-            except (TransportError, TransportQueryError):
+            except GRAPHQL_ERRORS:
                 pass
             else:
                 FEEDBACK_TYPES[feedback_key] = (
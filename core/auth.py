@@ -2,9 +2,12 @@ import logging
 import re
 import types
 import warnings
+from collections import defaultdict
 from enum import Enum
 from functools import total_ordering
-from typing import TYPE_CHECKING, Final, Literal, Optional, Self, Union, cast
+from typing import (
+    TYPE_CHECKING, Final, Iterable, Literal, Optional, Self, Union, cast,
+)
 
 from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
@@ -17,6 +20,7 @@ from django.utils.text import format_lazy
 from django.utils.translation import gettext_lazy as _
 from django.views import generic
 
+from asgiref.local import Local
 from django_countries.fields import Country
 
 from . import PasportaServoHttpRequest
@@ -34,6 +38,7 @@ else:
 
 
 auth_log = logging.getLogger('PasportaServo.auth')
+_request_scope = Local()
 
 
 PERM_SUPERVISOR: Final = 'hosting.can_supervise'
@@ -117,6 +122,87 @@ class AuthRole(Enum):
 AuthRole.do_not_call_in_templates = True  # noqa:E305
 
 
+class AuthorizationContext:
+    """
+    The countries on which the authorization checks depend, resolved once per
+    request: those supervised by each user, and those of the (not deleted)
+    places of each profile. The profiles of a list can be registered upfront,
+    so that the countries of all of them are resolved in a single query once
+    any of them is needed.
+    """
+
+    def __init__(self):
+        self.supervised_countries: dict[int, frozenset[Country]] = {}
+        self.profile_countries: dict[int, frozenset[str]] = {}
+        self.pending_profiles: set[int] = set()
+
+    def get_supervised_countries(self, user_obj: 'PasportaServoUser') -> frozenset[Country]:
+        if user_obj.pk not in self.supervised_countries:
+            user_groups = user_obj.groups.all() if not user_obj.is_superuser else Group.objects.all()
+            self.supervised_countries[user_obj.pk] = frozenset(
+                Country(g.name) for g in user_groups if len(g.name) == 2)
+        return self.supervised_countries[user_obj.pk]
+
+    def get_profile_countries(self, profile: 'Profile') -> frozenset[str]:
+        if profile.pk is None:
+            return frozenset()
+        if profile.pk not in self.profile_countries:
+            self.pending_profiles.add(profile.pk)
+            self.resolve_pending_profiles()
+        return self.profile_countries[profile.pk]
+
+    def prefetch_profiles(self, profiles: Iterable['Profile | int | None']):
+        self.pending_profiles.update(
+            profile.pk if hasattr(profile, 'pk') else profile for profile in profiles)
+        self.pending_profiles.discard(None)  # type: ignore[arg-type]
+        self.pending_profiles.difference_update(self.profile_countries)
+
+    def resolve_pending_profiles(self):
+        from hosting.models import Place
+
+        pending = self.pending_profiles - self.profile_countries.keys()
+        self.pending_profiles.clear()
+        if not pending:
+            return
+        countries = defaultdict(set)
+        places = Place.objects_raw.filter(owner_id__in=pending).values_list('owner_id', 'country')
+        for owner_id, country in places:
+            countries[owner_id].add(country)
+        for profile_id in pending:
+            self.profile_countries[profile_id] = frozenset(countries[profile_id])
+
+    def forget_profile(self, profile_id: int | None):
+        self.profile_countries.pop(profile_id, None)  # type: ignore[arg-type]
+
+
+def get_authorization_context() -> AuthorizationContext:
+    """
+    Returns the authorization context of the current request. Outside of a
+    request, a new context is returned each time (nothing is remembered).
+    """
+    context = getattr(_request_scope, 'authorization', None)
+    return context if context is not None else AuthorizationContext()
+
+
+def authorization_request_started(**kwargs):
+    _request_scope.authorization = AuthorizationContext()
+
+
+def authorization_request_finished(**kwargs):
+    _request_scope.authorization = None
+
+
+def authorization_source_changed(sender, **kwargs):
+    # A change within the current request takes effect immediately.
+    context = getattr(_request_scope, 'authorization', None)
+    if context is None:
+        return
+    if sender._meta.model_name == 'place':
+        context.forget_profile(kwargs['instance'].owner_id)
+    else:
+        context.supervised_countries.clear()
+
+
 class SupervisorAuthBackend(ModelBackend):
 
     _perm_sv_particular_re = re.compile(r'^%s\.[A-Z]{2}$' % PERM_SUPERVISOR.replace('.', '\\.'), re.I)
@@ -134,12 +220,11 @@ class SupervisorAuthBackend(ModelBackend):
         The given object may be an iterable of countries, a single country, or a profile.
         """
         auth_log.debug("\tcalculating countries")
+        authorization_context = get_authorization_context()
         cache_name = '_countrygroup_cache'
         if not hasattr(user_obj, cache_name):
             auth_log.debug("\t\t ... storing in cache %s ... ", cache_name)
-            user_groups = user_obj.groups.all() if not user_obj.is_superuser else Group.objects.all()
-            user_countries = frozenset(Country(g.name) for g in user_groups if len(g.name) == 2)
-            setattr(user_obj, cache_name, user_countries)
+            setattr(user_obj, cache_name, authorization_context.get_supervised_countries(user_obj))
         supervised: set[Country] = getattr(user_obj, cache_name)
         if auth_log.getEffectiveLevel() == logging.DEBUG:
             auth_log.debug("\tobject is %s", repr(obj))
@@ -149,7 +234,7 @@ class SupervisorAuthBackend(ModelBackend):
                 countries = [obj]
                 auth_log.debug("\t\tGot a Country, %s", countries)
             elif isinstance(obj, Profile):
-                countries = obj.owned_places.filter(deleted=False).values_list('country', flat=True)
+                countries = authorization_context.get_profile_countries(obj)
                 auth_log.debug("\t\tGot a Profile, %s", countries)
             elif isinstance(obj, Place):
                 countries = [obj.country]
@@ -364,12 +449,7 @@ class AuthMixin[ModelT: TrackingModel](SingleObjectViewProtocol[ModelT], AccessM
             if not countries[0]:
                 owner = self.get_owner(object)
                 if owner is not None:
-                    countries = (
-                        owner.owned_places
-                        .filter(deleted=False)
-                        .values_list('country', flat=True)
-                        .distinct()
-                    )
+                    countries = sorted(get_authorization_context().get_profile_countries(owner))
                 else:
                     countries = []
             elif isinstance(countries[0], Country) and not countries[0].name:
@@ -0,0 +1,232 @@
+"""
+Submission of the feedback of the users to the maintainers: publicly, as a
+comment in a dedicated thread of the remote forum (GitHub Discussions at
+present), or privately, via email.
+
+The public submissions are performed by an asynchronous task, so that the
+request of the user does not wait for the remote forum. Each worker process
+keeps a single connected client, whose schema is fetched once and whose HTTP
+connections are reused for the subsequent submissions.
+"""
+
+import threading
+from traceback import format_exception
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.mail import mail_admins
+from django.utils import translation
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext
+
+from django_q.tasks import fetch as fetch_task
+from gql import Client as GQLClient, gql
+from gql.client import SyncClientSession
+from gql.transport import Transport
+from gql.transport.exceptions import TransportError, TransportQueryError
+from graphql import DocumentNode, ExecutionResult, GraphQLError
+from requests.exceptions import RequestException
+
+from .models import FEEDBACK_TYPES, FeedbackType
+
+# The errors caused by the remote forum or by the connection to it.
+GRAPHQL_ERRORS = (GraphQLError, TransportError, TransportQueryError, RequestException)
+
+
+class GitHubClient:
+    """
+    A client of the GraphQL API of GitHub, connected on first use and kept
+    connected afterwards. The transport is configured via the setting
+    `GITHUB_GRAPHQL_TRANSPORT`.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session: Optional[SyncClientSession] = None
+
+    def execute(self, document: DocumentNode, variable_values: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            if self._session is None:
+                transport_class = import_string(settings.GITHUB_GRAPHQL_TRANSPORT)
+                client = GQLClient(
+                    transport=transport_class(
+                        settings.GITHUB_GRAPHQL_HOST, auth=settings.GITHUB_ACCESS_TOKEN),
+                    fetch_schema_from_transport=getattr(transport_class, 'provides_schema', True),
+                )
+                self._session = client.connect_sync()
+            try:
+                return self._session.execute(document, variable_values=variable_values)
+            except (GraphQLError, TransportQueryError):
+                raise
+            except Exception:
+                # The connection is in an unknown state; it will be replaced for
+                # the next query.
+                self.close()
+                raise
+
+    def close(self):
+        if self._session is not None:
+            self._session.client.close_sync()
+            self._session = None
+
+
+class StubGitHubTransport(Transport):
+    """
+    A transport which does not contact GitHub, answering each query with a
+    plausible result instead. Used for the local tests and development.
+    """
+    provides_schema = False
+
+    def __init__(self, url: str, **kwargs):
+        self.url = url
+
+    def execute(self, document: DocumentNode, *args, **kwargs) -> ExecutionResult:
+        return ExecutionResult(data=self.respond(
+            document,
+            variable_values=kwargs.get('variable_values'),
+            operation_name=kwargs.get('operation_name')))
+
+    def respond(self, document: DocumentNode, **kwargs) -> dict[str, Any]:
+        operation = getattr(document, 'operation', None)
+        if operation in ('addDiscussionComment', 'updateDiscussionComment'):
+            return {operation: {'comment': {
+                'id': (kwargs['variable_values'] or {}).get('comment_id', 'DC_stub'),
+                'url': f'{settings.GITHUB_DISCUSSION_BASE_URL}0#discussioncomment-0',
+            }}}
+        return {'node': {'body': "", 'url': f'{settings.GITHUB_DISCUSSION_BASE_URL}0'}}
+
+
+github_client = GitHubClient()
+
+
+def submit_feedback_privately(
+        feedback_type: FeedbackType,
+        message_text: str,
+        author: str,
+        exception: Optional[BaseException] = None,
+):
+    """
+    Sends the feedback privately to the maintainers, including details of exception
+    if occured during the public submission.
+    """
+    subject = gettext(
+        # xgettext:python-brace-format
+        "Feedback on {}."
+    ).format(
+        feedback_type.esperanto_name if str(translation.get_language()).startswith('eo')
+        else feedback_type.name
+    )
+    body = f'{author}:'
+    body += '\n' + '-' * (len(body) - 1) + '\n\n'
+    body += message_text
+    if exception:
+        error_notice = "During public submission, an exception has occured."
+        error_notice += '\n\n'
+        error_notice += '\n'.join(format_exception(None, exception, None))
+
+    mail_admins(
+        subject,
+        body + (f'\n\n====\n{error_notice}' if exception else ''),
+        fail_silently=False)
+
+
+def submit_feedback_publicly(
+        feedback_key: str,
+        message_text: str,
+        *,
+        author: str,
+        signature: str,
+        language: str,
+        comment_id: Optional[str] = None,
+        previous_task_id: Optional[str] = None,
+) -> dict[str, Optional[str]]:
+    """
+    Posts the feedback publicly in a dedicated forum thread; if the ID of the
+    previous comment of the same person is given (or results from the given
+    previous task), that comment is updated with the feedback. The previous
+    task is not waited for: when it is not completed yet, the feedback is
+    posted as a new comment. In case an exception happens in the process,
+    reverts to posting the feedback and the exception details privately to
+    the maintainers.
+    Returns the ID and the URL of the comment (both None when the feedback could
+    not be posted publicly).
+    """
+    feedback_type = FEEDBACK_TYPES[feedback_key]
+    if not comment_id and previous_task_id:
+        previous_task = fetch_task(previous_task_id)
+        if previous_task is not None and previous_task.success and isinstance(previous_task.result, dict):
+            comment_id = previous_task.result['comment_id']
+
+    if comment_id:
+        # If an ID is available, attempt fetching the contents of the previous
+        # submission from the remote forum. (We do not persist the contents ourselves.)
+        try:
+            comment = github_client.execute(
+                gql("""
+                    query($comment_id: ID!) {
+                        node (id: $comment_id) { ... on DiscussionComment {
+                            body
+                        } }
+                    }
+                """),
+                variable_values={'comment_id': comment_id})
+        except GRAPHQL_ERRORS:
+            # Query failed for some reason, treat this as new submission.
+            comment_id = None
+        else:
+            # Previous contents are available, concatenate them with the new feedback.
+            complete_text = comment['node']['body'] + "\n\n----\n\n" + message_text
+
+            # Perform an update GraphQL mutation.
+            comment_query = gql("""
+                mutation($comment_id: ID!, $body_text: String!) {
+                    updateDiscussionComment (input: {commentId: $comment_id, body: $body_text}) {
+                        comment { id url }
+                    }
+                }
+            """)
+            setattr(comment_query, 'operation', 'updateDiscussionComment')
+            params = {'comment_id': comment_id, 'body_text': complete_text}
+
+    if not comment_id:
+        # Previous submission ID is not available, this is new submission.
+        # Perform an insert GraphQL mutation.
+        comment_query = gql("""
+            mutation($disc_id: ID!, $body_text: String!) {
+                addDiscussionComment (input: {discussionId: $disc_id, body: $body_text}) {
+                    comment { id url }
+                }
+            }
+        """)
+        setattr(comment_query, 'operation', 'addDiscussionComment')
+        complete_text = f'_`{signature}`_ \n\n{message_text}'
+        params = {'disc_id': feedback_type.foreign_id, 'body_text': complete_text}
+
+    try:
+        result = github_client.execute(comment_query, variable_values=params)
+    except GRAPHQL_ERRORS as ex:
+        # In case the query fails for some reason, let maintainers know that reason.
+        with translation.override(language):
+            submit_feedback_privately(feedback_type, message_text, author, ex)
+        return {'comment_id': None, 'url': None}
+    else:
+        comment = result[getattr(comment_query, 'operation')]['comment']
+        return {'comment_id': comment['id'], 'url': comment.get('url')}
+
+
+def resolve_feedback_submission(session, feedback_key: str) -> Optional[dict[str, Any]]:
+    """
+    Verifies the outcome of the last public submission of feedback recorded in
+    the given session; when the feedback was posted, the ID of the comment is
+    stored in the session, to be updated by the next submission. Returns None
+    while the submission is still queued (or when there is none), and otherwise
+    a dict with the keys `public` (whether the feedback was posted publicly or,
+    due to an error, sent privately) and `url` (of the comment).
+    """
+    task_id = session.get(f'feedback_{feedback_key}_task_id')
+    task = fetch_task(task_id) if task_id else None
+    if task is None:
+        return None
+    if task.success and isinstance(task.result, dict) and task.result['comment_id']:
+        session[f'feedback_{feedback_key}_comment_id'] = task.result['comment_id']
+        return {'public': True, 'url': task.result['url']}
+    return {'public': False, 'url': None}
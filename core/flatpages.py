@@ -0,0 +1,112 @@
+"""
+Caches of the flat pages and of the policies rendered as Django templates (see
+`core.mixins.flatpages_as_templates`), so that requesting these pages only pays
+the cost of rendering them.
+
+The compiled templates are kept per process, keyed by the primary key of the
+page (or of the policy) together with a hash of its content, so that a changed
+content never uses a stale template. The least recently used templates are
+discarded when there are too many, and those of a page are discarded as soon
+as the page is changed.
+
+The flat pages looked up by URL are kept per process as well, until any of the
+flat pages changes (see `hosting.caching.ProcessLocalIndex`).
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Optional
+
+from django.db.models import Model
+from django.template import engines
+
+from hosting.caching import ProcessLocalIndex
+
+if TYPE_CHECKING:
+    from django.contrib.flatpages.models import FlatPage
+    from django.template.backends.django import Template
+
+    from .mixins import FlatpageAsTemplateMixin
+
+
+COMPILED_TEMPLATES_MAX_COUNT = 32
+
+type TemplateKey = tuple[Optional[str], Any, str]
+
+_compiled_templates: OrderedDict[TemplateKey, 'Template'] = OrderedDict()
+_compiled_templates_lock = threading.Lock()
+
+
+def get_compiled_template(
+        page: 'FlatpageAsTemplateMixin.DictWithContent | FlatpageAsTemplateMixin.HasContent',
+) -> 'Template':
+    """
+    Returns the template compiled from the content of the given flat page or
+    policy (or of a dict with the content), compiling it only when needed.
+    """
+    content = page['content'] if isinstance(page, dict) else page.content
+    if isinstance(page, Model):
+        page_id = (page._meta.label_lower, page.pk)
+    else:
+        page_id = (None, page.get('pk') if isinstance(page, dict) else None)
+    key = (*page_id, hashlib.sha1(content.encode()).hexdigest())
+    with _compiled_templates_lock:
+        template = _compiled_templates.get(key)
+        if template is not None:
+            _compiled_templates.move_to_end(key)
+            return template
+    # Compilation is done outside of the lock; in the rare case of concurrent
+    # compilations of the same content, the last one is kept.
+    template = engines.all()[0].from_string(content)
+    with _compiled_templates_lock:
+        _compiled_templates[key] = template
+        while len(_compiled_templates) > COMPILED_TEMPLATES_MAX_COUNT:
+            _compiled_templates.popitem(last=False)
+    return template
+
+
+def forget_compiled_templates(sender: type[Model], instance: Model, **kwargs):
+    """
+    Discards the templates compiled from the given flat page or policy.
+    """
+    label = sender._meta.label_lower
+    with _compiled_templates_lock:
+        for key in [key for key in _compiled_templates if key[:2] == (label, instance.pk)]:
+            del _compiled_templates[key]
+
+
+class FlatPageIndex(ProcessLocalIndex):
+    version_key = 'flat-pages:version'
+
+    def __init__(self):
+        super().__init__()
+        self._pages: dict[str, Optional['FlatPage']] = {}
+
+    def clear(self):
+        self._pages = {}
+
+    def get_by_url(self, url: str) -> Optional['FlatPage']:
+        with self._lock:
+            self.validate()
+            if url not in self._pages:
+                from django.contrib.flatpages.models import FlatPage
+                self._pages[url] = FlatPage.objects.only('content').filter(url=url).first()
+            return self._pages[url]
+
+
+_index = FlatPageIndex()
+
+
+def get_flat_page(url: str) -> Optional['FlatPage']:
+    """
+    Returns the flat page with the given URL (having only its content loaded),
+    or None when there is no such page. The returned object must not be
+    modified.
+    """
+    return _index.get_by_url(url)
+
+
+def flat_page_changed(sender: type[Model], **kwargs):
+    forget_compiled_templates(sender, **kwargs)
+    _index.data_changed(**kwargs)
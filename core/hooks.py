@@ -2,6 +2,9 @@ import logging
 import re
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db.models import signals
 from django.dispatch import receiver
 
 import anymail.signals as mail_signals
@@ -10,7 +13,14 @@ from anymail.message import AnymailMessage
 from anymail.signals import AnymailTrackingEvent, EventType as AnymailEventType
 from anymail.webhooks.base import AnymailBaseWebhookView
 
-from hosting.models import Profile
+from hosting.models import Place, Profile
+
+from .account_state import invalidate_account_state
+from .auth import (
+    authorization_request_finished,
+    authorization_request_started, authorization_source_changed,
+)
+from .models import Agreement
 
 webhook_log = logging.getLogger('PasportaServo.webhook')
 
@@ -70,3 +80,28 @@ def process_suppression(
     if 'env' in event.metadata and event.metadata['env'] != settings.ENVIRONMENT:
         return
     Profile.mark_invalid_emails([event.recipient])
+
+
+@receiver(signals.post_save, sender=Profile, dispatch_uid='account-state--profile-saved')
+@receiver(signals.post_delete, sender=Profile, dispatch_uid='account-state--profile-deleted')
+@receiver(signals.post_save, sender=Agreement, dispatch_uid='account-state--agreement-saved')
+@receiver(signals.post_delete, sender=Agreement, dispatch_uid='account-state--agreement-deleted')
+def reset_account_state(sender: type[Profile] | type[Agreement], instance: Profile | Agreement, **kwargs):
+    """
+    The cached state of the user's account is discarded whenever the user's
+    profile or agreement with the usage policies changes.
+    """
+    if instance.user_id is not None:
+        invalidate_account_state(instance.user_id)
+
+
+# The countries of the authorization checks are resolved once per request.
+request_started.connect(authorization_request_started, dispatch_uid='authorization-context--start')
+request_finished.connect(authorization_request_finished, dispatch_uid='authorization-context--finish')
+signals.post_save.connect(
+    authorization_source_changed, sender=Place, dispatch_uid='authorization-context--place-saved')
+signals.post_delete.connect(
+    authorization_source_changed, sender=Place, dispatch_uid='authorization-context--place-deleted')
+signals.m2m_changed.connect(
+    authorization_source_changed, sender=get_user_model().groups.through,
+    dispatch_uid='authorization-context--groups-changed')
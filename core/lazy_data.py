@@ -0,0 +1,45 @@
+import json
+import threading
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Any
+
+
+class LazyJSONData(Mapping[str, Any]):
+    """
+    Read-only mapping of the contents of a JSON data file, loaded only on the
+    first access to the data. This keeps the large data sets out of the import
+    time and the memory of the processes which do not use them.
+    """
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._data: dict[str, Any] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self) -> dict[str, Any]:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    with open(self.path, 'r', encoding='utf-8') as data_file:
+                        self._data = json.load(data_file)
+        return self._data
+
+    def reload(self):
+        with self._lock:
+            self._data = None
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.data
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path.name}>'
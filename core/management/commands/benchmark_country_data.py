@@ -0,0 +1,91 @@
+import json
+import pprint
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from hosting.countries import COUNTRIES_DATA
+from maps.data import COUNTRIES_GEO
+
+# Executed in a new interpreter for each measurement, so that the imports are
+# cold. The packages and the modules needed by both kinds of data are imported
+# beforehand.
+MEASUREMENT_SCRIPT = """
+import json, sys, time, tracemalloc
+sys.path[:0] = {paths!r}
+import django.utils.translation, core, hosting, maps
+if {trace_memory!r}:
+    tracemalloc.start()
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+print(json.dumps({{'time': elapsed, 'memory': memory}}))
+"""
+
+SCENARIOS = {
+    'literal, compiled': (
+        "import countries_geo_literal, countries_data_literal", True),
+    'literal, no bytecode': (
+        "import countries_geo_literal, countries_data_literal", False),
+    'JSON, import': (
+        "import maps.data, hosting.countries", True),
+    'JSON, first use': (
+        "import maps.data, hosting.countries\n"
+        "len(maps.data.COUNTRIES_GEO), len(hosting.countries.COUNTRIES_DATA)", True),
+}
+
+
+class Command(BaseCommand):
+    help = """
+        Measures the time and the memory needed to import the data of the
+        countries (geodata and metadata), stored as Python dict literals
+        (the previous format) and as JSON files loaded on first use.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int, default=5,
+            help="number of measurements of each scenario (default: 5).")
+
+    def handle(self, *args, **options):
+        literal_dir = Path(tempfile.mkdtemp(prefix='country-data-'))
+        try:
+            self.write_literal_modules(literal_dir)
+            self.stdout.write(f"{'scenario':<24}{'time (ms)':>12}{'memory (KiB)':>16}")
+            paths = [str(literal_dir), str(settings.BASE_DIR)]
+            for name, (code, with_bytecode) in SCENARIOS.items():
+                timings = [
+                    self.measure(code, paths, with_bytecode, literal_dir)['time']
+                    for _ in range(options['repeat'])
+                ]
+                memory = self.measure(code, paths, with_bytecode, literal_dir, trace_memory=True)['memory']
+                self.stdout.write(
+                    f"{name:<24}{statistics.median(timings) * 1000:>12.2f}{memory / 1024:>16.0f}")
+        finally:
+            shutil.rmtree(literal_dir)
+
+    def write_literal_modules(self, directory: Path):
+        for module_name, variable, data in (('countries_geo_literal', 'COUNTRIES_GEO', COUNTRIES_GEO),
+                                            ('countries_data_literal', 'COUNTRIES_DATA', COUNTRIES_DATA)):
+            (directory / f'{module_name}.py').write_text(
+                f'{variable} = {pprint.pformat(dict(data), sort_dicts=False)}\n', encoding='utf-8')
+        # The bytecode is generated once, as it would be on the first start-up.
+        subprocess.run([sys.executable, '-m', 'compileall', '-q', str(directory)], check=True)
+
+    def measure(self, code, paths, with_bytecode, literal_dir, trace_memory=False):
+        command = [sys.executable]
+        if not with_bytecode:
+            # Neither read nor write the bytecode, so that the module is compiled each time.
+            command.append('-B')
+            shutil.rmtree(literal_dir / '__pycache__', ignore_errors=True)
+        script = MEASUREMENT_SCRIPT.format(paths=paths, trace_memory=trace_memory, code=code)
+        result = subprocess.run([*command, '-c', script], capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# The engine used previously, to compare with.
+BASELINE_SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+
+class Command(BaseCommand):
+    help = """
+        Requests the given pages (by default, a few frequently visited ones)
+        as the given user, and counts the reads and the writes of the session
+        in the database for each page, using the database-backed session
+        engine and the configured one. The changes made while requesting the
+        pages are not kept.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'username',
+            help="the user to log in as.")
+        parser.add_argument(
+            '--page',
+            action='append', dest='pages', metavar='PATH',
+            help="path of a page to request; can be repeated (default: home, about, search).")
+        parser.add_argument(
+            '--repeat',
+            type=int, default=5,
+            help="number of times each page is requested (default: 5).")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist.")
+        pages = options['pages'] or [reverse('home'), reverse('about'), reverse('search')]
+
+        self.stdout.write(f"{'engine':<42}{'page':<24}{'reads':>8}{'writes':>8}")
+        for engine in (BASELINE_SESSION_ENGINE, settings.SESSION_ENGINE):
+            for page, (reads, writes) in self.measure(engine, user, pages, options['repeat']).items():
+                self.stdout.write(
+                    f"{engine:<42}{page:<24}"
+                    f"{reads / options['repeat']:>8.2f}{writes / options['repeat']:>8.2f}")
+
+    def measure(self, engine, user, pages, repeat):
+        counts = {}
+        with override_settings(SESSION_ENGINE=engine, ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            client = Client()
+            client.force_login(user)
+            for page in pages:
+                reads, writes = 0, 0
+                for _ in range(repeat):
+                    with CaptureQueriesContext(connection) as context:
+                        client.get(page)
+                    for query in context.captured_queries:
+                        if '"django_session"' in query['sql']:
+                            if query['sql'].startswith('SELECT'):
+                                reads += 1
+                            else:
+                                writes += 1
+                counts[page] = (reads, writes)
+            # The session is removed also from the cache.
+            client.logout()
+            transaction.set_rollback(True)
+        return counts
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from hosting.avatars import make_avatar_thumbnails
+from hosting.models import Place, Profile
+from maps.world_map import schedule_world_map_update
+
+
+class Command(BaseCommand):
+    help = """
+        Generates the thumbnails of the avatars of the profiles (by default,
+        only of those which do not have thumbnails yet).
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="re-generate also the thumbnails which already exist.")
+        parser.add_argument(
+            '--batch-size',
+            type=int, default=100,
+            help="number of profiles updated at once (default: 100).")
+
+    def handle(self, *args, **options):
+        profiles = (
+            Profile.all_objects
+            .exclude(avatar='').exclude(avatar_present=False)
+            .select_related(None).only('avatar')
+        )
+        if not options['all']:
+            profiles = profiles.filter(avatar_thumbnails=[])
+        batch, updated_ids, failed_count = [], [], 0
+        for profile in profiles.iterator(chunk_size=options['batch_size']):
+            profile.avatar_thumbnails = make_avatar_thumbnails(profile)
+            failed_count += not profile.avatar_thumbnails
+            batch.append(profile)
+            if len(batch) >= options['batch_size']:
+                Profile.all_objects.bulk_update(batch, ['avatar_thumbnails'])
+                updated_ids.extend(profile.pk for profile in batch)
+                batch = []
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f"  {len(updated_ids)} profiles processed...")
+        if batch:
+            Profile.all_objects.bulk_update(batch, ['avatar_thumbnails'])
+            updated_ids.extend(profile.pk for profile in batch)
+        # The world map refers to the avatars of the hosts by their thumbnails.
+        schedule_world_map_update(
+            Place.objects_raw.filter(owner_id__in=updated_ids).values_list('pk', flat=True))
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                f"Generated the avatar thumbnails of {len(updated_ids) - failed_count} profiles "
+                f"({failed_count} avatars could not be read)."
+            )
@@ -0,0 +1,63 @@
+"""
+This management command converts the published list of Pwned Passwords (the
+SHA-1 hashes ordered by hash, one "HASH:COUNT" per line) into the compact hash
+database used for verifying passwords without consulting the remote service.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.termcolors import make_style
+
+from ...pwned_passwords import HashDatabase
+
+
+class Command(BaseCommand):
+    help = """
+        Imports the list of SHA-1 hashes of Pwned Passwords (ordered by hash)
+        into the local hash database.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            metavar='FILE',
+            help="path to the text file of hashes, ordered by hash.")
+        parser.add_argument(
+            '--min-count',
+            type=int, default=1,
+            help="import only the hashes which appeared in breaches at least this "
+                 "many times (default: 1).")
+        parser.add_argument(
+            '--output',
+            metavar='FILE', default=settings.PWNED_PASSWORDS_DATABASE,
+            help="path of the hash database to create (default: the PWNED_PASSWORDS_DATABASE setting).")
+
+    def handle(self, *args, **options):
+        try:
+            source_file = open(options['source'], 'r', encoding='ascii')
+        except FileNotFoundError:
+            raise CommandError("The file %s was not found" % options['source'])
+
+        def hashes():
+            for line_number, line in enumerate(source_file, start=1):
+                try:
+                    pwdhash, count = line.strip().split(':')
+                    count = int(count)
+                except ValueError:
+                    raise CommandError(f"Line {line_number} cannot be parsed: {line.strip()}")
+                if count >= options['min_count']:
+                    yield (pwdhash, count)
+
+        os.makedirs(os.path.dirname(options['output']) or '.', exist_ok=True)
+        with source_file:
+            try:
+                hashes_count = HashDatabase.write(options['output'], hashes())
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(make_style(opts=('bold',), fg='white')(
+                f"[IMPORTED {hashes_count} PASSWORD HASHES INTO {options['output']}]"
+            ))
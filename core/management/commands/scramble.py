@@ -1,6 +1,9 @@
 import json
+import multiprocessing
+import multiprocessing.connection
 import operator
 import os
+import random
 import re
 import time
 import unicodedata
@@ -12,9 +15,12 @@ from urllib.request import Request, urlopen
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.contrib.gis.geos import Point
 from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
 from django.utils.crypto import get_random_string as random_hash
 
 import rstr
@@ -55,6 +61,18 @@ class Command(BaseCommand):
             help="Test the result of the operation without actually modifying "
                  "data in the database.",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int, default=500,
+            help="Number of objects of a type written to the database at once "
+                 "(default: 500).",
+        )
+        parser.add_argument(
+            "-j", "--jobs",
+            type=int, default=1,
+            help="Number of processes scrambling different types of objects "
+                 "in parallel (default: 1).",
+        )
         parser.add_argument(
             "-p", "--passwords",
             nargs=3,
@@ -79,6 +97,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.verbosity = options['verbosity']
         self.dry_run = options['dry_run']
+        self.batch_size = max(options['batch_size'], 1)
         self.password_templates = options['passwords']
         if not self.should_continue():
             return
@@ -126,9 +145,20 @@ class Command(BaseCommand):
             self.stdout.flush()
             time.sleep(1)
 
-        for objtype in self.object_types:
-            if should_handle(objtype):
-                getattr(self, f'handle_{objtype}')()
+        if should_handle('users'):
+            self.prepare_passwords()
+        selected_types = [objtype for objtype in self.object_types if should_handle(objtype)]
+        if options['jobs'] > 1 and len(selected_types) > 1:
+            if self.dry_run and {'users', 'profiles'}.issubset(selected_types):
+                # In a dry run, the profiles are shown with their scrambled users,
+                # which are kept only in memory; these are thus scrambled before
+                # forking, so that the process of the profiles inherits them.
+                selected_types.remove('users')
+                self.run_handler('users')
+            self.run_in_parallel(selected_types, options['jobs'])
+        else:
+            for objtype in selected_types:
+                self.run_handler(objtype)
 
         if hasattr(self, 'passwords'):
             self.stdout.write(
@@ -168,10 +198,52 @@ class Command(BaseCommand):
                 "Looks like you are running on the production server. Aborting.")
         return True
 
+    def run_handler(self, objtype):
+        started = time.perf_counter()
+        count_total = getattr(self, f'handle_{objtype}')()
+        if self.verbosity >= 1:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"\t {objtype}: {count_total} rows in {elapsed:.1f}s"
+                f" ({count_total / elapsed if elapsed else 0:.0f} rows/s)."
+            )
+
+    def run_in_parallel(self, objtypes, jobs):
+        """
+        Scrambles each type of objects in a separate (forked) process, at most
+        `jobs` processes at a time. The processes do not share the database
+        connections nor the random generators.
+        """
+        def run_in_subprocess(objtype):
+            self.faker.seed_instance()
+            random.seed()
+            try:
+                self.run_handler(objtype)
+            finally:
+                connections.close_all()
+
+        context = multiprocessing.get_context('fork')
+        pending, running, failed = list(objtypes), [], []
+        connections.close_all()
+        while pending or running:
+            while pending and len(running) < jobs:
+                objtype = pending.pop(0)
+                process = context.Process(target=run_in_subprocess, args=(objtype,), name=objtype)
+                process.start()
+                running.append(process)
+            multiprocessing.connection.wait([process.sentinel for process in running])
+            for process in running[:]:
+                if process.exitcode is not None:
+                    running.remove(process)
+                    if process.exitcode != 0:
+                        failed.append(process.name)
+        if failed:
+            raise CommandError(f"Scrambling of {', '.join(failed)} failed.")
+
     def stdout_long_description(self, obj, field_name='description'):
         return " ".join(getattr(obj, field_name)[:30].split()) + "..."
 
-    def handle_users(self):
+    def prepare_passwords(self):
         character_set = 'ABCDEFGHJKLMNPQRSTUWXYZabcdefghjmnpqrstvwxyz23456789=*'
         if not self.password_templates:
             self.passwords = {
@@ -186,9 +258,30 @@ class Command(BaseCommand):
                     self.password_templates
                 )
             )
+        # Hashing of passwords is intentionally slow; each of the passwords is
+        # thus hashed just once and the hash is reused for all users of a role.
+        self.password_hashes = {
+            role: make_password(password) for role, password in self.passwords.items()
+        }
+
+    def handle_users(self):
         self.dry_users, count_changed = {}, 0
+        user_model = get_user_model()
+        supervisor_codename = PERM_SUPERVISOR.partition('.')[2]
+        supervisor_ids = set(
+            user_model.objects
+            .filter(is_active=True)
+            .filter(
+                Q(groups__name__regex=r'^.{2}$')
+                | Q(groups__permissions__codename=supervisor_codename)
+                | Q(user_permissions__codename=supervisor_codename)
+            )
+            .values_list('pk', flat=True)
+        )
+        updater = BatchUpdater(
+            user_model.objects, ['username', 'email', 'password'], self.batch_size, self.dry_run)
 
-        for user in get_user_model().objects.order_by('id'):
+        for user in user_model.objects.order_by('id').iterator(chunk_size=self.batch_size):
             if self.verbosity >= 2:
                 self.stdout.write(
                     f"<User #{user.pk}: {user.username}>, {user.email}")
@@ -196,14 +289,14 @@ class Command(BaseCommand):
             user.username = random_identifier(10)
             self.scramble_email(
                 user, 'u', mailbox='user', pre_scrambled_value=user.username)
-            scrambled_pwd = self.passwords[
+            role = (
                 AuthRole.ADMIN if user.is_superuser else
-                (AuthRole.SUPERVISOR if user.has_perm(PERM_SUPERVISOR) else
+                (AuthRole.SUPERVISOR if user.pk in supervisor_ids else
                  AuthRole.VISITOR)
-            ]
-            user.set_password(scrambled_pwd)
-            if not self.dry_run:
-                user.save(update_fields=['username', 'email', 'password'])
+            )
+            scrambled_pwd = self.passwords[role]
+            user.password = self.password_hashes[role]
+            updater.add(user)
 
             if self.verbosity >= 2:
                 self.stdout.write(
@@ -213,11 +306,13 @@ class Command(BaseCommand):
             if self.dry_run:
                 self.dry_users[user.pk] = user
             count_changed += 1
+        updater.flush()
 
         if self.verbosity >= 1:
             self.stdout.write(self.style.SUCCESS(
                 f"Scrambled {count_changed} users."
             ))
+        return count_changed
 
     def handle_profiles(self):
         count_changed, count_total = 0, 0
@@ -232,7 +327,16 @@ class Command(BaseCommand):
         def stdout_gender(profile):
             return f" ⚧ {profile.gender}" if profile.gender else ""
 
-        for profile in Profile.all_objects.order_by('-id'):
+        updater = BatchUpdater(
+            Profile.all_objects,
+            ['first_name', 'last_name', 'birth_date', 'death_date', 'gender', 'email', 'description'],
+            self.batch_size, self.dry_run)
+
+        profiles = Profile.all_objects.select_related(None).order_by('-id')
+        if self.verbosity >= 2:
+            # The user is needed for the representation of some profiles.
+            profiles = profiles.select_related('user')
+        for profile in profiles.iterator(chunk_size=self.batch_size):
             if self.dry_run and profile.user_id and dry_users:
                 profile.user = dry_users[profile.user_id]
             if self.verbosity >= 2:
@@ -253,11 +357,8 @@ class Command(BaseCommand):
                     self.scramble_description,
                 ]
             ])
-            if not self.dry_run and is_changed:
-                profile.save(update_fields=[
-                    'first_name', 'last_name', 'birth_date', 'death_date',
-                    'gender', 'email', 'description',
-                ])
+            if is_changed:
+                updater.add(profile)
 
             if self.verbosity >= 2 and is_changed:
                 self.stdout.write(
@@ -272,17 +373,29 @@ class Command(BaseCommand):
             if is_changed:
                 count_changed += 1
             count_total += 1
+        updater.flush()
 
         if self.verbosity >= 1:
             self.stdout.write(self.style.SUCCESS(
                 f"Scrambled {count_changed} profiles"
                 f" ({count_total-count_changed} not changed)."
             ))
+        return count_total
 
     def handle_places(self):
         count_changed, count_total = 0, 0
 
-        for place in Place.all_objects.order_by('-id'):
+        updater = BatchUpdater(
+            Place.all_objects,
+            [
+                'postcode', 'city', 'address', 'closest_city',
+                'latitude', 'longitude', 'location',
+                'description', 'short_description',
+            ],
+            self.batch_size, self.dry_run)
+
+        places = Place.all_objects.select_related(None).order_by('-id')
+        for place in places.iterator(chunk_size=self.batch_size):
             if self.verbosity >= 2:
                 self.stdout.write(f"{place!r}")
                 if place.short_description:
@@ -299,12 +412,8 @@ class Command(BaseCommand):
                     self.scramble_description,
                 ]
             ])
-            if not self.dry_run and is_changed:
-                place.save(update_fields=[
-                    'postcode', 'city', 'address', 'closest_city',
-                    'latitude', 'longitude', 'location',
-                    'description', 'short_description',
-                ])
+            if is_changed:
+                updater.add(place)
 
             if self.verbosity >= 2 and is_changed:
                 closest_city = f" ⌈{place.closest_city}⌋" if place.closest_city else ""
@@ -328,17 +437,21 @@ class Command(BaseCommand):
             if is_changed:
                 count_changed += 1
             count_total += 1
+        updater.flush()
 
         if self.verbosity >= 1:
             self.stdout.write(self.style.SUCCESS(
                 f"Scrambled {count_changed} places"
                 f" ({count_total-count_changed} not changed)."
             ))
+        return count_total
 
     def handle_phones(self):
         count_changed = 0
+        updater = BatchUpdater(Phone.all_objects, ['number', 'comments'], self.batch_size, self.dry_run)
 
-        for phone in Phone.all_objects.order_by('-id'):
+        phones = Phone.all_objects.select_related(None).order_by('-id')
+        for phone in phones.iterator(chunk_size=self.batch_size):
             if self.verbosity >= 2:
                 self.stdout.write(
                     f"{phone!r}"
@@ -347,8 +460,7 @@ class Command(BaseCommand):
 
             self.scramble_phone(phone)
             self.scramble_comment(phone)
-            if not self.dry_run:
-                phone.save(update_fields=['number', 'comments'])
+            updater.add(phone)
 
             if self.verbosity >= 2:
                 self.stdout.write(
@@ -356,31 +468,36 @@ class Command(BaseCommand):
                     + (f"  [ {phone.comments} ]" if phone.comments else "")
                 )
             count_changed += 1
+        updater.flush()
 
         if self.verbosity >= 1:
             self.stdout.write(self.style.SUCCESS(
                 f"Scrambled {count_changed} phone numbers."
             ))
+        return count_changed
 
     def handle_websites(self):
         count_changed = 0
+        updater = BatchUpdater(Website.all_objects, ['url'], self.batch_size, self.dry_run)
 
-        for website in Website.all_objects.order_by('-id'):
+        websites = Website.all_objects.select_related(None).order_by('-id')
+        for website in websites.iterator(chunk_size=self.batch_size):
             if self.verbosity >= 2:
                 self.stdout.write(f"{website!r}")
 
             self.scramble_url(website)
-            if not self.dry_run:
-                website.save(update_fields=['url'])
+            updater.add(website)
 
             if self.verbosity >= 2:
                 self.stdout.write(f"\t changed to {website.url}")
             count_changed += 1
+        updater.flush()
 
         if self.verbosity >= 1:
             self.stdout.write(self.style.SUCCESS(
                 f"Scrambled {count_changed} user website URLs."
             ))
+        return count_changed
 
     def handle_avatars(self):
         rootdir = os.path.join(settings.MEDIA_ROOT, 'avatars')
@@ -436,12 +553,15 @@ class Command(BaseCommand):
                        f" profile#{','.join(map(str, failure['randomized']))})"
                        if failure.get('randomized') else "")
                 )
+        return count_total
 
     def handle_messages(self):
         count_cnv_changed, count_msg_changed = 0, 0
         thread, thread_subject = None, ''
+        updater = BatchUpdater(Message.objects, ['subject', 'body'], self.batch_size, self.dry_run)
 
-        for message in Message.objects.order_by('thread_id', 'id'):
+        messages = Message.objects.select_related(None).order_by('thread_id', 'id')
+        for message in messages.iterator(chunk_size=self.batch_size):
             if self.verbosity >= 2:
                 self.stdout.write(f"{message!r}")
 
@@ -454,8 +574,7 @@ class Command(BaseCommand):
                 message.subject = "Re: " + thread_subject
             self.scramble_description(
                 message, short=self.faker.random.random() > 0.60, field_name='body')
-            if not self.dry_run:
-                message.save(update_fields=['subject', 'body'])
+            updater.add(message)
 
             if self.verbosity >= 2:
                 self.stdout.write(
@@ -466,12 +585,14 @@ class Command(BaseCommand):
                         f"\t \t {self.stdout_long_description(message, 'body')}"
                     )
             count_msg_changed += 1
+        updater.flush()
 
         if self.verbosity >= 1:
             self.stdout.write(self.style.SUCCESS(
                 f"Scrambled {count_cnv_changed} conversations,"
                 f" {count_msg_changed} messages."
             ))
+        return count_msg_changed
 
     def scramble_personal_name(self, profile):
         if not profile.first_name:
@@ -670,6 +791,31 @@ class Command(BaseCommand):
             return True, None
 
 
+class BatchUpdater:
+    """
+    Collects the modified objects and writes them to the database in batches,
+    each batch with a single query (unless only a dry run is performed).
+    """
+    def __init__(self, manager, fields, batch_size, dry_run=False):
+        self.manager = manager
+        self.fields = fields
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.batch = []
+
+    def add(self, obj):
+        if self.dry_run:
+            return
+        self.batch.append(obj)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.manager.bulk_update(self.batch, self.fields, batch_size=self.batch_size)
+            self.batch = []
+
+
 def preload_images(provider, cmd=None):
     if cmd and cmd.verbosity >= 2:
         cmd.stdout.write("\n")
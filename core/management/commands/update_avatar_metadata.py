@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from hosting.models import Profile
+
+
+class Command(BaseCommand):
+    help = """
+        Records the presence, dimensions and content hash of the avatars of
+        the profiles (by default, only of those whose metadata is unknown).
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="re-read also the avatars whose metadata is already recorded.")
+        parser.add_argument(
+            '--batch-size',
+            type=int, default=500,
+            help="number of profiles updated at once (default: 500).")
+
+    def handle(self, *args, **options):
+        profiles = Profile.all_objects.exclude(avatar='').select_related(None).only('avatar')
+        if not options['all']:
+            profiles = profiles.filter(avatar_present__isnull=True)
+        metadata_fields = ['avatar_present', 'avatar_width', 'avatar_height', 'avatar_hash']
+        batch, updated_count, missing_count = [], 0, 0
+        for profile in profiles.iterator(chunk_size=options['batch_size']):
+            profile.update_avatar_metadata()
+            missing_count += not profile.avatar_present
+            batch.append(profile)
+            if len(batch) >= options['batch_size']:
+                Profile.all_objects.bulk_update(batch, metadata_fields)
+                updated_count += len(batch)
+                batch = []
+        if batch:
+            Profile.all_objects.bulk_update(batch, metadata_fields)
+            updated_count += len(batch)
+        # Profiles without an avatar need no reading of files.
+        Profile.all_objects.filter(avatar='', avatar_present__isnull=True).update(
+            avatar_present=False, avatar_width=None, avatar_height=None, avatar_hash='')
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                f"Updated the avatar metadata of {updated_count} profiles "
+                f"({missing_count} avatars missing from the storage)."
+            )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from hosting.statistics import refresh_place_statistics
+
+
+class Command(BaseCommand):
+    help = """
+        Re-calculates the stored statistics of the available places (by default,
+        of all the countries).
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'countries',
+            nargs='*', metavar='COUNTRY',
+            help="codes of the countries whose statistics are to be updated.")
+
+    def handle(self, *args, **options):
+        countries = [code.upper() for code in options['countries']] or None
+        refresh_place_statistics(countries)
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                "Updated the place statistics of "
+                + (", ".join(countries) if countries else "all the countries") + "."
+            )
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from hashlib import md5
 
 from django.conf import settings
@@ -12,22 +13,48 @@ from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from django.utils.functional import SimpleLazyObject
 from django.utils.text import format_lazy
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import get_language, gettext_lazy as _
 from django.views import View
 
-import geocoder
 import user_agents
 
-from core.models import Agreement, Policy, SiteConfiguration, UserBrowser
+from core.models import Policy, SiteConfiguration, UserBrowser
 from core.utils import request_asks_for_json
 from core.views import AgreementRejectView, AgreementView, HomeView
-from hosting.models import Preferences, Profile
+from hosting.models import Preferences
 from hosting.validators import TooNearPastValidator
+from maps.geoip import get_client_ip, locate_ip
 from pasportaservo.urls import (
     url_index_debug, url_index_maps, url_index_postman,
 )
 
 from . import PasportaServoHttpRequest
+from .account_state import get_account_state
+
+
+@lru_cache(maxsize=2048)
+def _restricted_view_class(path: str, language: str) -> type[View] | None:
+    """
+    Returns the class of the view at the given path when this view is subject
+    to the pre-conditions for site usage, otherwise None.
+    The language is part of the arguments since the URLs are translated.
+    """
+    try:
+        view = resolve(path)
+    except Resolver404:
+        # A non-existent page is ok.
+        return None
+    if (not hasattr(view.func, 'view_class')
+            or view.func.view_class in [LoginView, LogoutView, HomeView, AgreementRejectView]):
+        return None
+    try:
+        resolve(path, 'pages.urls')
+    except Resolver404:
+        # The URL accessed is not one of the general pages.
+        return view.func.view_class
+    else:
+        # A general page is ok.
+        return None
 
 
 class AccountFlagsMiddleware(MiddlewareMixin):
@@ -62,42 +89,23 @@ class AccountFlagsMiddleware(MiddlewareMixin):
         if not request.user.is_authenticated:
             # Only relevant to logged in users.
             return
-        profile = Profile.all_objects.filter(user=request.user)[0:1]
         if 'flag_analytics_setup' not in request.session:
             # Update user's analytics consent according to the DNT setting in the browser, first time
             # when the user logs in (DNT==True => opt out). Prior to that the consent is undefined.
-            pref = Preferences.objects.filter(profile=profile, site_analytics_consent__isnull=True)
+            pref = Preferences.objects.filter(profile__user=request.user, site_analytics_consent__isnull=True)
             pref.update(site_analytics_consent=not request.DNT)
             request.session['flag_analytics_setup'] = str(timezone.now())
 
         self._update_connection_info(request)
 
-        birth_date = profile.values_list('birth_date', flat=True)
-        request.user_has_profile = len(birth_date) > 0
+        account_state = get_account_state(request.user)
+        request.user_has_profile = account_state['has_profile']
 
         # Is user's age above the legally required minimum?
-        trouble_view = None
-        try:
-            trouble_view = resolve(request.path)
-            if (hasattr(trouble_view.func, 'view_class') and trouble_view.func.view_class not in
-                    [LoginView, LogoutView, HomeView, AgreementRejectView]):
-                try:
-                    resolve(request.path, 'pages.urls')
-                except Resolver404:
-                    # The URL accessed is not one of the general pages.
-                    pass
-                else:
-                    # A general page is ok.
-                    trouble_view = None
-            else:
-                trouble_view = None
-        except Resolver404:
-            # A non-existent page is ok.
-            pass
-        if trouble_view is not None and len(birth_date) != 0 and birth_date[0]:
-            birth_date_value = birth_date[0]  # Returned as a list from the query.
+        trouble_view_class = _restricted_view_class(request.path, get_language())
+        if trouble_view_class is not None and account_state['birth_date']:
             try:
-                TooNearPastValidator(SiteConfiguration.USER_MIN_AGE)(birth_date_value)
+                TooNearPastValidator(SiteConfiguration.USER_MIN_AGE)(account_state['birth_date'])
             except ValidationError:
                 raise PermissionDenied(format_lazy(
                     _("Unfortunately, you are still too young to use Pasporta Servo. "
@@ -106,11 +114,10 @@ class AccountFlagsMiddleware(MiddlewareMixin):
                 ))
 
         # Has the user consented to the most up-to-date usage policy?
-        if (trouble_view is not None
-                and (request.method == 'GET' or trouble_view.func.view_class == AgreementView)):
-            redirect_response = (
-                self._verify_usage_policy_consent(request, trouble_view.func.view_class)
-            )
+        if (trouble_view_class is not None
+                and (request.method == 'GET' or trouble_view_class == AgreementView)):
+            redirect_response = self._verify_usage_policy_consent(
+                request, trouble_view_class, account_state['agreements'])
             # We don't want to disrupt the users when they are in the middle of an
             # operation, by injecting an unexpected redirect. The newer policy can
             # be shown when they complete the operation and continue browsing.
@@ -121,9 +128,6 @@ class AccountFlagsMiddleware(MiddlewareMixin):
         # properly configured profile?
         if (request.path.startswith(str(url_index_postman))
                 and not request.user_has_profile and not request.user.is_superuser):
-            # We can reuse the birth date query result to avoid an additional query
-            # in the DB. For users with a profile, the result will not be empty and
-            # hold some value (either datetime or None).
             t = TemplateResponse(
                     request, 'registration/profile_create.html', status=403,
                     context={
@@ -136,17 +140,10 @@ class AccountFlagsMiddleware(MiddlewareMixin):
             t.render()
             return t
 
-    def _verify_usage_policy_consent(self, request: HttpRequest, requested_view: type[View]):
+    def _verify_usage_policy_consent(
+            self, request: HttpRequest, requested_view: type[View], agreement: list[str],
+    ):
         policy_versions, policies = Policy.objects.all_effective()
-        agreement = (
-            Agreement.objects
-            .filter(
-                user=request.user,
-                withdrawn__isnull=True,
-            )
-            .order_by('-created')
-            .values_list('policy_version', flat=True)
-        )
 
         if not set(agreement) & set(policy_versions):
             if requested_view != AgreementView:
@@ -160,7 +157,7 @@ class AccountFlagsMiddleware(MiddlewareMixin):
             # from the database.
             current_policy = list(policies)[0] if policies else None
             setattr(request.user, 'consent_required', {
-                'given_for': agreement.first(),
+                'given_for': agreement[0] if agreement else None,
                 'current': [current_policy],
                 'summary': [
                     (p.effective_date, p.changes_summary)
@@ -179,7 +176,7 @@ class AccountFlagsMiddleware(MiddlewareMixin):
                 if p.changes_summary
             ])
             setattr(request.user, 'consent_obtained', {
-                'given_for': agreement.first(),
+                'given_for': agreement[0] if agreement else None,
                 'current': current_policy,
                 'summary': policy_summary,
             })
@@ -217,17 +214,15 @@ class AccountFlagsMiddleware(MiddlewareMixin):
         )
         # Attempt retrieving the user's current geographical location. If it can be
         # found, use it to futher filter the known connections.
-        position = geocoder.ip(request.META['HTTP_X_REAL_IP']
-                               if settings.ENVIRONMENT not in ('DEV', 'TEST')
-                               else "188.166.58.162")
-        if position.ok and position.current_result.ok:
+        position = locate_ip(get_client_ip(request))
+        if position.ok:
             current_location = (f'{position.state}, ' if position.state else '') + position.country
             locations = locations.filter(geolocation=current_location)
         else:
-            # When the IPInfo service is unavailable or information about the user's
-            # IP cannot be retrieved, we proceed as if the location is unknown.
+            # When information about the user's IP cannot be retrieved (for example,
+            # the IP location service is unavailable), we proceed as if the location
+            # is unknown.
             current_location = ''
-        position.session.close()
 
         # Verify if the user is connecting with a browser and from a geographical
         # location already known by us.
@@ -139,9 +139,8 @@ def flatpages_as_templates[VT: View](cls: type[VT]) -> type[VT]:
     ):
         if not page:
             return ''
-        from django.template import engines
-        content = page['content'] if isinstance(page, dict) else page.content
-        template = engines.all()[0].from_string(content)
+        from .flatpages import get_compiled_template
+        template = get_compiled_template(page)
         return template.render(
             getattr(self, '_flat_page_context', render_flat_page._view_context),
             self.request)
@@ -0,0 +1,198 @@
+"""
+Verification of passwords against the Pwned Passwords dataset of Have I Been
+Pwned, using k-anonymity: only the first 5 characters of the SHA-1 hash of the
+password are used to look up the range of the hashes sharing this prefix.
+
+The range is obtained from the backends listed in the PWNED_PASSWORDS_BACKENDS
+setting, in order, until one of them provides it. The local hash database is a
+compact binary file (created by the `import_pwned_passwords` management command
+from the published list of hashes ordered by hash), which is memory-mapped and
+searched in place; the remote service is queried via a pooled HTTP session with
+a strict timeout, and the ranges it returns are kept in the cache.
+"""
+
+import bisect
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Iterable, Sequence
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Layout of the hash database: a header (signature, number of hashes), followed
+# by fixed-width records of the binary SHA-1 hashes sorted in ascending order,
+# each with the number of times it appeared in breaches.
+HASH_DB_SIGNATURE = b'PSPWDB1\0'
+HASH_DB_HEADER = struct.Struct('>8sQ')
+HASH_DB_RECORD = struct.Struct('>20sI')
+
+RANGE_PREFIX_LENGTH = 5
+
+
+class PwnedPasswordsBackend:
+    def get_range(self, prefix: str) -> str | None:
+        """
+        Returns the range of the hashes starting with the given prefix (of five
+        uppercase hexadecimal characters), in the format of the Pwned Passwords
+        service: one "SUFFIX:COUNT" line per hash. None is returned when the
+        backend cannot provide the range.
+        """
+        raise NotImplementedError
+
+
+class HashDatabaseBackend(PwnedPasswordsBackend):
+    """
+    Looks up the range in the local memory-mapped hash database.
+    """
+    def __init__(self, database_path: Optional[str] = None):
+        self.database_path = database_path or settings.PWNED_PASSWORDS_DATABASE
+        self._database: HashDatabase | None = None
+        self._database_lock = threading.Lock()
+
+    @property
+    def database(self) -> Optional['HashDatabase']:
+        if self._database is None:
+            with self._database_lock:
+                if self._database is None and self.database_path and os.path.isfile(self.database_path):
+                    self._database = HashDatabase(self.database_path)
+        return self._database
+
+    def get_range(self, prefix: str) -> str | None:
+        if self.database is None:
+            return None
+        return self.database.get_range(prefix)
+
+
+class RemoteServiceBackend(PwnedPasswordsBackend):
+    """
+    Asks the Pwned Passwords service for the range, reusing the connections to
+    it and giving up after PWNED_PASSWORDS_TIMEOUT seconds. Ranges are kept in
+    the cache (shared between the processes) for PWNED_PASSWORDS_CACHE_TIMEOUT
+    seconds.
+    """
+    service_url = 'https://api.pwnedpasswords.com/range/{}'
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=10))
+        self.session.headers.update({
+            'Add-Padding': 'true',
+            'User-Agent': 'pasportaservo.org',
+        })
+
+    def get_range(self, prefix: str) -> str | None:
+        cache_key = f'pwned-passwords:{prefix}'
+        cached_range = cache.get(cache_key)
+        if cached_range is not None:
+            return cached_range
+        try:
+            result = self.session.get(
+                self.service_url.format(prefix), timeout=settings.PWNED_PASSWORDS_TIMEOUT)
+        except requests.exceptions.RequestException as exc:
+            logging.getLogger('PasportaServo.auth').warning(
+                "Pwned Passwords service unavailable: %s", exc)
+            return None
+        if result.status_code != requests.codes.ok:
+            return None
+        cache.set(cache_key, result.text, settings.PWNED_PASSWORDS_CACHE_TIMEOUT)
+        return result.text
+
+
+class HashDatabase:
+    """
+    Read-only access to the binary hash database, memory-mapped so that it is
+    shared between the worker processes and not loaded in full on start-up.
+    """
+    def __init__(self, path: str):
+        with open(path, 'rb') as db_file:
+            self._mmap = mmap.mmap(db_file.fileno(), 0, access=mmap.ACCESS_READ)
+        signature, self.size = HASH_DB_HEADER.unpack_from(self._mmap, 0)
+        if signature != HASH_DB_SIGNATURE:
+            raise ValueError(f"{path} is not a Pwned Passwords database.")
+        self._hashes = _HashesView(self._mmap, self.size)
+
+    def get_range(self, prefix: str) -> str:
+        # A prefix of five hexadecimal characters covers 20 bits of the hash.
+        range_start = bytes.fromhex(prefix.ljust(40, '0'))
+        index = bisect.bisect_left(self._hashes, range_start)
+        lines = []
+        while index < self.size:
+            pwdhash, count = HASH_DB_RECORD.unpack_from(
+                self._mmap, HASH_DB_HEADER.size + index * HASH_DB_RECORD.size)
+            hex_hash = pwdhash.hex().upper()
+            if not hex_hash.startswith(prefix):
+                break
+            lines.append(f'{hex_hash[RANGE_PREFIX_LENGTH:]}:{count}')
+            index += 1
+        return '\n'.join(lines)
+
+    @staticmethod
+    def write(path: str, hashes: Iterable[tuple[str, int]]) -> int:
+        """
+        Creates the hash database from (hexadecimal SHA-1 hash, count) pairs,
+        which must be sorted by the hash (as in the published list ordered by
+        hash); the list is too large to be sorted here. Returns the number of
+        hashes written.
+        """
+        temp_path = f'{path}.tmp'
+        hashes_count, previous_hash = 0, b''
+        with open(temp_path, 'wb') as db_file:
+            db_file.write(HASH_DB_HEADER.pack(HASH_DB_SIGNATURE, 0))
+            for hex_hash, count in hashes:
+                pwdhash = bytes.fromhex(hex_hash)
+                if len(pwdhash) != 20:
+                    raise ValueError(f"{hex_hash} is not a SHA-1 hash.")
+                if pwdhash <= previous_hash:
+                    raise ValueError(f"The hashes are not sorted (at {hex_hash}).")
+                db_file.write(HASH_DB_RECORD.pack(pwdhash, count))
+                previous_hash = pwdhash
+                hashes_count += 1
+            db_file.seek(0)
+            db_file.write(HASH_DB_HEADER.pack(HASH_DB_SIGNATURE, hashes_count))
+        # Replacing the file atomically allows the running processes to keep
+        # using the previous version which they have mapped.
+        os.replace(temp_path, path)
+        return hashes_count
+
+
+class _HashesView(Sequence):
+    """
+    Exposes the hashes in the memory-mapped database as a sequence, for binary
+    search.
+    """
+    def __init__(self, buffer: mmap.mmap, size: int):
+        self.buffer, self.size = buffer, size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        offset = HASH_DB_HEADER.size + index * HASH_DB_RECORD.size
+        return self.buffer[offset:offset+20]
+
+
+@lru_cache(maxsize=None)
+def get_backends() -> list[PwnedPasswordsBackend]:
+    return [import_string(backend_path)() for backend_path in settings.PWNED_PASSWORDS_BACKENDS]
+
+
+def get_pwned_passwords_range(prefix: str) -> str | None:
+    """
+    Returns the range of the hashes starting with the given prefix, from the
+    first of the configured backends which can provide it; None when none can.
+    """
+    prefix = prefix.upper()
+    for backend in get_backends():
+        hashes_range = backend.get_range(prefix)
+        if hashes_range is not None:
+            return hashes_range
+    return None
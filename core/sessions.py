@@ -0,0 +1,37 @@
+"""
+Session engine storing the sessions in the cache, backed by the database (see
+`django.contrib.sessions.backends.cached_db`), which in addition skips writing
+a session whose data did not really change during the request. Flags and info
+kept in the session are often assigned again with the values they had, which
+marks the session as modified; such sessions are not written again.
+
+Note that, as for the sessions which are not modified, the expiry date of such
+a session is not postponed.
+"""
+
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDBSessionStore,
+)
+
+
+class SessionStore(CachedDBSessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._stored_state: bytes | None = None
+
+    def _data_state(self, session_data: dict) -> bytes:
+        return self.serializer().dumps(session_data)
+
+    def load(self):
+        session_data = super().load()
+        # A new (empty) session is not stored yet.
+        self._stored_state = self._data_state(session_data) if self._session_key else None
+        return session_data
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None and self._stored_state is not None:
+            if self._data_state(self._session) == self._stored_state:
+                # The data remained the same; there is nothing to write.
+                return
+        super().save(must_create)
+        self._stored_state = self._data_state(self._session)
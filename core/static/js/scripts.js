@@ -289,7 +289,10 @@ $(document).ready(function() {
     window.addEventListener('error', function(event) {
         var culprit = event.target, $culprit = $(event.target);
         if (culprit.tagName == 'IMG' && $culprit.parents('.avatar').length && !$culprit.data('erroring-url')) {
-            $culprit.attr('data-erroring-url', culprit.src);
+            $culprit.attr('data-erroring-url', culprit.currentSrc || culprit.src);
+            // The thumbnails, if any, would otherwise take precedence over the fallback.
+            culprit.removeAttribute('srcset');
+            $culprit.siblings('source').remove();
             culprit.src = $culprit.data('fallback') || '/static/img/image_not_available.png';
         }
     }, true);
@@ -18,7 +18,7 @@ from .views import (  # isort:skip
     PasswordChangeView, PasswordChangeDoneView, UsernameChangeView,
     EmailUpdateView, EmailVerifyView,
     AccountDeleteView,
-    FeedbackView,
+    FeedbackView, FeedbackStatusView,
     MassMailView, MassMailSentView,
     ContentFragmentRetrieveView,
 )
@@ -107,8 +107,13 @@ urlpatterns = [
         AccountDeleteView.as_view(), name='account_delete'),
 
     path(
-        pgettext_lazy("URL", 'feedback/'),
-        FeedbackView.as_view(), name='user_feedback'),
+        pgettext_lazy("URL", 'feedback/'), include([
+            path(
+                '', FeedbackView.as_view(), name='user_feedback'),
+            re_path(
+                r'^@@(?P<task_id>[a-f0-9]{32})/$',
+                FeedbackStatusView.as_view(), name='user_feedback_status'),
+        ])),
 
     path(
         pgettext_lazy("URL", 'admin/'), include([
@@ -3,24 +3,35 @@ import hashlib
 import locale
 import operator
 import re
+from datetime import datetime, timedelta
 from decimal import Decimal, localcontext as local_decimal_context
+from itertools import batched
 from typing import (
-    Any, Callable, Iterable, Literal,
+    Any, Callable, Collection, Iterable, Literal,
     Optional, Sequence, Tuple, cast, overload,
 )
+from uuid import uuid4
 
 from django.conf import settings
 from django.core.mail import get_connection
 from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import (
+    Case, CharField, Exists, F, OuterRef, Q, QuerySet, When,
+)
+from django.db.models.functions import Substr
 from django.http.request import HttpRequest, MediaType
 from django.utils.functional import SimpleLazyObject, lazy, new_method_proxy
 from django.utils.html import escape as html_escape
 from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.timezone import make_aware
 
 import requests
+from anymail.backends.postmark import EmailBackend as PostmarkBackend
 from anymail.message import AnymailMessage
 from packvers import version
 
+from .pwned_passwords import RANGE_PREFIX_LENGTH, get_pwned_passwords_range
+
 
 def getattr_(obj: Any, path: Iterable[str]) -> Any:
     return functools.reduce(getattr, path.split('.') if isinstance(path, str) else path, obj)
@@ -109,6 +120,12 @@ def version_to_numeric_repr(version_string: str, precision: Optional[int] = None
             return result
 
 
+MASS_MAIL_VARIABLE_RE = re.compile(r'\{\s*([a-z]+)\s*\}')
+MASS_MAIL_SUBJECT_TAG_RE = re.compile(r'\[\[([a-zA-Z0-9_-]+)\]\]')
+# The maximal number of messages in a single call to Postmark's batch API.
+POSTMARK_BATCH_SIZE = 500
+
+
 def send_mass_html_mail(
         subject: str,
         text_content: str,
@@ -142,12 +159,14 @@ def send_mass_html_mail(
     messages: Sequence[AnymailMessage] = []
     default_from = settings.DEFAULT_FROM_EMAIL
 
-    bulk_sending_supported = False
-    if bulk_sending_supported:  # pragma: no cover
-        raise NotImplementedError
+    bulk_sending_supported = isinstance(connection, PostmarkBackend)
+    if bulk_sending_supported:
+        if not customizations:
+            return 0
+        return _send_mass_html_mail_via_postmark_templates(
+            subject, text_content, html_content, from_email or default_from,
+            customizations, connection)
     else:
-        variable_pattern = re.compile(r'\{\s*([a-z]+)\s*\}')
-
         def replacement_transform(
                 match: re.Match[str], recipient: str, transform: Callable[[Any], str],
         ) -> str:
@@ -159,9 +178,9 @@ def send_mass_html_mail(
                 replacement_transform, recipient=recipient, transform=lambda v: v)
             html_transform = functools.partial(
                 replacement_transform, recipient=recipient, transform=html_escape)
-            single_subject = variable_pattern.sub(text_transform, subject)
-            single_text = variable_pattern.sub(text_transform, text_content)
-            single_html = variable_pattern.sub(html_transform, html_content)
+            single_subject = MASS_MAIL_VARIABLE_RE.sub(text_transform, subject)
+            single_text = MASS_MAIL_VARIABLE_RE.sub(text_transform, text_content)
+            single_html = MASS_MAIL_VARIABLE_RE.sub(html_transform, html_content)
 
             message = AnymailMessage(
                 single_subject, single_text, from_email or default_from,
@@ -171,29 +190,243 @@ def send_mass_html_mail(
             message.attach_alternative(single_html, 'text/html')
             messages.append(message)
 
-    subject_tag_re = re.compile(r'\[\[([a-zA-Z0-9_-]+)\]\]')
     for message in messages:
-        message.subject = ''.join(message.subject.splitlines())
-        if tag_match := re.match(subject_tag_re, message.subject):
-            message.tags = [tag_match.group(1)]
-            message.subject = message.subject.removeprefix(tag_match.group()).strip()
-        message.metadata = {'env': settings.ENVIRONMENT}
-        message.extra_headers.update({
-            'Reply-To': 'Pasporta Servo <saluton@pasportaservo.org>',
-        })
-        # TODO: Implement custom one-click unsubscribe.
-        message.esp_extra = {'MessageStream': 'broadcast'}
-        setattr(message, 'mass_mail', True)
+        _prepare_mass_mail_message(message)
 
+    # Since bulk dispatching is unavailable, a fallback of the manually
+    # constructed set of individual messages is used.
     num_sent = connection.send_messages(messages)
-    if bulk_sending_supported:  # pragma: no cover
-        # Only a single message is sent, but it will be delivered to multiple
-        # recipients (individually).
-        return len(customizations)
-    else:
-        # Since bulk dispatching is unavailable, a fallback of the manually
-        # constructed set of individual messages is used.
-        return num_sent or 0
+    return num_sent or 0
+
+
+def _prepare_mass_mail_message(message: AnymailMessage):
+    message.subject = ''.join(message.subject.splitlines())
+    if tag_match := re.match(MASS_MAIL_SUBJECT_TAG_RE, message.subject):
+        message.tags = [tag_match.group(1)]
+        message.subject = message.subject.removeprefix(tag_match.group()).strip()
+    message.metadata = {'env': settings.ENVIRONMENT}
+    message.extra_headers.update({
+        'Reply-To': 'Pasporta Servo <saluton@pasportaservo.org>',
+    })
+    # TODO: Implement custom one-click unsubscribe.
+    message.esp_extra = {'MessageStream': 'broadcast'}
+    setattr(message, 'mass_mail', True)
+
+
+def _send_mass_html_mail_via_postmark_templates(
+        subject: str,
+        text_content: str,
+        html_content: str,
+        from_email: str,
+        customizations: dict[str, dict[str, str]],
+        connection: PostmarkBackend,
+) -> int:
+    """
+    Sends the messages using Postmark's batch API: the placeholders of the
+    content are converted to the template syntax of Postmark (Mustachio), a
+    temporary template is created on the server, and the messages are sent in
+    batches, each with the values of the variables per recipient. A tag in the
+    subject is recognized only before the replacement of the placeholders.
+    """
+    variables = sorted({name for values in customizations.values() for name in values})
+
+    def template_syntax(content: str, escaped: bool) -> str:
+        def replacement(match: re.Match[str]) -> str:
+            if match.group(1) not in variables:
+                return match.group(0)
+            return f'{{{{{match.group(1)}}}}}' if escaped else f'{{{{{{{match.group(1)}}}}}}}'
+        return MASS_MAIL_VARIABLE_RE.sub(replacement, content)
+
+    subject = ''.join(subject.splitlines())
+    tag_match = re.match(MASS_MAIL_SUBJECT_TAG_RE, subject)
+    if tag_match:
+        subject = subject.removeprefix(tag_match.group()).strip()
+    # A recipient without a value for one of the variables receives the
+    # placeholder unchanged, same as when the replacements are done manually.
+    merge_data = {
+        recipient.strip(): {
+            name: str(values[name]) if name in values else f'{{{name}}}'
+            for name in variables
+        }
+        for recipient, values in customizations.items()
+    }
+
+    api_headers = {
+        'Accept': 'application/json',
+        'X-Postmark-Server-Token': connection.server_token,
+    }
+    try:
+        response = requests.post(
+            f'{connection.api_url}templates',
+            json={
+                'Name': f'Mass mail {uuid4().hex}',
+                'TemplateType': 'Standard',
+                'Subject': template_syntax(subject, escaped=False),
+                'TextBody': template_syntax(text_content, escaped=False),
+                'HtmlBody': template_syntax(html_content, escaped=True),
+            },
+            headers=api_headers, timeout=30,
+        )
+        response.raise_for_status()
+        template_id = response.json()['TemplateId']
+    except (requests.exceptions.RequestException, KeyError, ValueError):
+        if not connection.fail_silently:
+            raise
+        return 0
+
+    try:
+        messages: list[AnymailMessage] = []
+        for recipients_batch in batched(merge_data, POSTMARK_BATCH_SIZE):
+            message = AnymailMessage(
+                '', '', from_email, list(recipients_batch),
+                template_id=template_id,
+                merge_data={recipient: merge_data[recipient] for recipient in recipients_batch},
+            )
+            _prepare_mass_mail_message(message)
+            if tag_match:
+                message.tags = [tag_match.group(1)]
+            messages.append(message)
+        connection.send_messages(messages)
+    finally:
+        try:
+            requests.delete(
+                f'{connection.api_url}templates/{template_id}', headers=api_headers, timeout=30)
+        except requests.exceptions.RequestException:
+            pass
+
+    # Each message is delivered to multiple recipients (individually).
+    return sum(
+        1
+        for message in messages
+        for recipient_status in message.anymail_status.recipients.values()
+        if recipient_status.status not in ('failed', 'invalid', 'rejected')
+    )
+
+
+def raw_list_to_usernames_and_emails(raw_id_list: str) -> (
+        tuple[Collection[str], Collection[str]]
+):
+    # Usernames or email addresses.
+    process_ids = [
+        value.strip()
+        for single_line in raw_id_list.splitlines()
+        for value in single_line.split(',')
+        if value.strip()
+    ]
+    # Only values that look like an email address (with an `@` somewhere in the middle).
+    process_emails = {value for value in process_ids if value.count('@', 1, -1) == 1}
+    # The same email addresses with the invalid marker, to cover both cases in the DB.
+    process_emails |= {f"{settings.INVALID_PREFIX}{email}" for email in process_emails}
+
+    return process_ids, process_emails
+
+
+def mass_mail_recipients(
+        category: str,
+        include_users: str = "",
+        exclude_users: str = "",
+        reference_time: Optional[datetime] = None,
+) -> QuerySet:
+    """
+    Selects the profiles to which a mass mail of the given category is sent,
+    keeping a single profile (the earliest one) for each email address. Since
+    the selection depends only on plain values, each of the tasks sending the
+    mail to a part of the recipients can repeat it.
+    """
+    from hosting.models import Place, Profile
+
+    opening = make_aware(datetime(2014, 11, 24))
+    profiles = Profile.objects_raw.none()
+
+    if category == "not_hosts":
+        # only active profiles, linked to existing user accounts
+        profiles = Profile.objects_raw.filter(user__isnull=False, user__last_login__isnull=False)
+        # exclude completely those who have at least one active available place
+        profiles = profiles.exclude(owned_places__in=Place.objects_raw.filter(available=True))
+        # remove profiles with places available in the past, that is deleted
+        profiles = profiles.filter(Q(owned_places__available=False) | Q(owned_places__isnull=True))
+    elif category == "old_system":
+        # those who logged in before the opening date; essentially, never used the new system
+        profiles = Profile.objects_raw.filter(user__last_login__lte=opening)
+    elif category == "specified":
+        # profiles indicated via the form (and linked to existing user accounts)
+        include_ids, include_emails = raw_list_to_usernames_and_emails(include_users)
+        profiles = Profile.objects_raw.filter(
+            Q(user__username__in=include_ids) | Q(user__email__in=include_emails)
+        )
+    elif category in ("in_book", "not_in_book"):
+        # those who logged in after the opening date
+        profiles = Profile.objects_raw.filter(user__last_login__gt=opening)
+        # filter by active & available places according to 'in-book?' selection
+        places_in_book = Place.objects_raw.filter(
+            owner=OuterRef('pk'), in_book=True, available=True)
+        places_not_in_book = Place.objects_raw.filter(
+            owner=OuterRef('pk'), in_book=False, available=True)
+        if category == "in_book":
+            profiles = profiles.filter(Exists(places_in_book))
+        elif category == "not_in_book":  # pragma: no branch
+            profiles = profiles.filter(Exists(places_not_in_book) & ~Exists(places_in_book))
+    elif category in ("users_active_1y", "users_active_2y"):
+        # profiles active in the last 1 or 2 years (and linked to existing user accounts)
+        cutoff = reference_time or make_aware(datetime.today())
+        cutoff = cutoff - timedelta(days=365 if category == "users_active_1y" else 730)
+        profiles = Profile.objects_raw.filter(user__last_login__gte=cutoff)
+    # ensure that the account is still active and the person is not deceased
+    profiles = profiles.filter(user__is_active=True, death_date__isnull=True)
+    # filter out accounts explicitely marked for exclusion
+    if exclude_users and category != 'test':
+        exclude_ids, exclude_emails = raw_list_to_usernames_and_emails(exclude_users)
+        profiles = profiles.exclude(user__username__in=exclude_ids)
+        profiles = profiles.exclude(user__email__in=exclude_emails)
+    # keep only the earliest of the profiles sharing an email address (which
+    # might be marked as invalid for some of them)
+    profiles = profiles.alias(clean_email=Case(
+        When(
+            user__email__startswith=settings.INVALID_PREFIX,
+            then=Substr('user__email', len(settings.INVALID_PREFIX) + 1),
+        ),
+        default=F('user__email'),
+        output_field=CharField(),
+    ))
+    profiles = profiles.exclude(
+        Exists(profiles.filter(pk__lt=OuterRef('pk'), clean_email=OuterRef('clean_email')))
+    )
+    # finally remove duplicates
+    profiles = profiles.distinct()
+    # leave only the needed fields
+    return profiles.select_related('user').only(
+        'first_name', 'last_name', 'user__username', 'user__email',
+    )
+
+
+def send_mass_html_mail_to_profiles(
+        subject: str,
+        text_content: str,
+        html_content: str,
+        from_email: Optional[str],
+        recipients_criteria: dict[str, Any],
+        profile_ids_range: tuple[int, int],
+        name_placeholder: str,
+        **kwargs,
+) -> int:
+    """
+    Sends a message to each of the profiles within the given range of primary
+    keys which are selected by `mass_mail_recipients` according to the given
+    criteria, customized with the name of the person. The recipients are looked
+    up only when the message is sent, which permits dividing a large list of
+    recipients into batches, without passing around the recipients themselves.
+    See `send_mass_html_mail` for the other parameters.
+    """
+    from hosting.utils import value_without_invalid_marker
+
+    profiles = mass_mail_recipients(**recipients_criteria).filter(pk__range=profile_ids_range)
+    customizations: dict[str, dict[str, str]] = {}
+    for profile in profiles.order_by('pk'):
+        customizations[value_without_invalid_marker(profile.user.email)] = {
+            'nomo': profile.name or name_placeholder,
+        }
+    return send_mass_html_mail(
+        subject, text_content, html_content, from_email, customizations, **kwargs)
 
 
 def sanitize_next(
@@ -254,25 +487,15 @@ def is_password_compromised(pwdvalue: str, full_list: bool = False):
     value appears in a dump from a past breach elsewhere.
     """
     pwdhash = hashlib.sha1(pwdvalue.encode()).hexdigest().upper()
-    try:
-        result = requests.get(
-            'https://api.pwnedpasswords.com/range/{}'.format(pwdhash[:5]),
-            headers={
-                'Add-Padding': 'true',
-                'User-Agent': 'pasportaservo.org',
-            }
-        )
-    except requests.exceptions.ConnectionError:
+    hashes_range = get_pwned_passwords_range(pwdhash[:RANGE_PREFIX_LENGTH])
+    if hashes_range is None:
         return None, None
-    else:
-        if result.status_code != requests.codes.ok:
-            return None, None
 
-    for line in result.text.splitlines():
+    for line in hashes_range.splitlines():
         suffix, count = line.split(':')
         count = int(count)
         if pwdhash.endswith(suffix):
             if count > 0:
-                return (True, count) if not full_list else (True, count, result.text)
+                return (True, count) if not full_list else (True, count, hashes_range)
             break
-    return (False, 0) if not full_list else (False, 0, result.text)
+    return (False, 0) if not full_list else (False, 0, hashes_range)
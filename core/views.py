@@ -2,9 +2,7 @@ import logging
 import re
 from copy import copy
 from datetime import datetime, timedelta
-from itertools import batched
-from traceback import format_exception
-from typing import TYPE_CHECKING, Any, Collection, cast
+from typing import Any, Callable, cast
 
 from django.conf import settings
 from django.contrib import messages
@@ -16,12 +14,10 @@ from django.contrib.auth.views import (
     PasswordResetConfirmView as PasswordResetConfirmBuiltinView,
     PasswordResetView as PasswordResetBuiltinView,
 )
-from django.contrib.flatpages.models import FlatPage
 from django.core.cache.backends.locmem import LocMemCache
 from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
-from django.core.mail import mail_admins, send_mail
+from django.core.mail import send_mail
 from django.db import transaction
-from django.db.models import Exists, OuterRef, Q
 from django.http import (
     Http404, HttpRequest, HttpResponse,
     HttpResponseRedirect, JsonResponse, QueryDict,
@@ -29,13 +25,12 @@ from django.http import (
 from django.shortcuts import get_object_or_404
 from django.template.loader import get_template
 from django.template.response import TemplateResponse
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.utils.functional import SimpleLazyObject, cached_property
 from django.utils.safestring import mark_safe
 from django.utils.text import format_lazy
-from django.utils.timezone import make_aware
 from django.utils.translation import (
     get_language, gettext, gettext_lazy as _, pgettext, pgettext_lazy,
 )
@@ -49,10 +44,6 @@ from commonmark import commonmark
 from django_q import tasks as async_tasks
 from django_q.brokers import get_broker
 from django_q.models import Task as QueuedTask
-from gql import Client as GQLClient, gql
-from gql.transport.exceptions import TransportError, TransportQueryError
-from gql.transport.requests import RequestsHTTPTransport as GQLHttpTransport
-from graphql import GraphQLError
 
 from blog.models import Post
 from core.templatetags.utils import split as text_split
@@ -68,7 +59,13 @@ from links.utils import create_unique_url
 from shop.models import Reservation
 
 from . import PasportaServoHttpRequest
+from .account_state import invalidate_account_state
 from .auth import AuthMixin, AuthRole
+from .feedback import (
+    resolve_feedback_submission,
+    submit_feedback_privately, submit_feedback_publicly,
+)
+from .flatpages import get_flat_page
 from .forms import (
     EmailStaffUpdateForm, EmailUpdateForm, FeedbackForm, MassMailForm,
     SystemPasswordChangeForm, SystemPasswordResetForm,
@@ -80,11 +77,10 @@ from .mixins import (
     UserModifyMixin, flatpages_as_templates,
 )
 from .models import FEEDBACK_TYPES, Agreement, Policy, SiteConfiguration
-from .utils import request_asks_for_json, sanitize_next, send_mass_html_mail
-
-if TYPE_CHECKING:
-    from hosting.models import FullProfile
-
+from .utils import (
+    mass_mail_recipients, request_asks_for_json, sanitize_next,
+    send_mass_html_mail, send_mass_html_mail_to_profiles,
+)
 
 User = get_user_model()
 
@@ -99,8 +95,7 @@ class HomeView(FlatpageAsTemplateMixin, generic.TemplateView):
 
     @cached_property
     def right_block(self):
-        block = FlatPage.objects.filter(url='/home-right-block/').values('content').first()
-        return self.render_flat_page(cast(FlatpageAsTemplateMixin.DictWithContent, block))
+        return self.render_flat_page(get_flat_page('/home-right-block/'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -333,8 +328,7 @@ class AgreementView(LoginRequiredMixin, FlatpageAsTemplateMixin, generic.Templat
 
     @cached_property
     def terms(self) -> list[str]:
-        tcpage = FlatPage.objects.filter(url='/terms-conditions/').values('content').first()
-        terms = self.render_flat_page(cast(FlatpageAsTemplateMixin.DictWithContent, tcpage))
+        terms = self.render_flat_page(get_flat_page('/terms-conditions/'))
         terms = terms.rstrip()
         if not terms:
             return []
@@ -401,6 +395,8 @@ class AgreementRejectView(LoginRequiredMixin, generic.TemplateView):
             agreement = Agreement.objects.filter(
                 user=request.user, policy_version=agreement, withdrawn__isnull=True)
             agreement.update(withdrawn=now)
+            # Bulk updates do not emit signals; the cached state is discarded explicitly.
+            invalidate_account_state(request.user.pk)
         logout(request)
         messages.info(request, _("Farewell !"))
         return HttpResponseRedirect(reverse_lazy('home'))
@@ -750,6 +746,7 @@ class FeedbackView(generic.View):
             else:
                 return TemplateResponse(request, self.template_names[False])
 
+        task_id = None
         if form.cleaned_data['message']:
             self.request = request
             feedback_type = FEEDBACK_TYPES[form.cleaned_data['feedback_on']]
@@ -759,12 +756,15 @@ class FeedbackView(generic.View):
                 else self.submit_publicly
             )
             # Submit the feedback.
-            method(feedback_type, message_text)
+            task_id = method(feedback_type, message_text)
         if request_asks_for_json(request):
-            return JsonResponse({
+            response_data = {
                 'result': True,
                 'submitted': bool(form.cleaned_data['message']),
-            })
+            }
+            if task_id:
+                response_data['status_url'] = reverse('user_feedback_status', kwargs={'task_id': task_id})
+            return JsonResponse(response_data)
         else:
             return TemplateResponse(
                 request,
@@ -772,110 +772,62 @@ class FeedbackView(generic.View):
                 {'submitted': bool(form.cleaned_data['message'])}
             )
 
-    def submit_privately(self, feedback_type, message_text, exception=None):
-        """
-        Sends the feedback privately to the maintainers, including details of exception
-        if occured during the public submission.
-        """
-        subject = gettext(
-            # xgettext:python-brace-format
-            "Feedback on {}."
-        ).format(
-            feedback_type.esperanto_name if str(get_language()).startswith('eo')
-            else feedback_type.name
-        )
+    def get_author(self) -> str:
         if self.request.user.is_authenticated:
-            body = f'{gettext("User")} {self.request.user.pk} ({self.request.user.username}):'
+            return f'{gettext("User")} {self.request.user.pk} ({self.request.user.username})'
         else:
-            body = f'{Profile.INCOGNITO}:'
-        body += '\n' + '-' * (len(body) - 1) + '\n\n'
-        body += message_text
-        if exception:
-            error_notice = "During public submission, an exception has occured."
-            error_notice += '\n\n'
-            error_notice += '\n'.join(format_exception(None, exception, None))
-
-        mail_admins(
-            subject,
-            body + (f'\n\n====\n{error_notice}' if exception else ''),
-            fail_silently=False)
+            return str(Profile.INCOGNITO)
 
-    def submit_publicly(self, feedback_type, message_text):
+    def submit_privately(self, feedback_type, message_text):
         """
-        Posts the feedback publicly in a dedicated forum thread. In case an exception
-        happens in the process, reverts to posting the feedback and the exception
-        details privately to the maintainers.
+        Sends the feedback privately to the maintainers.
         """
-        transport = GQLHttpTransport(
-            settings.GITHUB_GRAPHQL_HOST, auth=settings.GITHUB_ACCESS_TOKEN)
-        client = GQLClient(transport=transport, fetch_schema_from_transport=True)
+        submit_feedback_privately(feedback_type, message_text, self.get_author())
 
-        # Attempt fetching the ID of the previous submission from the session.
-        feedback_comment_id = self.request.session.get(f'feedback_{feedback_type.key}_comment_id')
+    def submit_publicly(self, feedback_type, message_text) -> str:
+        """
+        Queues the posting of the feedback publicly in a dedicated forum thread
+        (see `core.feedback.submit_feedback_publicly`). Returns the ID of the
+        task, whose outcome can be verified via the FeedbackStatusView.
+        """
+        session = self.request.session
+        # Fetch the ID of the previous submission; if it is still in the queue,
+        # the task will look up its outcome once it runs itself.
+        previous_outcome = resolve_feedback_submission(session, feedback_type.key)
+        task_id = async_tasks.async_task(
+            submit_feedback_publicly, feedback_type.key, message_text,
+            author=self.get_author(),
+            signature=gettext("Sent from the website {env} ({user})").format(
+                env=settings.ENVIRONMENT if settings.ENVIRONMENT != 'PROD' else '',
+                user=self.request.user.pk or '/'),
+            language=get_language(),
+            comment_id=session.get(f'feedback_{feedback_type.key}_comment_id'),
+            previous_task_id=(
+                session.get(f'feedback_{feedback_type.key}_task_id') if previous_outcome is None else None
+            ),
+            group='feedback',
+        )
+        session[f'feedback_{feedback_type.key}_task_id'] = task_id
+        return task_id
 
-        if feedback_comment_id:
-            # If an ID is available, attempt fetching the contents of the previous
-            # submission from the remote forum. (We do not persist the contents ourselves.)
-            try:
-                comment = client.execute(
-                    gql("""
-                        query($comment_id: ID!) {
-                            node (id: $comment_id) { ... on DiscussionComment {
-                                body
-                            } }
-                        }
-                    """),
-                    variable_values={'comment_id': feedback_comment_id})
-            except (GraphQLError, TransportError, TransportQueryError):
-                # Query failed for some reason, treat this as new submission.
-                feedback_comment_id = None
-                complete_text = message_text
-            else:
-                # Previous contents are available, concatenate them with the new feedback.
-                complete_text = comment['node']['body'] + "\n\n----\n\n" + message_text
-
-            # Perform an update GraphQL mutation.
-            comment_query = gql("""
-                mutation($comment_id: ID!, $body_text: String!) {
-                    updateDiscussionComment (input: {commentId: $comment_id, body: $body_text}) {
-                        comment { id url }
-                    }
-                }
-            """)
-            comment_query.operation = 'updateDiscussionComment'
-            params = {'comment_id': feedback_comment_id, 'body_text': complete_text}
-
-        if not feedback_comment_id:
-            # Previous submission ID is not available, this is new submission.
-            # Perform an insert GraphQL mutation.
-            comment_query = gql("""
-                mutation($disc_id: ID!, $body_text: String!) {
-                    addDiscussionComment (input: {discussionId: $disc_id, body: $body_text}) {
-                        comment { id url }
-                    }
-                }
-            """)
-            comment_query.operation = 'addDiscussionComment'
-            complete_text = (
-                '_`'
-                + gettext("Sent from the website {env} ({user})").format(
-                    env=settings.ENVIRONMENT if settings.ENVIRONMENT != 'PROD' else '',
-                    user=self.request.user.pk or '/')
-                + '`_ \n\n'
-                + message_text
-            )
-            params = {'disc_id': feedback_type.foreign_id, 'body_text': complete_text}
 
-        try:
-            result = client.execute(comment_query, variable_values=params)
-        except (GraphQLError, TransportError, TransportQueryError) as ex:
-            # In case the query fails for some reason, let maintainers know that reason.
-            self.submit_privately(feedback_type, message_text, ex)
-        else:
-            # Store the ID of the submission in the session, for future reuse.
-            self.request.session[f'feedback_{feedback_type.key}_comment_id'] = (
-                result[comment_query.operation]['comment']['id']
-            )
+class FeedbackStatusView(generic.View):
+    """
+    Reports the outcome of a public submission of feedback, queued earlier in
+    the current session.
+    """
+    @method_decorator(never_cache)
+    def get(self, request: HttpRequest, *args, **kwargs):
+        feedback_key = next(
+            (key for key in FEEDBACK_TYPES if request.session.get(f'feedback_{key}_task_id') == kwargs['task_id']),
+            None
+        )
+        if feedback_key is None:
+            raise Http404("Unknown feedback submission")
+        outcome = resolve_feedback_submission(request.session, feedback_key)
+        if outcome is None:
+            return JsonResponse({'result': True, 'done': False})
+        return JsonResponse({'result': True, 'done': True, **outcome})
 
 
 class MassMailView(AuthMixin, generic.FormView):
@@ -887,6 +839,8 @@ class MassMailView(AuthMixin, generic.FormView):
     # Keep the email address separate from the one used for transactional
     # emails, for better email sender reputation.
     mailing_address = 'anoncoj@pasportaservo.org'
+    # Number of recipients handled by each of the asynchronous tasks.
+    batch_size = 500
 
     def dispatch(self, request, *args, **kwargs):
         kwargs['auth_base'] = None
@@ -910,23 +864,6 @@ class MassMailView(AuthMixin, generic.FormView):
             sent=self.nb_sent,
         )
 
-    def raw_list_to_usernames_and_emails(self, raw_id_list: str) -> (
-            tuple[Collection[str], Collection[str]]
-    ):
-        # Usernames or email addresses.
-        process_ids = [
-            value.strip()
-            for single_line in raw_id_list.splitlines()
-            for value in single_line.split(',')
-            if value.strip()
-        ]
-        # Only values that look like an email address (with an `@` somewhere in the middle).
-        process_emails = {value for value in process_ids if value.count('@', 1, -1) == 1}
-        # The same email addresses with the invalid marker, to cover both cases in the DB.
-        process_emails |= {f"{settings.INVALID_PREFIX}{email}" for email in process_emails}
-
-        return process_ids, process_emails
-
     def form_valid(self, form: MassMailForm) -> HttpResponse:
         body: str = form.cleaned_data['body']
         md_body: str = cast(str, commonmark(body))
@@ -937,62 +874,16 @@ class MassMailView(AuthMixin, generic.FormView):
         default_from = f'Pasporta Servo <{self.mailing_address}>'
         template = get_template('email/mass_email.html')
 
-        opening = make_aware(datetime(2014, 11, 24))
-        profiles = Profile.objects_raw.none()
-
-        if category == "not_hosts":
-            # only active profiles, linked to existing user accounts
-            profiles = Profile.objects_raw.filter(user__isnull=False, user__last_login__isnull=False)
-            # exclude completely those who have at least one active available place
-            profiles = profiles.exclude(owned_places__in=Place.objects_raw.filter(available=True))
-            # remove profiles with places available in the past, that is deleted
-            profiles = profiles.filter(Q(owned_places__available=False) | Q(owned_places__isnull=True))
-        elif category == "old_system":
-            # those who logged in before the opening date; essentially, never used the new system
-            profiles = Profile.objects_raw.filter(user__last_login__lte=opening)
-        elif category == "specified":
-            # profiles indicated via the form (and linked to existing user accounts)
-            include_ids, include_emails = (
-                self.raw_list_to_usernames_and_emails(form.cleaned_data.get('include_users', ""))
-            )
-            profiles = Profile.objects_raw.filter(
-                Q(user__username__in=include_ids) | Q(user__email__in=include_emails)
-            )
-        elif category in ("in_book", "not_in_book"):
-            # those who logged in after the opening date
-            profiles = Profile.objects_raw.filter(user__last_login__gt=opening)
-            # filter by active & available places according to 'in-book?' selection
-            places_in_book = Place.objects_raw.filter(
-                owner=OuterRef('pk'), in_book=True, available=True)
-            places_not_in_book = Place.objects_raw.filter(
-                owner=OuterRef('pk'), in_book=False, available=True)
-            if category == "in_book":
-                profiles = profiles.filter(Exists(places_in_book))
-            elif category == "not_in_book":  # pragma: no branch
-                profiles = profiles.filter(Exists(places_not_in_book) & ~Exists(places_in_book))
-        elif category in ("users_active_1y", "users_active_2y"):
-            # profiles active in the last 1 or 2 years (and linked to existing user accounts)
-            cutoff = make_aware(datetime.today())
-            cutoff = cutoff - timedelta(days=365 if category == "users_active_1y" else 730)
-            profiles = Profile.objects_raw.filter(user__last_login__gte=cutoff)
-        # ensure that the account is still active and the person is not deceased
-        profiles = profiles.filter(user__is_active=True, death_date__isnull=True)
-        # filter out accounts explicitely marked for exclusion
-        if form.cleaned_data.get('exclude_users') and category != 'test':
-            exclude_ids, exclude_emails = (
-                self.raw_list_to_usernames_and_emails(form.cleaned_data['exclude_users'])
-            )
-            profiles = profiles.exclude(user__username__in=exclude_ids)
-            profiles = profiles.exclude(user__email__in=exclude_emails)
-        # finally remove duplicates
-        profiles = profiles.distinct()
-        # leave only the needed fields
-        profiles = profiles.select_related('user').only(
-            'first_name', 'last_name', 'user__username', 'user__email',
-        )
+        recipients_criteria = {
+            'category': category,
+            'include_users': form.cleaned_data.get('include_users', ""),
+            'exclude_users': form.cleaned_data.get('exclude_users', ""),
+            'reference_time': timezone.now(),
+        }
+        profiles = mass_mail_recipients(**recipients_criteria)
 
         if self.simulation:
-            self.nb_sent = 1 if category == 'test' else len(profiles)
+            self.nb_sent = 1 if category == 'test' else profiles.count()
             return super().form_valid(form)
 
         message = (
@@ -1003,27 +894,37 @@ class MassMailView(AuthMixin, generic.FormView):
                 'body_alignment': form.cleaned_data.get('alignment'),
             }),
             default_from,
-            cast(dict[str, dict[str, str]], {}),
         )
-        RECIPIENTS = -1
 
         if category == 'test':
             test_email: str = form.cleaned_data['test_email']
-            message[RECIPIENTS][test_email] = {
-                'nomo': test_email.partition('@')[0].capitalize(),
-            }
+            send_func: Callable[..., int] = send_mass_html_mail
+            send_args = [(*message, {
+                test_email: {'nomo': test_email.partition('@')[0].capitalize()},
+            })]
+            self.nb_sent = 1
         else:
-            name_placeholder = _("user")
-            for profile in profiles:
-                user_clean_email = (
-                    value_without_invalid_marker(cast('FullProfile', profile).user.email)
-                )
-                message[RECIPIENTS][user_clean_email] = {
-                    'nomo': profile.name or name_placeholder,
-                }
+            # A single profile is kept for each email address. The recipients
+            # are divided into batches by ranges of primary keys, and each task
+            # looks up the names and the email addresses of its profiles by
+            # itself, repeating the selection with the same criteria.
+            send_func = send_mass_html_mail_to_profiles
+            profile_ids_ranges: list[list[int]] = []
+            profile_ids = profiles.order_by('pk').values_list('pk', flat=True)
+            self.nb_sent = 0
+            for profile_id in profile_ids.iterator(chunk_size=2000):
+                if self.nb_sent % self.batch_size == 0:
+                    profile_ids_ranges.append([profile_id, profile_id])
+                else:
+                    profile_ids_ranges[-1][1] = profile_id
+                self.nb_sent += 1
+            send_args = [
+                (*message, recipients_criteria, tuple(profile_ids_range), str(_("user")))
+                for profile_ids_range in profile_ids_ranges
+            ]
 
         async_broker = get_broker()
-        async_iter = async_tasks.Iter(send_mass_html_mail, broker=async_broker, kwargs={
+        async_iter = async_tasks.Iter(send_func, broker=async_broker, kwargs={
             'timeout': 600,  # The task can be worked on for the ample time of 10 mins.
             'ack_failure': True,  # Remove the task from queue also in case of failure.
         })
@@ -1032,10 +933,9 @@ class MassMailView(AuthMixin, generic.FormView):
             # process will have its own local memory region - separate from the one of
             # the WSGI process...
             async_iter.sync = True
-        for recipient_batch in batched(message[RECIPIENTS].items(), 500):
-            async_iter.append(*message[:-1], dict(recipient_batch))
+        for args in send_args:
+            async_iter.append(*args)
         self.async_task_id = async_iter.run()
-        self.nb_sent = len(message[RECIPIENTS])
         return super().form_valid(form)
 
 
@@ -1059,7 +959,8 @@ class MassMailSentView(AuthMixin, generic.TemplateView):
         if task_id := self.kwargs.get('task_id'):
             task = QueuedTask.get_task(task_id)
             context['async_result'] = cast(dict[str, bool | int | str | None], {
-                'exists': task and task.func.endswith('.send_mass_html_mail'),
+                'exists': task and task.func.endswith(
+                    ('.send_mass_html_mail', '.send_mass_html_mail_to_profiles')),
             })
             if context['async_result']['exists']:
                 assert task is not None
@@ -22,8 +22,8 @@ from core.admin.filters import YearBracketFilter
 from maps.widgets import AdminMapboxGlWidget
 
 from ..models import (
-    Condition, ContactPreference, CountryRegion,
-    PasportaServoUser, Phone, Place, Preferences, Profile,
+    Condition, ContactPreference, CountryRegion, GazetteerEntry, GeocodedQuery,
+    PasportaServoUser, Phone, Place, PlaceStatistics, Preferences, Profile,
     TravelAdvice, VisibilitySettings, Website, Whereabouts,
 )
 from .filters import (
@@ -606,6 +606,56 @@ class WhereaboutsAdmin(ShowCountryMixin, admin.ModelAdmin):
     }
 
 
+@admin.register(GazetteerEntry)
+class GazetteerEntryAdmin(ShowCountryMixin, admin.ModelAdmin):
+    list_display = ('name', 'state', 'display_country', 'type', 'population')
+    search_fields = ('name', 'lookup_name', 'state')
+    list_filter = ('type',)
+    fields = ('type', 'name', 'lookup_name', 'state', 'country', 'population', 'center', 'bbox')
+    readonly_fields = ('lookup_name',)
+    formfield_overrides = {
+        PointField: {'widget': OSMWidget},
+        LineStringField: {'widget': OSMWidget},
+    }
+
+
+@admin.register(GeocodedQuery)
+class GeocodedQueryAdmin(admin.ModelAdmin):
+    list_display = ('query', 'country', 'language', 'hits', 'created_on', 'last_used_on')
+    search_fields = ('query',)
+    list_filter = ('language',)
+    date_hierarchy = 'created_on'
+    fields = ('query', 'country', 'language', 'response', 'hits', 'created_on', 'last_used_on')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(PlaceStatistics)
+class PlaceStatisticsAdmin(ShowCountryMixin, admin.ModelAdmin):
+    list_display = (
+        'display_country', 'listing',
+        'place_count', 'checked_count', 'only_confirmed_count', 'host_count', 'city_count',
+        'updated_on',
+    )
+    list_filter = ('listing',)
+    ordering = ('listing', 'country')
+    list_per_page = 300
+
+    def display_country(self, obj: PlaceStatistics):
+        return super().display_country(obj) if obj.country else _("total")
+
+    display_country.short_description = ShowCountryMixin.display_country.short_description
+    display_country.admin_order_field = 'country'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Condition)
 class ConditionAdmin(admin.ModelAdmin):
     list_display = ('name', 'name_en', 'abbr', 'restriction', 'category')
@@ -0,0 +1,71 @@
+"""
+In-process index of the travel advices active today, per country, so that the
+advices shown for a place or a country do not have to be queried each time.
+
+All the active advices are loaded at once (there are just a few of them), and
+kept until the end of the day or until any of the advices changes (see
+`hosting.caching.ProcessLocalIndex`).
+"""
+
+from datetime import date
+from typing import TYPE_CHECKING
+
+from django.utils import timezone
+
+from .caching import ProcessLocalIndex
+
+if TYPE_CHECKING:
+    from .models import TravelAdvice
+
+
+class ActiveTravelAdviceIndex(ProcessLocalIndex):
+    version_key = 'travel-advices:version'
+
+    def __init__(self):
+        super().__init__()
+        self._advices: dict[str, tuple['TravelAdvice', ...]] | None = None
+        self._advices_for_any: tuple['TravelAdvice', ...] = ()
+        self._day: date | None = None
+
+    def clear(self):
+        self._advices, self._advices_for_any = None, ()
+
+    def get_for_country(self, country_code: str) -> tuple['TravelAdvice', ...]:
+        today = timezone.localdate()
+        with self._lock:
+            self.validate()
+            if self._advices is None or self._day != today:
+                self._load()
+                self._day = today
+            return self._advices.get(country_code, self._advices_for_any)  # type: ignore[union-attr]
+
+    def _load(self):
+        from .models import TravelAdvice
+
+        # The advices are kept in the order in which they are to be shown.
+        active_advices = list(TravelAdvice.objects.filter(is_active=True).order_by('-active_until', '-id'))
+        country_codes = {code for advice in active_advices for code in advice.country_codes}
+        self._advices = {
+            country_code: tuple(
+                advice for advice in active_advices
+                if not advice.country_codes or country_code in advice.country_codes
+            )
+            for country_code in country_codes
+        }
+        self._advices_for_any = tuple(advice for advice in active_advices if not advice.country_codes)
+
+
+_index = ActiveTravelAdviceIndex()
+
+
+def get_active_travel_advices(country_code: str) -> tuple['TravelAdvice', ...]:
+    """
+    Returns the travel advices active today which are indicated for the given
+    country: those applicable to a list of countries among which is the given
+    one, and those applicable to any country.
+    """
+    return _index.get_for_country(country_code.upper())
+
+
+def travel_advices_changed(**kwargs):
+    _index.data_changed(**kwargs)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
 from django.db.models import signals
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
@@ -26,6 +27,37 @@ class HostingConfig(AppConfig):
             )
         signals.post_save.connect(profile_post_save, sender='hosting.Profile')
 
+        # The configuration of the tracking managers is memoized per request.
+        from .managers import (
+            tracking_configuration_changed,
+            tracking_request_finished, tracking_request_started,
+        )
+        request_started.connect(tracking_request_started, dispatch_uid='tracking-config--start')
+        request_finished.connect(tracking_request_finished, dispatch_uid='tracking-config--finish')
+        for sender in ('core.SiteConfiguration', 'core.SiteSwitch'):
+            signals.post_save.connect(
+                tracking_configuration_changed, sender=sender, dispatch_uid=f'tracking-config--{sender}')
+            signals.post_delete.connect(
+                tracking_configuration_changed, sender=sender, dispatch_uid=f'tracking-config--{sender}')
+
+        # Changes of the places, their owners, or the visibility settings cause
+        # the materialized statistics of the affected countries to be updated.
+        for sender in ('hosting.Place', 'hosting.VisibilitySettingsForPlace', 'hosting.Profile'):
+            signals.post_save.connect(
+                place_statistics_source_changed, sender=sender, dispatch_uid=f'place-statistics--{sender}')
+            signals.post_delete.connect(
+                place_statistics_source_changed, sender=sender, dispatch_uid=f'place-statistics--{sender}')
+
+        # The indexes of the subregions and of the travel advices are replaced
+        # when any of the indexed objects changes.
+        from .advices import travel_advices_changed
+        from .regions import country_regions_changed
+        for sender, receiver_func, uid in (
+                ('hosting.CountryRegion', country_regions_changed, 'country-regions'),
+                ('hosting.TravelAdvice', travel_advices_changed, 'travel-advices')):
+            signals.post_save.connect(receiver_func, sender=sender, dispatch_uid=f'{uid}--save')
+            signals.post_delete.connect(receiver_func, sender=sender, dispatch_uid=f'{uid}--delete')
+
 
 def make_visibility_receivers(for_sender, field_name, visibility_model):
     """
@@ -81,3 +113,36 @@ def profile_post_save(sender, **kwargs):
         return
     if instance.user_id and not Preferences.objects.filter(profile_id=instance.pk).exists():
         Preferences.objects.create(profile=instance)
+
+
+# The fields of a profile taken into account by the statistics of its places.
+PROFILE_FIELDS_OF_PLACE_STATISTICS = {'deleted_on', 'death_date'}
+
+
+def place_statistics_source_changed(sender, **kwargs):
+    from .models import Place
+    from .statistics import schedule_place_statistics_update
+
+    if kwargs.get('raw'):
+        return
+    instance = kwargs['instance']
+    model_name = sender._meta.model_name
+    update_fields = kwargs.get('update_fields')
+    if model_name == 'profile' and update_fields is not None and not (
+            update_fields & PROFILE_FIELDS_OF_PLACE_STATISTICS):
+        # Only some of the profile's details affect the statistics of its places.
+        return
+    if model_name == 'place':
+        countries = [instance.country.code]
+    elif model_name == 'visibilitysettingsforplace':
+        countries = (
+            Place.objects_raw.filter(pk=instance.model_id).values_list('country', flat=True)
+            if instance.model_id else []
+        )
+    else:
+        # The places of a deleted profile are deleted as well.
+        countries = (
+            Place.all_objects.filter(owner_id=instance.pk)
+            .select_related(None).values_list('country', flat=True)
+        )
+    schedule_place_statistics_update(countries)
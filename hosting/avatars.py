@@ -0,0 +1,144 @@
+"""
+Thumbnails of the avatars of the profiles: renditions in the WebP and in the
+JPEG formats, at a few fixed sizes (of the shorter side of the image) suitable
+for the slots in which avatars are shown (40 to 140 pixels, at single and at
+double density).
+
+The thumbnails are generated in a background task once a new avatar is saved;
+the sizes generated for the current avatar are recorded in the profile, so that
+the `srcset` of an avatar can be composed without consulting the storage.
+"""
+
+import io
+import logging
+from typing import TYPE_CHECKING
+
+from django.db import transaction
+
+from django_q.tasks import async_task
+from PIL import Image, ImageOps
+
+if TYPE_CHECKING:  # pragma: no cover
+    from django.core.files.storage import Storage
+
+    from .models import Profile
+
+AVATAR_THUMBNAIL_SIZES = (40, 80, 140, 280)
+
+# The format of the images for Pillow, by the file extension.
+AVATAR_THUMBNAIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+
+AVATAR_THUMBNAIL_QUALITY = 82
+
+
+def _avatar_upload_to():
+    from .models import Profile
+    return Profile._meta.get_field('avatar').upload_to
+
+
+def avatar_thumbnail_name(avatar_name: str, size: int, extension: str) -> str:
+    return _avatar_upload_to().thumbnail_name(avatar_name, size, extension)
+
+
+def render_avatar_thumbnails(image: Image.Image) -> dict[tuple[int, str], tuple[int, bytes]]:
+    """
+    Scales the image down so that its shorter side is of each of the sizes (the
+    image is never scaled up), and encodes it in each of the formats. Returns
+    the width and the content of each thumbnail, by the size and the extension.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode.endswith('A') else 'RGB')
+    opaque_image = image
+    if image.mode == 'RGBA':
+        # JPEG does not support transparency; a white background is assumed.
+        opaque_image = Image.new('RGB', image.size, (255, 255, 255))
+        opaque_image.paste(image, mask=image.getchannel('A'))
+
+    thumbnails = {}
+    shorter_side = min(image.size)
+    for size in AVATAR_THUMBNAIL_SIZES:
+        if size > shorter_side:
+            break
+        scale = size / shorter_side
+        dimensions = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        for extension, image_format in AVATAR_THUMBNAIL_FORMATS.items():
+            source = opaque_image if image_format == 'JPEG' else image
+            output = io.BytesIO()
+            source.resize(dimensions, Image.Resampling.LANCZOS).save(
+                output, format=image_format, quality=AVATAR_THUMBNAIL_QUALITY, optimize=True)
+            thumbnails[(size, extension)] = (dimensions[0], output.getvalue())
+    return thumbnails
+
+
+def delete_avatar_thumbnails(storage: 'Storage', avatar_name: str):
+    for size in AVATAR_THUMBNAIL_SIZES:
+        for extension in AVATAR_THUMBNAIL_FORMATS:
+            storage.delete(avatar_thumbnail_name(avatar_name, size, extension))
+
+
+def make_avatar_thumbnails(profile: 'Profile') -> list[list[int]]:
+    """
+    Generates and stores the thumbnails of the avatar of the profile. Returns
+    the pairs of the size and the width of the generated thumbnails (to be
+    recorded in the profile); none are generated when the avatar is missing
+    from the storage or is not a readable image.
+    """
+    storage = profile.avatar.storage
+    try:
+        with profile.avatar.open('rb') as avatar_file, Image.open(avatar_file) as image:
+            image.load()
+            thumbnails = render_avatar_thumbnails(image)
+    except (OSError, ValueError, Image.DecompressionBombError) as err:
+        logging.getLogger('PasportaServo.avatars').warning(
+            "Could not generate thumbnails for the avatar %s: %s", profile.avatar.name, err)
+        return []
+    generated_sizes = {}
+    for (size, extension), (width, content) in thumbnails.items():
+        name = avatar_thumbnail_name(profile.avatar.name, size, extension)
+        # The name of a thumbnail is fixed, thus a leftover file is replaced.
+        storage.delete(name)
+        with storage.open(name, 'wb') as thumbnail_file:
+            thumbnail_file.write(content)
+        generated_sizes[size] = width
+    return [[size, width] for size, width in sorted(generated_sizes.items())]
+
+
+def generate_avatar_thumbnails(profile_id: int, obsolete_avatar_name: str = ''):
+    """
+    Background task: generates the thumbnails of the current avatar of the
+    profile, and removes those of the avatar it replaced.
+    """
+    from .models import Profile
+
+    if obsolete_avatar_name:
+        delete_avatar_thumbnails(_avatar_upload_to().storage, obsolete_avatar_name)
+    profile = Profile.all_objects.select_related(None).only('avatar').filter(pk=profile_id).first()
+    if profile is None or not profile.avatar:
+        return
+    thumbnails = make_avatar_thumbnails(profile)
+    with transaction.atomic():
+        # The avatar might have been replaced while the thumbnails were made.
+        profile = (
+            Profile.all_objects.select_for_update().select_related(None)
+            .filter(pk=profile_id, avatar=profile.avatar.name)
+            .first()
+        )
+        if profile is not None:
+            profile.avatar_thumbnails = thumbnails
+            profile.save(update_fields=['avatar_thumbnails'], update_modified=False)
+
+
+def schedule_avatar_thumbnails(profile: 'Profile', obsolete_avatar_name: str = ''):
+    """
+    Generates the thumbnails of the avatar of the profile in the background,
+    once the current transaction is committed.
+    """
+    if not profile.avatar and not obsolete_avatar_name:
+        return
+    profile_id = profile.pk
+    transaction.on_commit(
+        lambda: async_task(generate_avatar_thumbnails, profile_id, obsolete_avatar_name, group='avatars'))
@@ -0,0 +1,64 @@
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+class ProcessLocalIndex:
+    """
+    Base for the in-process indexes of rarely changing data. An index is valid
+    as long as its version, kept in the shared cache, does not change: changes
+    to the data replace the version (once committed), and each process discards
+    its index when it notices that the version differs, which is checked every
+    `version_check_interval` seconds.
+    """
+    version_key: str
+    version_check_interval = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._version_checked_at = 0.0
+
+    def clear(self):
+        """
+        Discards the indexed data; called with the lock held.
+        """
+        raise NotImplementedError
+
+    def validate(self):
+        """
+        Discards the indexed data if its version changed; called with the lock
+        held.
+        """
+        now = time.monotonic()
+        if self._version is not None and now - self._version_checked_at < self.version_check_interval:
+            return
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(self.version_key)
+        # When the version cannot be stored in the cache, the index cannot be
+        # trusted beyond the current lookup.
+        if version is None or version != self._version:
+            self.clear()
+        self._version, self._version_checked_at = version, now
+
+    def invalidate(self):
+        with self._lock:
+            self.clear()
+            self._version = None
+
+    def data_changed(self, **kwargs):
+        """
+        Discards the index of this process immediately, and that of all the
+        other processes once the change is committed.
+        """
+        self.invalidate()
+
+        def replace_version():
+            cache.delete(self.version_key)
+            self.invalidate()
+        transaction.on_commit(replace_version)
@@ -1,18 +1,100 @@
-from typing import TYPE_CHECKING, TypeVar
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, NamedTuple, TypeVar
 
 from django.db import DatabaseError, models
 from django.db.models import BooleanField, Case, Q, When
+from django.db.models.query import ModelIterable
 from django.utils import timezone
 
+from asgiref.local import Local
 from waffle import get_waffle_switch_model
 
 from core.models import SiteConfiguration
 
+from .regions import attach_subregions
+
 if TYPE_CHECKING:
     from hosting.models import TrackingModel
     TrackingModelT = TypeVar('TrackingModelT', bound=TrackingModel)
 
 
+class TrackingConfiguration(NamedTuple):
+    validity_start: datetime
+    confirmation_expiration: bool
+    verification_expiration: bool
+
+
+# The configuration is resolved once per request (see `tracking_request_started`);
+# outside of a request, it is resolved each time a queryset is built.
+_request_scope = Local()
+perf_log = logging.getLogger('PasportaServo.performance')
+
+
+def get_tracking_configuration() -> TrackingConfiguration:
+    scope = getattr(_request_scope, 'stats', None)
+    if scope is not None:
+        scope['querysets_built'] += 1
+        configuration = getattr(_request_scope, 'configuration', None)
+        if configuration is not None:
+            return configuration
+        scope['configuration_lookups'] += 1
+
+    try:
+        validity_period = SiteConfiguration.get_solo().confirmation_validity_period
+    except DatabaseError:
+        validity_period = timezone.timedelta(weeks=42)
+
+    SiteSwitch = get_waffle_switch_model()
+    try:
+        confirmation_expiration = (
+            SiteSwitch.get('HOSTING_DATA_CONFIRMATION_EXPIRY').is_active()
+        )
+    except DatabaseError:
+        confirmation_expiration = True
+    try:
+        verification_expiration = (
+            SiteSwitch.get('HOSTING_DATA_VERIFICATION_EXPIRY').is_active()
+        )
+    except DatabaseError:
+        verification_expiration = False
+
+    configuration = TrackingConfiguration(
+        timezone.now() - validity_period, confirmation_expiration, verification_expiration)
+    if scope is not None:
+        _request_scope.configuration = configuration
+    return configuration
+
+
+def get_tracking_stats() -> dict[str, int] | None:
+    """
+    Returns the number of querysets of tracking managers built during the
+    current request, and the number of times their configuration was looked up.
+    """
+    return getattr(_request_scope, 'stats', None)
+
+
+def tracking_request_started(**kwargs):
+    _request_scope.stats = {'querysets_built': 0, 'configuration_lookups': 0}
+    _request_scope.configuration = None
+
+
+def tracking_request_finished(**kwargs):
+    stats = get_tracking_stats()
+    if stats is not None and stats['querysets_built']:
+        perf_log.debug(
+            "Tracking managers built %(querysets_built)d querysets, "
+            "with %(configuration_lookups)d configuration lookups.",
+            stats)
+    _request_scope.stats = None
+    _request_scope.configuration = None
+
+
+def tracking_configuration_changed(**kwargs):
+    # A change within the current request takes effect immediately.
+    _request_scope.configuration = None
+
+
 class TrackingManager(models.Manager['TrackingModelT']):
     """
     Adds the following boolean fields from their datetime counterparts:
@@ -20,25 +102,9 @@ class TrackingManager(models.Manager['TrackingModelT']):
     """
 
     def get_queryset(self):
-        try:
-            validity_period = SiteConfiguration.get_solo().confirmation_validity_period
-        except DatabaseError:
-            validity_period = timezone.timedelta(weeks=42)
-        validity_start = timezone.now() - validity_period
-
-        SiteSwitch = get_waffle_switch_model()
-        try:
-            confirmation_expiration = (
-                SiteSwitch.get('HOSTING_DATA_CONFIRMATION_EXPIRY').is_active()
-            )
-        except DatabaseError:
-            confirmation_expiration = True
-        try:
-            verification_expiration = (
-                SiteSwitch.get('HOSTING_DATA_VERIFICATION_EXPIRY').is_active()
-            )
-        except DatabaseError:
-            verification_expiration = False
+        validity_start, confirmation_expiration, verification_expiration = (
+            get_tracking_configuration()
+        )
         confirmation_validity_condition = (
             Q(confirmed_on__lt=validity_start) if confirmation_expiration
             else Q(confirmed_on__in=[])  # Always-false condition.
@@ -90,3 +156,27 @@ class ActiveStatusManager[ActiveModelT: models.Model](models.Manager[ActiveModel
                 default=True,
                 output_field=BooleanField()),
         )
+
+
+class PlaceQuerySet(models.QuerySet):
+    """
+    Allows resolving the subregions of all the fetched places at once, instead
+    of querying the database for the subregion of each place.
+    """
+    _with_subregions = False
+
+    def with_subregions(self):
+        clone = self._chain()
+        clone._with_subregions = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._with_subregions = self._with_subregions
+        return clone
+
+    def _fetch_all(self):
+        newly_fetched = self._result_cache is None
+        super()._fetch_all()
+        if newly_fetched and self._with_subregions and self._iterable_class is ModelIterable:
+            attach_subregions(self._result_cache)
@@ -0,0 +1,51 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+import hosting.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hosting', '0071_change_model_visibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GazetteerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('C', 'City'), ('R', 'State / Province')], max_length=1, verbose_name='location type')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('lookup_name', models.CharField(db_index=True, help_text='Lowercase, transliterated to latin letters.', max_length=255, verbose_name='normalized name')),
+                ('state', models.CharField(blank=True, max_length=70, verbose_name='State / Province')),
+                ('country', hosting.fields.CountryField(max_length=2, verbose_name='country')),
+                ('population', models.PositiveIntegerField(default=0, help_text='Used to pick the most prominent location among namesakes.', verbose_name='population')),
+                ('bbox', hosting.fields.LineStringField(blank=True, help_text='Expected diagonal: south-west lon/lat, north-east lon/lat.', null=True, srid=4326, verbose_name='bounding box')),
+                ('center', hosting.fields.PointField(help_text='Expected: longitude/latitude position.', srid=4326, verbose_name='geographical center')),
+            ],
+            options={
+                'verbose_name': 'gazetteer entry',
+                'verbose_name_plural': 'gazetteer',
+                'indexes': [models.Index(fields=['lookup_name', 'country'], name='gazetteer_lookup_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GeocodedQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lookup', models.CharField(max_length=40, unique=True, verbose_name='lookup key')),
+                ('query', models.CharField(max_length=255, verbose_name='query')),
+                ('country', models.CharField(blank=True, max_length=2, verbose_name='country')),
+                ('language', models.CharField(blank=True, max_length=10, verbose_name='language')),
+                ('response', models.JSONField(verbose_name='response')),
+                ('created_on', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('last_used_on', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='last used')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='hits')),
+            ],
+            options={
+                'verbose_name': 'geocoded query',
+                'verbose_name_plural': 'geocoded queries',
+            },
+        ),
+    ]
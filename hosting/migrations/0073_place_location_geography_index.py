@@ -0,0 +1,23 @@
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+from django.db import migrations
+import django.db.models.expressions
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hosting', '0072_geocoding_cache_and_gazetteer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='place',
+            index=django.contrib.postgres.indexes.GistIndex(
+                django.db.models.functions.comparison.Cast(
+                    django.db.models.expressions.F('location'),
+                    output_field=django.contrib.gis.db.models.fields.PointField(geography=True, srid=4326)),
+                name='place_location_geog_idx'),
+        ),
+    ]
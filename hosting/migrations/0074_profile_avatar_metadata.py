@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hosting', '0073_place_location_geography_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_present',
+            field=models.BooleanField(default=None, editable=False, null=True, verbose_name='avatar is present in storage'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_width',
+            field=models.PositiveIntegerField(default=None, editable=False, null=True, verbose_name='avatar width'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_height',
+            field=models.PositiveIntegerField(default=None, editable=False, null=True, verbose_name='avatar height'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='avatar content hash'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+import django.utils.timezone
+from django.db import migrations, models
+import django_countries.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hosting', '0075_profile_avatar_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listing', models.CharField(choices=[('online', 'visible online'), ('public', 'public listing'), ('supervised', 'supervised'), ('in_book', 'in the book')], max_length=10, verbose_name='listing')),
+                ('country', django_countries.fields.CountryField(blank=True, max_length=2, verbose_name='country')),
+                ('place_count', models.PositiveIntegerField(default=0, verbose_name='number of places')),
+                ('checked_count', models.PositiveIntegerField(default=0, verbose_name='number of checked places')),
+                ('only_confirmed_count', models.PositiveIntegerField(default=0, verbose_name='number of confirmed, not checked places')),
+                ('host_count', models.PositiveIntegerField(default=0, verbose_name='number of hosts')),
+                ('city_count', models.PositiveIntegerField(default=0, verbose_name='number of cities')),
+                ('updated_on', models.DateTimeField(default=django.utils.timezone.now, verbose_name='updated')),
+            ],
+            options={
+                'verbose_name': 'place statistics',
+                'verbose_name_plural': 'place statistics',
+                'unique_together': {('listing', 'country')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hosting', '0076_placestatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='traveladvice',
+            name='country_codes',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=2), blank=True, default=list, editable=False, size=None, verbose_name='country codes'),
+        ),
+        migrations.RunSQL(
+            "UPDATE hosting_traveladvice SET country_codes = string_to_array(countries, ',') WHERE countries <> ''",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='traveladvice',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['country_codes'], name='traveladvice_countries_idx'),
+        ),
+    ]
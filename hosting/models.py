@@ -1,3 +1,4 @@
+import hashlib
 import re
 from abc import abstractmethod
 from collections import namedtuple
@@ -15,6 +16,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.db import models, transaction
 from django.db.models import F, Q, QuerySet, Value as V
 from django.db.models.functions import Concat, Substr
@@ -39,7 +42,9 @@ from unidecode import unidecode
 from core.fields import SimpleMDEField
 from core.utils import camel_case_split
 from maps import SRID
+from maps.functions import as_geography
 
+from .avatars import avatar_thumbnail_name, schedule_avatar_thumbnails
 from .countries import COUNTRIES_DATA
 from .fields import (
     CountryField, LineStringField, PhoneNumberField, PointField,
@@ -52,9 +57,13 @@ from .filters.places import (
 from .gravatar import email_to_gravatar
 from .managers import (
     ActiveStatusManager, AvailableManager, NotDeletedManager,
-    NotDeletedRawManager, TrackingManager,
+    NotDeletedRawManager, PlaceQuerySet, TrackingManager,
+)
+from .regions import get_country_region
+from .utils import (
+    RenameAndPrefixAvatar, normalize_geocoding_query,
+    value_without_invalid_marker,
 )
-from .utils import RenameAndPrefixAvatar, value_without_invalid_marker
 from .validators import (
     TooFarPastValidator, validate_image, validate_latin,
     validate_no_digit, validate_not_all_caps, validate_not_in_future,
@@ -516,6 +525,26 @@ class Profile(ViewableModel, TrackingModel, TimeStampedModel):
         upload_to=RenameAndPrefixAvatar("avatars"),
         validators=[validate_image, validate_size],
         help_text=_("Small image under 100kB. Ideal size: 140x140 px."))
+    # The metadata of the avatar is recorded when it is uploaded (or by the
+    # `update_avatar_metadata` command), so that displaying the avatar does
+    # not need to consult the storage. NULL presence means "not yet known".
+    avatar_present = models.BooleanField(
+        _("avatar is present in storage"),
+        null=True, default=None, editable=False)
+    avatar_width = models.PositiveIntegerField(
+        _("avatar width"),
+        null=True, default=None, editable=False)
+    avatar_height = models.PositiveIntegerField(
+        _("avatar height"),
+        null=True, default=None, editable=False)
+    avatar_hash = models.CharField(
+        _("avatar content hash"),
+        max_length=64, blank=True, editable=False)
+    # The thumbnails generated for the avatar (see `hosting.avatars`), as pairs
+    # of the size of the thumbnail and its actual width.
+    avatar_thumbnails = models.JSONField(
+        _("avatar thumbnails"),
+        default=list, blank=True, editable=False)
 
     if TYPE_CHECKING:
         pref: 'Preferences'
@@ -570,7 +599,105 @@ class Profile(ViewableModel, TrackingModel, TimeStampedModel):
             return email_to_gravatar(email, settings.DEFAULT_AVATAR_URL)
 
     def avatar_exists(self):
-        return self.avatar and self.avatar.storage.exists(self.avatar.name)
+        if not self.avatar:
+            return False
+        if self._avatar_metadata_known():
+            return self.avatar_present
+        return self.avatar.storage.exists(self.avatar.name)
+
+    @property
+    def avatar_dimensions(self) -> tuple[int, int] | None:
+        """
+        The width and height of the avatar, when it exists.
+        """
+        if not self.avatar_exists():
+            return None
+        if self._avatar_metadata_known() and self.avatar_width and self.avatar_height:
+            return (self.avatar_width, self.avatar_height)
+        return (self.avatar.width, self.avatar.height)
+
+    def avatar_thumbnail_urls(self, extension: str) -> list[tuple[str, int, int]]:
+        """
+        The URLs of the thumbnails of the avatar in the given format (by the file
+        extension), together with their sizes and actual widths, from the
+        smallest to the largest.
+        """
+        if not self.avatar_thumbnails or not self._avatar_metadata_known() or not self.avatar_present:
+            return []
+        return [
+            (self.avatar.storage.url(avatar_thumbnail_name(self.avatar.name, size, extension)), size, width)
+            for size, width in self.avatar_thumbnails
+        ]
+
+    def _avatar_metadata_known(self) -> bool:
+        # The metadata is only relevant to the avatar it was recorded for; an
+        # avatar assigned in the meanwhile (and not saved yet) is not covered.
+        return (
+            self.avatar_present is not None
+            and getattr(self, '_avatar_metadata_of', None) == (self.avatar.name or '')
+        )
+
+    def update_avatar_metadata(self):
+        """
+        Records the presence, dimensions and content hash of the avatar, by
+        reading it from the upload or from the storage.
+        """
+        self.avatar_present, self.avatar_width, self.avatar_height, self.avatar_hash = False, None, None, ''
+        if not self.avatar:
+            return
+        try:
+            content_hash = hashlib.sha256()
+            for chunk in self.avatar.chunks():
+                content_hash.update(chunk)
+            self.avatar_width, self.avatar_height = self.avatar.width, self.avatar.height
+        except (OSError, ValueError):
+            # The file is missing from the storage.
+            return
+        finally:
+            if self.avatar._committed:
+                self.avatar.close()
+        self.avatar_present, self.avatar_hash = True, content_hash.hexdigest()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'avatar' in instance.__dict__:
+            instance._avatar_metadata_of = instance.__dict__['avatar'] or ''
+        return instance
+
+    def save(self, *args, update_fields=None, **kwargs):
+        # A deferred avatar is not modified by this save; the metadata can be
+        # neither recalculated nor stored.
+        avatar_loaded = 'avatar' not in self.get_deferred_fields()
+        previous_avatar_name = getattr(self, '_avatar_metadata_of', None)
+        avatar_changed = False
+        if avatar_loaded and (update_fields is None or 'avatar' in update_fields):
+            if not self.avatar._committed:
+                # A new file was uploaded.
+                avatar_changed = True
+            elif previous_avatar_name is not None:
+                avatar_changed = previous_avatar_name != (self.avatar.name or '')
+            else:
+                # The avatar stored in the database is not known; only a new
+                # profile is certain not to have had one.
+                avatar_changed = self._state.adding and bool(self.avatar)
+        if avatar_changed:
+            self.update_avatar_metadata()
+            # The thumbnails of the previous avatar are no longer relevant.
+            self.avatar_thumbnails = []
+            if update_fields:
+                update_fields = [
+                    *update_fields,
+                    'avatar_present', 'avatar_width', 'avatar_height', 'avatar_hash', 'avatar_thumbnails',
+                ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+        if avatar_loaded and 'avatar_present' not in self.get_deferred_fields() and self.avatar_present is not None:
+            # Once saved, the avatar has its final name in the storage.
+            self._avatar_metadata_of = self.avatar.name or ''
+        if avatar_changed:
+            obsolete_avatar_name = previous_avatar_name if previous_avatar_name != self.avatar.name else ''
+            schedule_avatar_thumbnails(self, obsolete_avatar_name or '')
+    save.alters_data = True
 
     @property
     def icon(self):
@@ -988,12 +1115,20 @@ class Place(ViewableModel, TrackingModel, TimeStampedModel):
         'hosting.VisibilitySettingsForPlace',
         related_name='%(class)s', on_delete=models.PROTECT)
 
-    available_objects = AvailableManager[Self]()
+    # The querysets of places can resolve the subregions of all the places at once.
+    all_objects = TrackingManager.from_queryset(PlaceQuerySet)()
+    objects = NotDeletedManager.from_queryset(PlaceQuerySet)()
+    objects_raw = NotDeletedRawManager.from_queryset(PlaceQuerySet)()
+    available_objects = AvailableManager.from_queryset(PlaceQuerySet)()
 
     class Meta:
         verbose_name = _("place")
         verbose_name_plural = _("places")
         default_manager_name = 'all_objects'
+        indexes = [
+            # Allows finding the nearest places without a full scan.
+            GistIndex(as_geography('location'), name='place_location_geog_idx'),
+        ]
 
     @classmethod
     def get_model_anchor(cls):
@@ -1006,14 +1141,8 @@ class Place(ViewableModel, TrackingModel, TimeStampedModel):
 
     @cached_property
     def subregion(self):
-        try:
-            region = CountryRegion.objects.get(
-                country=self.country, iso_code=self.state_province)
-        except CountryRegion.DoesNotExist:
-            region = CountryRegion(
-                country=self.country, iso_code='X-00', latin_code=self.state_province)
-        region.save = lambda *args, **kwargs: None  # Read-only instance.
-        return region
+        # Read-only instance, shared between the places of the same region.
+        return get_country_region(self.country, self.state_province)
 
     @property
     def icon(self):
@@ -1444,6 +1573,153 @@ class Whereabouts(models.Model):
         )
 
 
+class GazetteerEntry(models.Model):
+    """
+    A locally known geographical name (of a city or a region), which allows to
+    resolve search queries without consulting the geocoding service.
+    """
+    GAZETTEER_TYPE_CHOICES = Whereabouts.WHEREABOUTS_TYPE_CHOICES
+
+    type = models.CharField(
+        _("location type"),
+        max_length=1,
+        choices=GAZETTEER_TYPE_CHOICES)
+    name = models.CharField(
+        _("name"),
+        blank=False,
+        max_length=255)
+    lookup_name = models.CharField(
+        _("normalized name"),
+        max_length=255, db_index=True,
+        help_text=_("Lowercase, transliterated to latin letters."))
+    state = models.CharField(
+        _("State / Province"),
+        blank=True,
+        max_length=70)
+    country = CountryField(
+        _("country"))
+    population = models.PositiveIntegerField(
+        _("population"),
+        default=0,
+        help_text=_("Used to pick the most prominent location among namesakes."))
+    bbox = LineStringField(
+        _("bounding box"), srid=SRID,
+        null=True, blank=True,
+        help_text=_("Expected diagonal: south-west lon/lat, north-east lon/lat."))
+    center = PointField(
+        _("geographical center"), srid=SRID,
+        help_text=_("Expected: longitude/latitude position."))
+
+    class Meta:
+        verbose_name = _("gazetteer entry")
+        verbose_name_plural = _("gazetteer")
+        indexes = [
+            models.Index(fields=['lookup_name', 'country'], name='gazetteer_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return ", ".join(filter(None, [self.name, self.state, str(self.country.name)]))
+
+    def __repr__(self):
+        return "<{}: {} ~ {}>".format(
+            self.__class__.__name__,
+            ", ".join(filter(None, [self.name, self.state, self.country.code])),
+            self.center.coords,
+        )
+
+    def save(self, *args, update_fields=None, **kwargs):
+        self.lookup_name = normalize_geocoding_query(self.name, transliterate=True)
+        if update_fields and 'name' in update_fields:
+            update_fields = [*update_fields, 'lookup_name']
+        return super().save(*args, update_fields=update_fields, **kwargs)
+    save.alters_data = True
+
+
+class GeocodedQuery(models.Model):
+    """
+    A response of the geocoding service stored locally, so that the repeated
+    queries do not need to leave the process.
+    """
+    lookup = models.CharField(
+        _("lookup key"),
+        max_length=40, unique=True)
+    query = models.CharField(
+        _("query"),
+        max_length=255)
+    country = models.CharField(
+        _("country"),
+        blank=True,
+        max_length=2)
+    language = models.CharField(
+        _("language"),
+        blank=True,
+        max_length=10)
+    response = models.JSONField(
+        _("response"))
+    created_on = models.DateTimeField(
+        _("created"),
+        auto_now_add=True)
+    last_used_on = models.DateTimeField(
+        _("last used"),
+        default=timezone.now, db_index=True)
+    hits = models.PositiveIntegerField(
+        _("hits"),
+        default=0)
+
+    class Meta:
+        verbose_name = _("geocoded query")
+        verbose_name_plural = _("geocoded queries")
+
+    def __str__(self):
+        return f"{self.query} ({self.country or '--'}, {self.language or '--'})"
+
+
+class PlaceStatistics(models.Model):
+    """
+    Materialized numbers of the available places of a country (or of all the
+    countries, when the country is empty), for one of the listings of places.
+    See the module `hosting.statistics`.
+    """
+    class Listing(models.TextChoices):
+        ONLINE = 'online', _("visible online")
+        PUBLIC = 'public', _("public listing")
+        SUPERVISED = 'supervised', _("supervised")
+        IN_BOOK = 'in_book', _("in the book")
+
+    listing = models.CharField(
+        _("listing"),
+        max_length=10, choices=Listing.choices)
+    country = CountryField(
+        _("country"),
+        blank=True)
+    place_count = models.PositiveIntegerField(
+        _("number of places"),
+        default=0)
+    checked_count = models.PositiveIntegerField(
+        _("number of checked places"),
+        default=0)
+    only_confirmed_count = models.PositiveIntegerField(
+        _("number of confirmed, not checked places"),
+        default=0)
+    host_count = models.PositiveIntegerField(
+        _("number of hosts"),
+        default=0)
+    city_count = models.PositiveIntegerField(
+        _("number of cities"),
+        default=0)
+    updated_on = models.DateTimeField(
+        _("updated"),
+        default=timezone.now)
+
+    class Meta:
+        verbose_name = _("place statistics")
+        verbose_name_plural = _("place statistics")
+        unique_together = ('listing', 'country')
+
+    def __str__(self):
+        return f"{self.get_listing_display()}: {self.country.code or '--'}"
+
+
 class Condition(models.Model):
     """
     Hosting condition in a place (e.g. bringing sleeping bag, no smoking...).
@@ -1576,12 +1852,21 @@ class TravelAdvice(TimeStampedModel):
     active_until = models.DateField(
         _("advice valid until date"),
         null=True, blank=True)
+    # The codes of the countries, denormalized from the `countries` field for
+    # finding the advices of a country using an index.
+    country_codes = ArrayField(
+        models.CharField(max_length=2),
+        verbose_name=_("country codes"),
+        default=list, blank=True, editable=False)
 
     objects: ClassVar[ActiveStatusManager[Self]] = ActiveStatusManager()
 
     class Meta:
         verbose_name = _("travel advice")
         verbose_name_plural = _("travel advices")
+        indexes = [
+            GinIndex(fields=['country_codes'], name='traveladvice_countries_idx'),
+        ]
 
     def trimmed_content(self, cut_off: int = 70) -> str:
         return (
@@ -1613,11 +1898,11 @@ class TravelAdvice(TimeStampedModel):
         False, only advices for this specific country which are not anymore or not yet
         valid are returned.
         """
-        lookups = Q(countries__regex=r'(^|,){}(,|$)'.format(country_code))
+        lookups = Q(country_codes__contains=[country_code])
         if is_active is False:
             lookups = lookups & Q(is_active=False)
         else:
-            lookups = lookups | Q(countries='')
+            lookups = lookups | Q(country_codes=[])
             if is_active is not None:
                 lookups = lookups & Q(is_active=True)
         return cls.objects.filter(lookups).order_by('-active_until', '-id')
@@ -1636,7 +1921,10 @@ class TravelAdvice(TimeStampedModel):
 
     def save(self, *args, update_fields=None, **kwargs):
         self.description = commonmark(self.content)
+        self.country_codes = [country.code for country in self.countries]
         if update_fields and 'content' in update_fields:
             update_fields = [*update_fields, 'description']
+        if update_fields and 'countries' in update_fields:
+            update_fields = [*update_fields, 'country_codes']
         return super().save(*args, update_fields=update_fields, **kwargs)
     save.alters_data = True
@@ -0,0 +1,101 @@
+"""
+In-process index of the subregions (CountryRegion objects) of the countries,
+keyed by the country code and the ISO code of the region, so that resolving the
+subregions of places does not query the database for each place.
+
+The regions of a country are loaded on the first use, together with those of
+all the other countries needed at that moment. The index is discarded when any
+of the regions changes (see `hosting.caching.ProcessLocalIndex`).
+"""
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+from .caching import ProcessLocalIndex
+
+if TYPE_CHECKING:
+    from .models import CountryRegion, Place
+
+# Subregion used for places with a state/province which is not a known region.
+UNKNOWN_REGION_ISO_CODE = 'X-00'
+
+
+class CountryRegionIndex(ProcessLocalIndex):
+    version_key = 'country-regions:version'
+
+    def __init__(self):
+        super().__init__()
+        self._regions: dict[str, dict[str, 'CountryRegion']] = {}
+
+    def clear(self):
+        self._regions = {}
+
+    def get_regions(self, countries: Iterable[str]) -> dict[str, dict[str, 'CountryRegion']]:
+        """
+        Returns the regions of each of the given countries, keyed by their ISO
+        code. The regions of all the countries not in the index yet are loaded
+        using a single query.
+        """
+        from .models import CountryRegion
+
+        countries = set(countries)
+        with self._lock:
+            self.validate()
+            regions = self._regions
+            missing_countries = countries - regions.keys()
+        if missing_countries:
+            loaded_regions: dict[str, dict[str, CountryRegion]] = {code: {} for code in missing_countries}
+            for region in CountryRegion.objects.filter(country__in=missing_countries):
+                region.save = lambda *args, **kwargs: None  # Read-only instance.
+                loaded_regions[region.country.code][region.iso_code] = region
+            with self._lock:
+                regions.update(loaded_regions)
+        return {code: regions[code] for code in countries}
+
+
+_index = CountryRegionIndex()
+
+
+def get_unknown_region(country: str, state_province: str) -> 'CountryRegion':
+    from .models import CountryRegion
+
+    region = CountryRegion(country=country, iso_code=UNKNOWN_REGION_ISO_CODE, latin_code=state_province)
+    region.save = lambda *args, **kwargs: None  # Read-only instance.
+    return region
+
+
+def get_country_regions(countries: Iterable[str]) -> dict[str, dict[str, 'CountryRegion']]:
+    """
+    Returns the regions of each of the given countries, keyed by their ISO code.
+    """
+    return _index.get_regions(str(country) for country in countries)
+
+
+def get_country_region(country: str, iso_code: str) -> 'CountryRegion':
+    """
+    Returns the region of the country with the given ISO code; when there is no
+    such region, a placeholder (which cannot be saved) is returned, named by the
+    given code.
+    """
+    country_code = str(country)
+    region = get_country_regions([country_code])[country_code].get(iso_code)
+    return region if region is not None else get_unknown_region(country_code, iso_code)
+
+
+def attach_subregions(places: Iterable['Place']):
+    """
+    Resolves the subregions of all the given places at once, storing them as
+    the `subregion` property of each place.
+    """
+    places = [place for place in places if 'subregion' not in place.__dict__]
+    regions = get_country_regions(place.country for place in places)
+    for place in places:
+        region = regions[place.country.code].get(place.state_province)
+        place.subregion = (
+            region if region is not None
+            else get_unknown_region(place.country.code, place.state_province)
+        )
+
+
+def country_regions_changed(**kwargs):
+    _index.data_changed(**kwargs)
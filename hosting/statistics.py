@@ -0,0 +1,134 @@
+"""
+Materialized statistics of the available places: the numbers of places (and of
+the checked and of the confirmed ones), of hosts, and of cities, per country and
+in total, for each of the listings of places shown on the pages "about us" and
+"supervisors".
+
+The statistics of a country are re-calculated in a background task when any of
+its places, their owners, or their visibility settings change. Since the status
+of being confirmed or checked expires with time (and a place moved to another
+country leaves the statistics of the previous one behind), all the statistics
+are re-calculated as well once they are older than STATISTICS_MAX_AGE, or by
+the `update_place_statistics` command.
+"""
+
+from datetime import timedelta
+from typing import Iterable, NamedTuple, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from django_q.tasks import async_task
+
+from .models import Place, PlaceStatistics
+
+STATISTICS_MAX_AGE = timedelta(hours=6)
+
+STATISTICS_REFRESH_LOCK = 'place-statistics:refreshing'
+
+STATISTICS_COUNTS = {
+    'place_count': Count('pk'),
+    'checked_count': Count('pk', filter=Q(checked=True)),
+    'only_confirmed_count': Count('pk', filter=Q(confirmed=True, checked=False)),
+    'host_count': Count('owner', distinct=True),
+    'city_count': Count('city', distinct=True),
+}
+
+
+class ListingStatistics(NamedTuple):
+    totals: PlaceStatistics
+    countries: dict[str, PlaceStatistics]
+
+
+def get_listing_filter(listing: PlaceStatistics.Listing) -> Q:
+    book_filter = Q(in_book=True, visibility__visible_in_book=True)
+    online_filter = Q(visibility__visible_online_public=True)
+    return {
+        PlaceStatistics.Listing.ONLINE:
+            online_filter,
+        PlaceStatistics.Listing.PUBLIC:
+            online_filter & Q(owner__deleted_on__isnull=True, owner__death_date__isnull=True),
+        PlaceStatistics.Listing.SUPERVISED:
+            book_filter | online_filter,
+        PlaceStatistics.Listing.IN_BOOK:
+            book_filter,
+    }[listing]
+
+
+def calculate_place_statistics(countries: Optional[Iterable[str]] = None) -> list[PlaceStatistics]:
+    """
+    Counts the places of each listing: for all the countries (or only for the
+    given ones), and in total.
+    """
+    now = timezone.now()
+    statistics = []
+    for listing in PlaceStatistics.Listing:
+        places = Place.available_objects.filter(get_listing_filter(listing)).select_related(None)
+        places_per_country = places if countries is None else places.filter(country__in=countries)
+        # QuerySet.values(...).annotate(...).order_by() performs a GROUP BY query.
+        for counts in places_per_country.values('country').annotate(**STATISTICS_COUNTS).order_by():
+            statistics.append(PlaceStatistics(listing=listing, updated_on=now, **counts))
+        statistics.append(PlaceStatistics(
+            listing=listing, country='', updated_on=now, **places.aggregate(**STATISTICS_COUNTS)))
+    return statistics
+
+
+def refresh_place_statistics(countries: Optional[Iterable[str]] = None):
+    """
+    Re-calculates the stored statistics of all the countries, or only of the
+    given ones (the totals are re-calculated in any case). A partial update of
+    never materialized statistics does nothing.
+    """
+    if countries is not None:
+        countries = sorted(set(countries))
+        if not PlaceStatistics.objects.exists():
+            return
+    statistics = calculate_place_statistics(countries)
+    with transaction.atomic():
+        outdated = PlaceStatistics.objects.all()
+        if countries is not None:
+            outdated = outdated.filter(Q(country__in=countries) | Q(country=''))
+        outdated.delete()
+        PlaceStatistics.objects.bulk_create(
+            statistics,
+            update_conflicts=True,
+            unique_fields=['listing', 'country'],
+            update_fields=[*STATISTICS_COUNTS, 'updated_on'],
+        )
+
+
+def schedule_place_statistics_update(countries: Optional[Iterable[str]] = None):
+    """
+    Re-calculates the statistics of the given countries (or of all of them) in
+    the background, once the current transaction is committed.
+    """
+    if countries is not None:
+        countries = list(set(countries))
+        if not countries:
+            return
+    transaction.on_commit(
+        lambda: async_task(refresh_place_statistics, countries, group='statistics'))
+
+
+def get_place_statistics(listing: PlaceStatistics.Listing) -> ListingStatistics:
+    """
+    Returns the stored statistics of the listing, materializing them if this
+    was not done yet. Outdated statistics are returned as they are, while they
+    are re-calculated in the background.
+    """
+    statistics = list(PlaceStatistics.objects.filter(listing=listing))
+    if not statistics:
+        refresh_place_statistics()
+        statistics = list(PlaceStatistics.objects.filter(listing=listing))
+    elif (min(row.updated_on for row in statistics) < timezone.now() - STATISTICS_MAX_AGE
+            and cache.add(STATISTICS_REFRESH_LOCK, True, timeout=STATISTICS_MAX_AGE.total_seconds() / 4)):
+        schedule_place_statistics_update()
+    totals = next(
+        (row for row in statistics if not row.country),
+        PlaceStatistics(listing=listing, country=''))
+    return ListingStatistics(
+        totals=totals,
+        countries={row.country.code: row for row in statistics if row.country},
+    )
@@ -125,8 +125,9 @@ def get_pronoun(profile: Profile) -> str:
 
 @register.filter
 def avatar_dimension(profile: Profile, size_percent: float = 100) -> SafeString:
-    if profile and profile.avatar_exists():
-        if profile.avatar.width < profile.avatar.height:
+    avatar_dimensions = profile.avatar_dimensions if profile else None
+    if avatar_dimensions:
+        if avatar_dimensions[0] < avatar_dimensions[1]:
             dimension = ["width"]
             aspect = "tall"
         else:
@@ -141,6 +142,54 @@ def avatar_dimension(profile: Profile, size_percent: float = 100) -> SafeString:
     ))
 
 
+def _avatar_candidates(profile: Profile, slot_size: int, extension: str) -> tuple[str, int] | None:
+    """
+    The candidates for the `srcset` attribute, from the thumbnails of the avatar
+    of the profile in the given format, and the width (in CSS pixels) for the
+    `sizes` attribute, when the avatar is shown in a slot of the given size (of
+    the shorter side of the image). None when there are no thumbnails.
+    """
+    thumbnails = profile.avatar_thumbnail_urls(extension) if profile else []
+    if not thumbnails:
+        return None
+    # The shorter side of each thumbnail is of one of the fixed sizes.
+    largest_size, largest_width = profile.avatar_thumbnails[-1]
+    candidates = [f'{url} {width}w' for url, _, width in thumbnails]
+    original_size = min(profile.avatar_dimensions or (0, 0))
+    if original_size > largest_size:
+        candidates.append(f'{profile.avatar.url} {round(original_size * largest_width / largest_size)}w')
+    return ", ".join(candidates), round(int(slot_size) * largest_width / largest_size)
+
+
+@register.simple_tag
+def avatar_srcset(profile: Profile, slot_size: int) -> SafeString:
+    """
+    The `srcset` and `sizes` attributes of the image of the avatar of the
+    profile, shown in a slot of the given size (in CSS pixels, of the shorter
+    side of the image), offering the JPEG thumbnails. Nothing is output when
+    there are no thumbnails.
+    """
+    srcset = _avatar_candidates(profile, slot_size, 'jpg')
+    if not srcset:
+        return mark_safe('')
+    return format_html(' srcset="{candidates}" sizes="{width}px"', candidates=srcset[0], width=srcset[1])
+
+
+@register.simple_tag
+def avatar_webp_source(profile: Profile, slot_size: int) -> SafeString:
+    """
+    The `<source>` of the WebP thumbnails of the avatar of the profile, to be
+    placed in a `<picture>` before the image (see `avatar_srcset`), so that the
+    browser itself chooses the format it supports.
+    """
+    srcset = _avatar_candidates(profile, slot_size, 'webp')
+    if not srcset:
+        return mark_safe('')
+    return format_html(
+        '<source type="image/webp" srcset="{candidates}" sizes="{width}px" />',
+        candidates=srcset[0], width=srcset[1])
+
+
 @register.filter()
 def gravatar(
         profile_or_email: Profile | str,
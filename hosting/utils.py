@@ -1,22 +1,30 @@
+import hashlib
+import json
 import logging
 import os
 import re
-from typing import TYPE_CHECKING, Optional, cast
+import unicodedata
+from typing import TYPE_CHECKING, Any, Optional, cast
 from uuid import uuid4
 
 from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.core.cache import cache
 from django.db import models
-from django.utils import translation
+from django.db.models import F
+from django.utils import timezone, translation
 from django.utils.deconstruct import deconstructible
 
 import geocoder
+import requests
 from django_countries import Countries
 from geocoder.opencage import OpenCageQuery, OpenCageResult
+from unidecode import unidecode
 
 from core.models import SiteConfiguration
 from maps import SRID
 from maps.data import COUNTRIES_GEO
+from maps.utils import great_circle_distance
 
 from .countries import countries_with_mandatory_region
 
@@ -24,6 +32,7 @@ from .countries import countries_with_mandatory_region
 def geocode(
         query: str, country: str = '',
         private: bool = False, annotations: bool = False, multiple: bool = False,
+        session: Optional[requests.Session] = None,
 ) -> OpenCageQuery | None:
     """
     Utilizes the API of OpenCage to perform forward geocoding of the provided
@@ -44,6 +53,10 @@ def geocode(
         `multiple` (bool):
             Whether to return just the first result, or several results
             if OpenCage has multiple hits.
+        `session` (requests.Session):
+            Optionally, the HTTP session to query OpenCage with (which is
+            kept open). Responses obtained via a `simulated` session are
+            never stored locally.
     Returns:
         OpenCageQuery (with a Geo Point) or None.
     """
@@ -59,16 +72,255 @@ def geocode(
         params.update({'no_record': int(private)})
     if country:
         params.update({'countrycode': country})
-    result = geocoder.opencage(query, key=key, params=params, maxRows=15 if multiple else 1)
+    max_rows = 15 if multiple else 1
+
+    # Private queries (such as addresses of the hosts) are never stored locally.
+    lookup_key = (
+        geocoding_cache_key(query, country, lang, annotations=annotations, multiple=multiple)
+        if not private else None
+    )
+    stored_response = None
+    if lookup_key:
+        if not multiple and not annotations:
+            stored_response = _lookup_gazetteer(query, country)
+        if stored_response is None:
+            stored_response = _lookup_geocoding_cache(lookup_key)
+        _count_geocoding_event('miss' if stored_response is None else 'hit')
+
+    if stored_response is not None:
+        result = geocoder.opencage(
+            query, key=key, params=params, maxRows=max_rows,
+            session=StoredResponseSession(stored_response))
+    else:
+        result = geocoder.opencage(
+            query, key=key, params=params, maxRows=max_rows,
+            **({'session': session} if session is not None else {}))
+        if (lookup_key and not getattr(session, 'simulated', False)
+                and not result.error and result.status_code == requests.codes.ok):
+            _store_geocoding_response(lookup_key, query, country, lang, result)
     logging.getLogger('PasportaServo.geo').debug(
-        "Query: %s\n\tResult: %s\n\tConfidence: %d", query, result, result.confidence)
+        "Query: %s\n\tResult: %s\n\tConfidence: %s", query, result, result.confidence)
     result.point = Point(result.xy, srid=SRID) if result.xy else None
-    result.session.close()
+    if session is None:
+        result.session.close()
     return result
 
 
+class StoredResponseSession:
+    """
+    Stands in for the HTTP session of the geocoder, replaying a response which
+    was stored locally instead of querying the remote geocoding service.
+    """
+    def __init__(self, json_response: dict[str, Any]):
+        self.json_response = json_response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = requests.codes.ok
+        response.url = url
+        response.encoding = 'utf-8'
+        response._content = json.dumps(self.json_response).encode('utf-8')
+        return response
+
+    def close(self):
+        pass
+
+
+def normalize_geocoding_query(query: str, transliterate: bool = False) -> str:
+    """
+    Brings the geocoding query to a canonical form: case-folded, with runs of
+    whitespace collapsed and without punctuation at the edges. When
+    `transliterate` is True, the result is also converted to latin letters
+    without diacritics (e.g., "Zürich" becomes "zurich").
+    """
+    value = unicodedata.normalize('NFKC', query)
+    value = re.sub(r'\s*,\s*', ', ', re.sub(r'\s+', ' ', value))
+    value = value.strip(' ,.;').casefold()
+    return unidecode(value) if transliterate else value
+
+
+def geocoding_cache_key(
+        query: str, country: str, language: str | None,
+        annotations: bool = False, multiple: bool = False,
+) -> str:
+    """
+    Calculates the identifier under which the response of the geocoding service
+    for the given query is stored locally.
+    """
+    lookup = '|'.join([
+        normalize_geocoding_query(query),
+        country.upper(),
+        language or '',
+        'A' if annotations else '',
+        'M' if multiple else '',
+    ])
+    return hashlib.sha1(lookup.encode()).hexdigest()
+
+
+def _lookup_geocoding_cache(lookup_key: str) -> dict[str, Any] | None:
+    from .models import GeocodedQuery
+
+    freshness_start = timezone.now() - timezone.timedelta(seconds=settings.GEOCODING_CACHE_TIMEOUT)
+    entry = (
+        GeocodedQuery.objects
+        .filter(lookup=lookup_key, created_on__gte=freshness_start)
+        .values_list('pk', 'response')
+        .first()
+    )
+    if entry is None:
+        return None
+    GeocodedQuery.objects.filter(pk=entry[0]).update(
+        hits=F('hits') + 1, last_used_on=timezone.now())
+    return entry[1]
+
+
+def _store_geocoding_response(
+        lookup_key: str, query: str, country: str, language: str | None,
+        result: OpenCageQuery,
+):
+    from .models import GeocodedQuery
+
+    response = {
+        # The rate information is deliberately omitted: replaying a stored
+        # response does not consume any of the geocoding service's quota.
+        'licenses': result.license,
+        'results': [single_result.raw for single_result in result],
+        'status': {'code': requests.codes.ok, 'message': 'OK'},
+        'total_results': len(result),
+    }
+    GeocodedQuery.objects.update_or_create(
+        lookup=lookup_key,
+        defaults={
+            'query': normalize_geocoding_query(query)[:255],
+            'country': country.upper(),
+            'language': language or '',
+            'response': response,
+            'created_on': timezone.now(),
+            'last_used_on': timezone.now(),
+        },
+    )
+
+
+def prune_geocoding_cache() -> int:
+    """
+    Removes the expired responses of the geocoding service from the cache and,
+    when the cache grows beyond its capacity, evicts the least recently used
+    ones. This is done periodically (via the `prune_geocoding_cache` command)
+    rather than when a response is stored. Returns the number of removed
+    responses.
+    """
+    from .models import GeocodedQuery
+
+    freshness_start = timezone.now() - timezone.timedelta(seconds=settings.GEOCODING_CACHE_TIMEOUT)
+    removed = GeocodedQuery.objects.filter(created_on__lt=freshness_start).delete()[0]
+    surplus = GeocodedQuery.objects.count() - settings.GEOCODING_CACHE_MAX_ENTRIES
+    if surplus > 0:
+        evicted = (
+            GeocodedQuery.objects
+            .order_by('last_used_on')
+            .values_list('pk', flat=True)[:surplus]
+        )
+        removed += GeocodedQuery.objects.filter(pk__in=list(evicted)).delete()[0]
+    return removed
+
+
+# The upper limits (in km) of the diagonal of the bounding box of a result, for
+# each level of confidence, as determined by OpenCage.
+# https://opencagedata.com/api#confidence
+GEOCODING_CONFIDENCE_LIMITS = (
+    (0.25, 10), (0.5, 9), (1, 8), (5, 7), (7.5, 6), (10, 5), (15, 4), (20, 3), (25, 2),
+)
+
+
+def geocoding_confidence(bounds: dict[str, dict[str, float]]) -> int:
+    """
+    Returns the confidence in a geocoding result with the given bounds (in the
+    format of OpenCage), in the same way as OpenCage calculates it.
+    """
+    diagonal = great_circle_distance(
+        bounds['southwest']['lng'], bounds['southwest']['lat'],
+        bounds['northeast']['lng'], bounds['northeast']['lat'],
+    ) / 1000
+    return next((confidence for limit, confidence in GEOCODING_CONFIDENCE_LIMITS if diagonal < limit), 1)
+
+
+def _lookup_gazetteer(query: str, country: str = '') -> dict[str, Any] | None:
+    from .models import GazetteerEntry, LocationType
+
+    entries = GazetteerEntry.objects.filter(
+        lookup_name=normalize_geocoding_query(query, transliterate=True))
+    if country:
+        entries = entries.filter(country=country.upper())
+    entry = entries.order_by('-population', 'pk').first()
+    if entry is None:
+        return None
+    country_name = Countries().name(entry.country.code)
+    components = {
+        '_category': 'place',
+        '_type': 'city' if entry.type == LocationType.CITY.value else 'state',
+        'country': country_name,
+        'country_code': entry.country.code.lower(),
+    }
+    if entry.type == LocationType.CITY.value:
+        components['city'] = entry.name
+        if entry.state:
+            components['state'] = entry.state
+    else:
+        components['state'] = entry.name
+    result: dict[str, Any] = {
+        'components': components,
+        'formatted': ', '.join(filter(None, [entry.name, entry.state, country_name])),
+        'geometry': {'lat': entry.center.y, 'lng': entry.center.x},
+        'confidence': 0,
+    }
+    if entry.bbox:
+        result['bounds'] = {
+            'southwest': {'lat': entry.bbox.coords[0][1], 'lng': entry.bbox.coords[0][0]},
+            'northeast': {'lat': entry.bbox.coords[1][1], 'lng': entry.bbox.coords[1][0]},
+        }
+        result['confidence'] = geocoding_confidence(result['bounds'])
+    _count_geocoding_event('gazetteer')
+    return {
+        'licenses': [],
+        'results': [result],
+        'status': {'code': requests.codes.ok, 'message': 'OK'},
+        'total_results': 1,
+    }
+
+
+GEOCODING_STATS_EVENTS = ('hit', 'miss', 'gazetteer')
+
+
+def _count_geocoding_event(event: str):
+    counter_key = f'geocoding-stats:{event}'
+    cache.add(counter_key, 0, timeout=None)
+    try:
+        cache.incr(counter_key)
+    except ValueError:
+        # The counter was evicted in the meantime, or the cache is a dummy one.
+        pass
+
+
+def geocoding_cache_stats() -> dict[str, int]:
+    """
+    Returns the counters of geocoding queries answered locally (`hit`), of those
+    among them answered from the gazetteer (`gazetteer`), and of queries which
+    required consulting the geocoding service (`miss`).
+    """
+    counters = cache.get_many([f'geocoding-stats:{event}' for event in GEOCODING_STATS_EVENTS])
+    return {
+        event: counters.get(f'geocoding-stats:{event}', 0)
+        for event in GEOCODING_STATS_EVENTS
+    }
+
+
+def reset_geocoding_cache_stats():
+    cache.delete_many([f'geocoding-stats:{event}' for event in GEOCODING_STATS_EVENTS])
+
+
 def geocode_city(
         cityname: str, country: str, state_province: Optional[str] = None,
+        session: Optional[requests.Session] = None,
 ) -> OpenCageResult | None:
     """
     Utilizes the API of OpenCage to perform forward geocoding of the provided
@@ -83,6 +335,8 @@ def geocode_city(
             Optionally, the state / province the city is located in.
             If provided, the full identification is attempted; if this yields
             no results, the utility falls back to just the city name.
+        `session` (requests.Session):
+            Optionally, the HTTP session to query OpenCage with.
     Returns:
         OpenCageResult or None.
     """
@@ -94,7 +348,7 @@ def geocode_city(
         attempts = (cityname, )
     result = None
     for query in attempts:
-        result_set = geocode(query, country, multiple=True)
+        result_set = geocode(query, country, multiple=True, session=session)
         if not result_set:
             continue
         for single_result in result_set:
@@ -197,3 +451,11 @@ class RenameAndPrefixAvatar(object):
             filename = f'x{uuid4()}'
         filename = f'picture-{filename}.{ext.lower()}'
         return os.path.join(self.sub_path, filename)
+
+    def thumbnail_name(self, avatar_name: str, size: int, extension: str) -> str:
+        """
+        The name of the thumbnail (of the given size and format) of the avatar,
+        kept in a sub-directory next to the avatars.
+        """
+        basename = os.path.splitext(os.path.basename(avatar_name))[0]
+        return os.path.join(self.sub_path, 'thumbnails', f'{basename}-{size}.{extension}')
@@ -1,14 +1,21 @@
+import hashlib
 import json
 import logging
 import re
+from collections.abc import Callable, Sequence
+from functools import partial, reduce
+from operator import or_
 from typing import Optional
 from urllib.parse import quote_plus, unquote_plus
 
 from django.conf import settings
 from django.contrib.gis.db.models.functions import Distance
 from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
 from django.core.cache import cache
-from django.db.models import BooleanField, Case, Count, F, Prefetch, Q, When
+from django.db.models import (
+    BooleanField, Case, Count, F, Prefetch, Q, QuerySet, When,
+)
 from django.http import HttpRequest, HttpResponseRedirect, QueryDict
 from django.http.response import HttpResponseRedirectBase
 from django.urls import reverse
@@ -16,7 +23,6 @@ from django.utils.encoding import uri_to_iri
 from django.utils.translation import pgettext
 from django.views import generic
 
-import geocoder
 from django_countries.fields import Country
 from el_pagination.views import AjaxListView
 
@@ -25,11 +31,17 @@ from core.auth import PERM_SUPERVISOR, AuthMixin, AuthRole
 from core.forms import FeedbackForm
 from core.templatetags.utils import compact
 from maps import SRID
-from maps.utils import bufferize_country_boundaries
-
+from maps.functions import KNNDistance
+from maps.geoip import get_client_ip, locate_ip
+from maps.utils import (
+    bounding_boxes_for_radius,
+    bufferize_country_boundaries, great_circle_distance,
+)
+
+from ..advices import get_active_travel_advices
 from ..filters.search import SearchFilterSet
-from ..models import Condition, LocationConfidence, Phone, Place, TravelAdvice
-from ..utils import emulate_geocode_country, geocode
+from ..models import Condition, LocationConfidence, Phone, Place
+from ..utils import emulate_geocode_country, geocode, normalize_geocoding_query
 
 
 class HttpResponseTemporaryRedirect(HttpResponseRedirectBase):
@@ -108,6 +120,7 @@ class PlaceStaffListView(AuthMixin[Place], PlaceListView):
         )
         return (qs.select_related('owner', 'owner__user')
                   .prefetch_related(phones_prefetch)
+                  .with_subregions()
                   .order_by('-confirmed', 'checked', 'owner__last_name'))
 
     def get_context_data(self, **kwargs):
@@ -151,6 +164,90 @@ class PlaceStaffListView(AuthMixin[Place], PlaceListView):
         return context
 
 
+class CachedSearchResults(Sequence):
+    """
+    The results of a search, as an ordered list of identifiers of places (and
+    their distances from the searched location). Only the places of the slice
+    being displayed are retrieved from the database, in a single query.
+    When `remaining` places are described (by the searched `point`, the position
+    where they `start`, and the `count` of all the results), the list is extended
+    with the following places only when they are requested: their query, ordered
+    by the distance from the point, is rebuilt by `find_remaining` from this
+    description and the identifiers of the places found initially. Then
+    `on_extend` is called to store the extended list.
+    """
+    def __init__(
+            self, queryset, places: list[list], distance_field: Optional[str] = None,
+            remaining: Optional[dict] = None, on_extend: Optional[Callable[[], None]] = None,
+            find_remaining: Optional[Callable[[dict, list[int]], QuerySet]] = None,
+    ):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.places = places
+        self.distance_field = distance_field
+        self.remaining = remaining
+        self.on_extend = on_extend
+        self.find_remaining = find_remaining
+
+    def __len__(self):
+        return self.remaining['count'] if self.remaining else len(self.places)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self.extend(max(range(*index.indices(len(self))), default=-1) + 1)
+            return self.fetch(self.places[index])
+        self.extend((index if index >= 0 else len(self) + index) + 1)
+        return self.fetch([self.places[index]])[0]
+
+    def __iter__(self):
+        self.extend(len(self))
+        return iter(self.fetch(self.places))
+
+    def count(self):
+        return len(self)
+
+    def exists(self):
+        return len(self) > 0
+
+    def extend(self, stop: int):
+        """
+        Retrieves the identifiers of the places following the known ones, up
+        to the given position, using the query of the remaining places, which
+        is limited to the needed rows.
+        """
+        if not self.remaining or stop <= len(self.places):
+            return
+        start = self.remaining['start']
+        remaining_places = (
+            self.find_remaining(self.remaining, [pk for pk, _ in self.places[:start]])
+            .values_list('pk', 'distance')
+            [len(self.places) - start:stop - start]
+        )
+        found_places = [[pk, d] for pk, d in remaining_places]
+        self.places.extend(found_places)
+        if len(self.places) < stop:
+            # Some of the places became unavailable since the search was
+            # performed; there are no more results.
+            self.remaining['count'] = len(self.places)
+        if len(self.places) >= self.remaining['count']:
+            self.remaining.clear()
+        if self.on_extend:
+            self.on_extend()
+
+    def fetch(self, places: list[list]) -> list[Place]:
+        objects = self.queryset.in_bulk([pk for pk, _ in places])
+        results = []
+        for pk, distance in places:
+            # Places which became unavailable since the search was performed
+            # are skipped.
+            if pk not in objects:
+                continue
+            if self.distance_field:
+                setattr(objects[pk], self.distance_field, D(m=distance) if distance is not None else None)
+            results.append(objects[pk])
+        return results
+
+
 class SearchView(PlacePaginatedListView):
     queryset = Place.objects.filter(
         visibility__visible_online_public=True,
@@ -191,17 +288,16 @@ class SearchView(PlacePaginatedListView):
         params = {'query': query} if query else None
         return reverse('search', kwargs=params)
 
-    def get_identifier_for_cache(self, request: Optional[HttpRequest] = None) -> str:
+    def get_visibility_tier(self, request: Optional[HttpRequest] = None) -> str:
         """
-        How the cached results are identified: if the user is authenticated,
-        just use the user's ID; otherwise (user is not authenticated), use
-        the key of the anonymous session.
+        The groups of users who see the same search results: unauthenticated
+        visitors, authenticated users, and supervisors (who see also places of
+        deleted profiles).
         """
         request = request or self.request
-        if not request.user.id and not request.session.session_key:  # type: ignore[attr-def]
-            # Make sure the session has a key.
-            request.session.cycle_key()
-        return request.user.id or request.session.session_key  # type: ignore[attr-def]
+        if not request.user.is_authenticated:
+            return 'anonymous'
+        return 'supervisor' if request.user.has_perm(PERM_SUPERVISOR) else 'authenticated'
 
     def prepare_search(
             self, request: PasportaServoHttpRequest,
@@ -241,15 +337,16 @@ class SearchView(PlacePaginatedListView):
             self.queryset = self.queryset.prefetch_related(conditions_prefetch)
 
         if cached_id:
-            sess_id = self.get_identifier_for_cache(request)
-            cached_search = cache.get(f'search-results:{sess_id}:{cached_id}', default={})
-            if isinstance(cached_search, dict):
-                self._cached_db_query = cached_search.get('query')
+            cached_search = cache.get(f'search-results:{cached_id}')
+            if isinstance(cached_search, dict) and cached_search.get('tier') == self.get_visibility_tier(request):
+                self._cached_search = cached_search
                 for paging_setting, how_much in cached_search.get('paging', {}).items():
                     setattr(self, f'paginate_{paging_setting}', how_much)
                 self.query = cached_search.get('search-text', '')
             else:
-                self._cached_db_query = cached_search
+                # The requested search is no longer in cache, or the results
+                # are not intended for the current user.
+                self._cached_search = None
             self._cached_id = cached_id
 
         self.place_filter = SearchFilterSet(self.extended_query, self.queryset, request=request)
@@ -276,23 +373,20 @@ class SearchView(PlacePaginatedListView):
             self.query = ''
 
         # If cached results are available, attempt to use them.
-        if hasattr(self, '_cached_db_query'):
-            if self._cached_db_query:
-                qs = self.queryset.all()  # Clone the existing queryset.
-                qs.query = self._cached_db_query
-                qs = qs.all()  # Refresh the queryset according to the previous query.
+        if hasattr(self, '_cached_search'):
+            if self._cached_search:
+                return CachedSearchResults(
+                    self.get_display_queryset(self.queryset),
+                    self._cached_search['places'],
+                    self._cached_search['distance-field'],
+                    self._cached_search.get('remaining'),
+                    partial(self.store_search_results, self._cached_id, self._cached_search),
+                    self.find_remaining_places)
             else:
-                # A previously run query is requested but is no longer in cache.
-                # Or, the requested query does not belong to the current user.
-                qs = self.queryset.none()
-            return qs
+                return self.queryset.none()
 
         # No cached results: perform the full query.
-        qs = (
-            self.place_filter.qs
-            .select_related('owner', 'owner__user')
-            .defer('address', 'description', 'short_description', 'owner__description')
-        )
+        qs = self.place_filter.qs
 
         parsed_query = self.parse_user_query()
         if 'country_code' in parsed_query and not parsed_query['query']:
@@ -317,8 +411,12 @@ class SearchView(PlacePaginatedListView):
                     .annotate(distance=Distance('location', self.result.point))
                     .order_by('distance')
                 )
-                self.cache_queryset_query(search_queryset)
-                return search_queryset
+                return self.cache_search_results(
+                    search_queryset, ('distance', *self.result.point.coords), 'distance',
+                    find_places=(
+                        partial(self.find_nearest_places, qs, self.result.point, self.result.bbox)
+                        if settings.SEARCH_DISTANCE_PREFILTER else None
+                    ))
             elif self.result.country:  # We assume it's a country.
                 self.paginate_first_by = 50
                 self.paginate_orphans = 5
@@ -328,18 +426,14 @@ class SearchView(PlacePaginatedListView):
                     .filter(country=self.result.country_code.upper())
                     .order_by(F('owner__user__last_login').desc(nulls_last=True), '-id')
                 )
-                self.cache_queryset_query(search_queryset)
-                return search_queryset
-        position = geocoder.ip(self.request.META['HTTP_X_REAL_IP']
-                               if settings.ENVIRONMENT not in ('DEV', 'TEST')
-                               else "188.166.58.162")
-        position.point = Point(position.xy, srid=SRID) if position.xy else None
+                return self.cache_search_results(
+                    search_queryset, ('country', self.result.country_code.upper()))
+        position = locate_ip(get_client_ip(self.request))
         logging.getLogger('PasportaServo.geo').debug(
             "User's position: %s, %s",
             position.address if position.ok and position.address else "UNKNOWN",
             position.xy if position.ok else position.error
         )
-        position.session.close()
         if position.point and not most_recent:
             # Results are sorted by distance from user's current location, but probably
             # it is better not to creep users out by unexpectedly using their location.
@@ -348,29 +442,181 @@ class SearchView(PlacePaginatedListView):
                 .annotate(internal_distance=Distance('location', position.point))
                 .order_by('internal_distance')
             )
+            # The position is rounded to about a kilometer, so that the results
+            # can be shared between the visitors from the same area.
+            return self.cache_search_results(
+                search_queryset,
+                ('position', *(round(c, 2) for c in position.point.coords)), 'internal_distance')
         else:
             search_queryset = (
                 qs
                 .order_by(F('owner__user__last_login').desc(nulls_last=True), '-id')
             )
+            return self.cache_search_results(search_queryset, ('recent', ))
+
+    def find_nearest_places(
+            self, queryset, point: Point, bbox: Optional[dict] = None,
+    ) -> tuple[list[list], dict]:
+        """
+        Orders the places by their distance from the point, without calculating
+        the exact distance to each of them. The places within a radius (at least
+        the size of the found location's bounding box) are selected using the
+        spatial index and sorted; the radius is expanded progressively until the
+        first page of results is filled. Returns these places, and the description
+        of the remaining places (see `CachedSearchResults`), as plain data: their
+        query, ordered by the KNN distance, is rebuilt and evaluated page by page,
+        since only a query limited to a number of rows is assisted by the spatial
+        index.
+        """
+        lng, lat = point.coords
+        radius = float(settings.SEARCH_DISTANCE_PREFILTER_RADIUS)
+        if bbox:
+            radius = max(radius, *(
+                great_circle_distance(lng, lat, corner_lng, corner_lat)
+                for corner_lat, corner_lng in bbox.values()
+            ))
+        distance = Distance('location', point)
+        while (boxes := bounding_boxes_for_radius(lng, lat, radius)) is not None:
+            candidates = (
+                queryset
+                .filter(reduce(or_, (Q(location__bboverlaps=box) for box in boxes)))
+                .annotate(distance=distance)
+                .order_by('distance')
+                .values_list('pk', 'distance')
+            )
+            # The places in the corners of the box might be farther than those
+            # outside of it, thus only the ones within the radius are certain.
+            nearest_places = [[pk, d.m] for pk, d in candidates if d is not None and d.m <= radius]
+            if len(nearest_places) >= self.paginate_first_by:
+                break
+            radius *= 4
+        else:
+            # The radius covers the whole world.
+            return [
+                [pk, d.m if d is not None else None]
+                for pk, d in queryset.annotate(distance=distance).order_by('distance').values_list('pk', 'distance')
+            ], {}
+        remaining_places = self.nearest_places_queryset(queryset, point, [pk for pk, _ in nearest_places])
+        return nearest_places, {
+            'point': list(point.coords),
+            'start': len(nearest_places),
+            'count': len(nearest_places) + remaining_places.count(),
+        }
+
+    @staticmethod
+    def nearest_places_queryset(queryset, point: Point, excluded_place_ids: list[int]):
+        """
+        Orders the places, except the excluded ones, by their KNN distance from
+        the point. Only a slice of this queryset is assisted by the spatial index.
+        """
+        return (
+            queryset
+            .exclude(pk__in=excluded_place_ids)
+            .annotate(distance=KNNDistance('location', point))
+            .order_by('distance')
+        )
+
+    def find_remaining_places(self, remaining: dict, known_place_ids: list[int]):
+        """
+        Rebuilds the query of the places following the ones found initially by
+        `find_nearest_places`, from the stored description of the search.
+        """
+        filter_data = QueryDict(mutable=True)
+        for field, values in remaining.get('filter', {}).items():
+            filter_data.setlist(field, values)
+        queryset = SearchFilterSet(filter_data or None, self.queryset, request=self.request).qs
+        return self.nearest_places_queryset(
+            queryset, Point(*remaining['point'], srid=SRID), known_place_ids)
+
+    def get_display_queryset(self, queryset):
+        return (
+            queryset
+            .select_related('owner', 'owner__user')
+            .defer('address', 'description', 'short_description', 'owner__description')
+        )
 
-        # Cache the calculated result.
-        self.cache_queryset_query(search_queryset)
-        return search_queryset
-
-    def cache_queryset_query(self, queryset):
-        sess_id = self.get_identifier_for_cache()
-        self._cached_id = hex(id(queryset))[2:]
-        cached_search = {
-            'query': queryset.query,
-            'paging': {
-                setting[len('paginate_'):]: getattr(self, setting)
-                for setting in set(self.__dict__.keys()) | set(self.__class__.__dict__.keys())
-                if setting.startswith('paginate_')
-            },
-            'search-text': self.query,
+    def get_search_cache_key(self, anchor: tuple) -> str:
+        """
+        Calculates the identifier of the search results, based on the content
+        of the search: the search text and country, the filters applied, the
+        visibility tier of the user, and the anchor of the sorting (the found
+        location, country, or the user's position).
+        """
+        parsed_query = self.parse_user_query()
+        search_content = json.dumps([
+            normalize_geocoding_query(parsed_query['query']),
+            parsed_query.get('country_code', '').upper(),
+            self.get_filter_data(),
+            self.get_visibility_tier(),
+            anchor,
+        ], sort_keys=True)
+        return hashlib.sha1(search_content.encode()).hexdigest()
+
+    def get_filter_data(self) -> dict[str, list[str]]:
+        """
+        The values of the search filters applied, in a form which can be
+        stored along with the search results.
+        """
+        if not self.extended_query:
+            return {}
+        filter_data = {
+            field: sorted(value for value in self.extended_query.getlist(field) if value)
+            for field in self.extended_query
+            if field not in ('csrfmiddlewaretoken', settings.SEARCH_FIELD_NAME)
         }
-        cache.set(f'search-results:{sess_id}:{self._cached_id}', cached_search, timeout=2*60*60)
+        return {field: values for field, values in filter_data.items() if values}
+
+    def cache_search_results(
+            self, queryset, anchor: tuple, distance_field: Optional[str] = None,
+            find_places: Optional[Callable[[], tuple[list[list], dict]]] = None,
+    ):
+        """
+        Stores the ordered identifiers of the found places (with the distances,
+        when the results are sorted by distance), to be shared by all users of
+        the same visibility tier running the same search, and used for paging.
+        The identifiers are obtained from the queryset, unless a `find_places`
+        function is given; the description of the remaining places it returns
+        is stored as well (together with the filters applied), to rebuild the
+        query of the following places when they are needed.
+        """
+        self._cached_id = self.get_search_cache_key(anchor)
+        cached_search = cache.get(f'search-results:{self._cached_id}')
+        if not isinstance(cached_search, dict):
+            remaining = {}
+            if find_places:
+                places, remaining = find_places()
+                if remaining:
+                    remaining['filter'] = self.get_filter_data()
+            elif distance_field:
+                places = [
+                    [pk, distance.m if distance is not None else None]
+                    for pk, distance in queryset.values_list('pk', distance_field)
+                ]
+            else:
+                places = [[pk, None] for pk in queryset.values_list('pk', flat=True)]
+            cached_search = {
+                'places': places,
+                'remaining': remaining,
+                'distance-field': distance_field,
+                'paging': {
+                    setting[len('paginate_'):]: getattr(self, setting)
+                    for setting in set(self.__dict__.keys()) | set(self.__class__.__dict__.keys())
+                    if setting.startswith('paginate_')
+                },
+                'search-text': self.query,
+                'tier': self.get_visibility_tier(),
+            }
+            self.store_search_results(self._cached_id, cached_search)
+        return CachedSearchResults(
+            self.get_display_queryset(self.queryset),
+            cached_search['places'],
+            distance_field,
+            cached_search.get('remaining'),
+            partial(self.store_search_results, self._cached_id, cached_search),
+            self.find_remaining_places)
+
+    def store_search_results(self, cached_id: str, cached_search: dict):
+        cache.set(f'search-results:{cached_id}', cached_search, timeout=2*60*60)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -386,8 +632,6 @@ class SearchView(PlacePaginatedListView):
         if (getattr(self, 'country_search', False)
                 and hasattr(self, 'result') and self.result.country_code):
             context['country_results_count'] = context['object_list'].count()
-            context['country_advisories'] = (
-                TravelAdvice.get_for_country(self.result.country_code.upper())
-            )
+            context['country_advisories'] = get_active_travel_advices(self.result.country_code)
 
         return context
@@ -22,7 +22,9 @@ from django.views import generic
 from anymail.exceptions import AnymailRecipientsRefused
 
 from core import PasportaServoHttpRequest
-from core.auth import PERM_SUPERVISOR, AuthMixin, AuthRole
+from core.auth import (
+    PERM_SUPERVISOR, AuthMixin, AuthRole, get_authorization_context,
+)
 from core.mixins import LoginRequiredMixin
 from core.models import SiteConfiguration
 from core.templatetags.utils import next_link
@@ -30,6 +32,7 @@ from core.utils import sanitize_next
 from maps import SRID
 from maps.utils import bufferize_country_boundaries
 
+from ..advices import get_active_travel_advices
 from ..countries import countries_with_mandatory_region
 from ..forms import (
     PlaceBlockForm, PlaceBlockQuickForm, PlaceCreateForm,
@@ -37,7 +40,7 @@ from ..forms import (
 )
 from ..models import (
     Condition, LocationConfidence, LocationType,
-    PasportaServoUser, Place, Profile, TravelAdvice, Whereabouts,
+    PasportaServoUser, Place, Profile, Whereabouts,
 )
 from .mixins import (
     CreateMixin, DeleteMixin, FormInvalidMessageMixin, PlaceMixin,
@@ -120,7 +123,11 @@ class PlaceDetailView(AuthMixin[Place], PlaceMixin, generic.DetailView):
             f'MAPBOX_GL_{setting}': getattr(settings, f'MAPBOX_GL_{setting}')
             for setting in ('CSS', 'CSS_INTEGRITY', 'JS', 'JS_INTEGRITY')
         })
-        context['advisories'] = TravelAdvice.get_for_country(self.object.country.code)
+        context['advisories'] = get_active_travel_advices(self.object.country.code)
+        if self.request.user.has_perm(PERM_SUPERVISOR):
+            # The supervision of the family members is verified (in the template)
+            # for each of them; their countries are resolved at once.
+            get_authorization_context().prefetch_profiles(self.object.family_members_cache())
         return context
 
     def calculate_position(self):
@@ -19,7 +19,9 @@ from django.views import generic
 from django.views.decorators.vary import vary_on_headers
 
 from core import PasportaServoHttpRequest
-from core.auth import PERM_SUPERVISOR, AuthMixin, AuthRole
+from core.auth import (
+    PERM_SUPERVISOR, AuthMixin, AuthRole, get_authorization_context,
+)
 from core.mixins import LoginRequiredMixin
 
 from ..forms import (
@@ -267,6 +269,15 @@ class ProfileEditView(ProfileDetailView):
     public_view = False
     minimum_role = AuthRole.OWNER
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.request.user.has_perm(PERM_SUPERVISOR):
+            # The supervision of the family members is verified (in the template)
+            # for each of them; their countries are resolved at once.
+            get_authorization_context().prefetch_profiles(
+                member for place in context['places'] for member in place.family_members_cache())
+        return context
+
 
 class ProfileSettingsView(ProfileDetailView):
     template_name = 'hosting/settings.html'
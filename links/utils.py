@@ -7,8 +7,8 @@ from core.models import SiteConfiguration
 
 
 def create_unique_url(payload, salt=None):
-    config = SiteConfiguration.get_solo()
-    salt = config.salt if salt is None else salt
+    if salt is None:
+        salt = SiteConfiguration.get_solo().salt
     s = URLSafeTimedSerializer(settings.SECRET_KEY, salt=salt)
     token = s.dumps(payload)
     return reverse('unique_link', kwargs={'token': token}), token
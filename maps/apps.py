@@ -1,5 +1,35 @@
 from django.apps import AppConfig
+from django.db.models import signals
 
 
 class MapConfig(AppConfig):
     name = 'maps'
+
+    def ready(self):
+        # Changes of the places, their owners, or the visibility settings cause
+        # the affected features of the materialized world map to be re-rendered.
+        for sender in ('hosting.Place', 'hosting.VisibilitySettingsForPlace',
+                       'hosting.Profile', 'hosting.Preferences'):
+            signals.post_save.connect(
+                world_map_source_changed, sender=sender, dispatch_uid=f'world-map--{sender}')
+            signals.post_delete.connect(
+                world_map_source_changed, sender=sender, dispatch_uid=f'world-map--{sender}')
+
+
+def world_map_source_changed(sender, **kwargs):
+    from hosting.models import Place
+
+    from .world_map import schedule_world_map_update
+
+    if kwargs.get('raw'):
+        return
+    instance = kwargs['instance']
+    model_name = sender._meta.model_name
+    if model_name == 'place':
+        place_ids = [instance.pk]
+    elif model_name == 'visibilitysettingsforplace':
+        place_ids = [instance.model_id] if instance.model_id else []
+    else:
+        owner_id = instance.pk if model_name == 'profile' else instance.profile_id
+        place_ids = Place.objects_raw.filter(owner_id=owner_id).values_list('pk', flat=True)
+    schedule_world_map_update(place_ids)
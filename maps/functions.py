@@ -0,0 +1,31 @@
+from django.contrib.gis.db.models import PointField
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.functions import Cast
+
+from . import SRID
+
+
+def as_geography(field_name: str) -> Cast:
+    """
+    Represents the point stored in the given geometry field as a geography,
+    so that distances can be calculated in meters on the surface of the Earth.
+    """
+    return Cast(F(field_name), output_field=PointField(geography=True, srid=SRID))
+
+
+class KNNDistance(Func):
+    """
+    The distance (in meters) between a geography field and a fixed point, via
+    the PostGIS `<->` operator. Ordering by this distance can use a GiST index
+    on the geography expression (see `as_geography`) to find the nearest rows
+    without calculating the distance to each of them.
+    """
+    arg_joiner = ' <-> '
+    template = '(%(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, field_name, point, **extra):
+        super().__init__(
+            as_geography(field_name),
+            Value(point, output_field=PointField(geography=True, srid=SRID)),
+            **extra)
@@ -0,0 +1,264 @@
+"""
+Determination of the approximate geographical location of a visitor, based
+on their IP address.
+
+The location is looked up by the backends listed in the IP_LOCATION_BACKENDS
+setting, in order, until one of them finds it. The local range database is a
+compact binary file (created by the `import_ip_ranges` management command from
+a CSV of IP ranges, such as the MaxMind or DB-IP "city lite" exports), which is
+memory-mapped and searched in place; the remote service (IPInfo, via geocoder)
+should be configured only as a fallback, as it adds a network round-trip to the
+request cycle.
+"""
+
+import bisect
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Iterable, Sequence
+from functools import lru_cache
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+import geocoder
+from requests.exceptions import RequestException
+
+from . import SRID
+
+# Layout of the range database: a header (signature, number of ranges, offset
+# of the locations table), followed by fixed-width records of the ranges sorted
+# by their start address (start, end, index of location), followed by a JSON
+# list of the distinct locations. All addresses are stored as IPv6 (IPv4 ones
+# are mapped into the ::ffff:0:0/96 space).
+RANGE_DB_SIGNATURE = b'PSIPDB1\0'
+RANGE_DB_HEADER = struct.Struct('>8sIQ')
+RANGE_DB_RECORD = struct.Struct('>16s16sI')
+
+
+class IPLocation:
+    """
+    The approximate location of an IP address. Mimics the relevant attributes
+    of the geocoder's results, so that it can be used in their stead.
+    """
+    def __init__(
+            self,
+            country: str = '', state: str = '', city: str = '',
+            latitude: Optional[float] = None, longitude: Optional[float] = None,
+            error: Optional[str] = None,
+    ):
+        self.country = country
+        self.state = state
+        self.city = city
+        self.latlng = [latitude, longitude] if latitude is not None and longitude is not None else None
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.country)
+
+    @property
+    def xy(self) -> list[float] | None:
+        return [self.latlng[1], self.latlng[0]] if self.latlng else None
+
+    @property
+    def point(self) -> Point | None:
+        return Point(self.xy, srid=SRID) if self.xy else None
+
+    @property
+    def address(self) -> str:
+        return ', '.join(filter(None, [self.city, self.state, self.country]))
+
+    def __eq__(self, other):
+        if not isinstance(other, IPLocation):
+            return NotImplemented
+        return (
+            (self.country, self.state, self.city, self.latlng)
+            == (other.country, other.state, other.city, other.latlng)
+        )
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} [{self.address or self.error or "UNKNOWN"}]>'
+
+
+UNKNOWN_LOCATION = IPLocation()
+
+
+class IPLocationBackend:
+    def locate(self, ip_address: str) -> IPLocation | None:
+        """
+        Returns the location of the given IP address, or None when the backend
+        has no information about it.
+        """
+        raise NotImplementedError
+
+
+class RangeDatabaseBackend(IPLocationBackend):
+    """
+    Looks up the IP address in the local memory-mapped range database, keeping
+    the most recently requested addresses in an in-process LRU cache.
+    """
+    def __init__(self, database_path: Optional[str] = None, cache_size: Optional[int] = None):
+        self.database_path = database_path or settings.IP_LOCATION_DATABASE
+        self._database: RangeDatabase | None = None
+        self._database_lock = threading.Lock()
+        self.locate = lru_cache(maxsize=cache_size or settings.IP_LOCATION_CACHE_SIZE)(self.locate)
+
+    @property
+    def database(self) -> Optional['RangeDatabase']:
+        if self._database is None:
+            with self._database_lock:
+                if self._database is None and self.database_path and os.path.isfile(self.database_path):
+                    self._database = RangeDatabase(self.database_path)
+        return self._database
+
+    def locate(self, ip_address: str) -> IPLocation | None:
+        if self.database is None:
+            return None
+        try:
+            return self.database.lookup(ip_address)
+        except ValueError:
+            return None
+
+
+class RemoteServiceBackend(IPLocationBackend):
+    """
+    Asks the remote IP location service (IPInfo) about the IP address. Found
+    locations are kept in the cache, to avoid repeated network round-trips.
+    """
+    cache_timeout = 24 * 60 * 60
+
+    def locate(self, ip_address: str) -> IPLocation | None:
+        cache_key = f'ip-location:{ip_address}'
+        cached_location = cache.get(cache_key)
+        if cached_location is not None:
+            return IPLocation(**cached_location)
+        try:
+            position = geocoder.ip(ip_address)
+        except RequestException as exc:
+            logging.getLogger('PasportaServo.geo').warning(
+                "IP location service unavailable: %s", exc)
+            return None
+        position.session.close()
+        if not position.ok or not position.current_result.ok:
+            return None
+        latitude, longitude = position.latlng if position.latlng else (None, None)
+        location_data = {
+            'country': position.country or '',
+            'state': position.state or '',
+            'city': position.city or '',
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+        cache.set(cache_key, location_data, self.cache_timeout)
+        return IPLocation(**location_data)
+
+
+class RangeDatabase:
+    """
+    Read-only access to the binary range database, memory-mapped so that it is
+    shared between the worker processes and not parsed in full on start-up.
+    """
+    def __init__(self, path: str):
+        with open(path, 'rb') as db_file:
+            self._mmap = mmap.mmap(db_file.fileno(), 0, access=mmap.ACCESS_READ)
+        signature, self.size, locations_offset = RANGE_DB_HEADER.unpack_from(self._mmap, 0)
+        if signature != RANGE_DB_SIGNATURE:
+            raise ValueError(f"{path} is not an IP range database.")
+        self._locations: list[list[Any]] = json.loads(self._mmap[locations_offset:])
+        self._range_starts = _RangeStartsView(self._mmap, self.size)
+
+    def lookup(self, ip_address: str) -> IPLocation:
+        address = _packed_ipv6(ip_address)
+        index = bisect.bisect_right(self._range_starts, address) - 1
+        if index < 0:
+            return UNKNOWN_LOCATION
+        _, range_end, location_index = RANGE_DB_RECORD.unpack_from(
+            self._mmap, RANGE_DB_HEADER.size + index * RANGE_DB_RECORD.size)
+        if address > range_end:
+            return UNKNOWN_LOCATION
+        return IPLocation(*self._locations[location_index])
+
+    @staticmethod
+    def write(path: str, ranges: Iterable[tuple[str, str, tuple]]) -> int:
+        """
+        Creates the range database from (start address, end address, location)
+        triplets, where the location is a tuple of country code, state, city,
+        latitude and longitude. Returns the number of ranges written.
+        """
+        locations: dict[tuple, int] = {}
+        records = []
+        for range_start, range_end, location in ranges:
+            location_index = locations.setdefault(tuple(location), len(locations))
+            records.append((_packed_ipv6(range_start), _packed_ipv6(range_end), location_index))
+        records.sort()
+        locations_offset = RANGE_DB_HEADER.size + len(records) * RANGE_DB_RECORD.size
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as db_file:
+            db_file.write(RANGE_DB_HEADER.pack(RANGE_DB_SIGNATURE, len(records), locations_offset))
+            for record in records:
+                db_file.write(RANGE_DB_RECORD.pack(*record))
+            db_file.write(json.dumps(list(locations), ensure_ascii=False).encode())
+        # Replacing the file atomically allows the running processes to keep
+        # using the previous version which they have mapped.
+        os.replace(temp_path, path)
+        return len(records)
+
+
+class _RangeStartsView(Sequence):
+    """
+    Exposes the start addresses of the ranges in the memory-mapped database as
+    a sequence, for binary search.
+    """
+    def __init__(self, buffer: mmap.mmap, size: int):
+        self.buffer, self.size = buffer, size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        offset = RANGE_DB_HEADER.size + index * RANGE_DB_RECORD.size
+        return self.buffer[offset:offset+16]
+
+
+def _packed_ipv6(ip_address: str) -> bytes:
+    address = ipaddress.ip_address(ip_address.strip())
+    if address.version == 4:
+        address = ipaddress.IPv6Address(f'::ffff:{address}')
+    return address.packed
+
+
+@lru_cache(maxsize=None)
+def get_backends() -> list[IPLocationBackend]:
+    return [import_string(backend_path)() for backend_path in settings.IP_LOCATION_BACKENDS]
+
+
+def locate_ip(ip_address: str) -> IPLocation:
+    """
+    Determines the approximate location of the IP address using the configured
+    backends. When none of them knows the address, an unknown location (which
+    is not `ok`) is returned.
+    """
+    if ip_address:
+        for backend in get_backends():
+            location = backend.locate(ip_address)
+            if location is not None and location.ok:
+                return location
+    return UNKNOWN_LOCATION
+
+
+def get_client_ip(request) -> str:
+    """
+    Returns the IP address of the visitor as forwarded by the web server. In
+    development and testing, a fixed public address is used instead.
+    """
+    if settings.ENVIRONMENT in ('DEV', 'TEST'):
+        return "188.166.58.162"
+    return request.META.get('HTTP_X_REAL_IP', '')
@@ -0,0 +1,92 @@
+"""
+This management command measures how long the search by distance takes,
+comparing the calculation of the distance to every place with the spatial
+prefilter (see `SearchView.find_nearest_places`), for growing numbers of
+places. For the prefilter, both the time to the first page of results and
+the time to the complete results (retrieved page by page) are measured. The
+places in the local database are used; to simulate a smaller database, only
+the places with the lowest identifiers are considered.
+"""
+
+import random
+import statistics
+import time
+
+from django.contrib.gis.db.models.functions import Distance
+from django.core.management.base import BaseCommand, CommandError
+
+from hosting.models import Place
+from hosting.views.listing import CachedSearchResults, SearchView
+
+
+class Command(BaseCommand):
+    help = """
+        Compares the latency of the search by distance with and without the
+        spatial prefilter, for growing numbers of places.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--steps',
+            type=int, default=4,
+            help="number of database sizes to measure (default: 4).")
+        parser.add_argument(
+            '--samples',
+            type=int, default=10,
+            help="number of searched locations per database size (default: 10).")
+        parser.add_argument(
+            '--seed',
+            type=int, default=None,
+            help="seed for choosing the searched locations randomly.")
+
+    def handle(self, *args, **options):
+        view = SearchView()
+        place_ids = list(view.queryset.filter(location__isnull=False).order_by('pk').values_list('pk', flat=True))
+        if not place_ids:
+            raise CommandError("There are no places with a location in the database.")
+        randomizer = random.Random(options['seed'])
+        steps = max(1, options['steps'])
+
+        self.stdout.write(
+            f"{'places':>8} {'full scan (ms)':>16} {'first page (ms)':>16} {'speed-up':>9}"
+            f" {'all pages (ms)':>16} {'speed-up':>9}"
+        )
+        for step in range(1, steps + 1):
+            step_place_ids = place_ids[:len(place_ids) * step // steps]
+            queryset = view.queryset.filter(pk__lte=step_place_ids[-1])
+            places_count = queryset.count()
+            sample_ids = randomizer.sample(step_place_ids, min(options['samples'], len(step_place_ids)))
+            sample_points = Place.all_objects.filter(pk__in=sample_ids).values_list('location', flat=True)
+            full_timings, first_page_timings, all_pages_timings = [], [], []
+            for point in sample_points:
+                start = time.perf_counter()
+                full_result = list(
+                    queryset
+                    .annotate(distance=Distance('location', point))
+                    .order_by('distance')
+                    .values_list('pk', flat=True)
+                )
+                full_timings.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                # The remaining places are retrieved page by page, like in the search view.
+                places, remaining = view.find_nearest_places(queryset, point)
+                prefilter_result = CachedSearchResults(
+                    queryset, places, 'distance', remaining,
+                    find_remaining=lambda remaining, known_place_ids: view.nearest_places_queryset(
+                        queryset, point, known_place_ids),
+                )
+                prefilter_result.extend(view.paginate_first_by)
+                first_page_timings.append(time.perf_counter() - start)
+                for stop in range(view.paginate_first_by, len(prefilter_result), view.paginate_by):
+                    prefilter_result.extend(stop + view.paginate_by)
+                all_pages_timings.append(time.perf_counter() - start)
+                if len(full_result) != len(prefilter_result.places) and options['verbosity'] >= 1:
+                    self.stderr.write(f"Mismatching number of results near {point.coords}!")
+            full_median = statistics.median(full_timings) * 1000
+            first_page_median = statistics.median(first_page_timings) * 1000
+            all_pages_median = statistics.median(all_pages_timings) * 1000
+            self.stdout.write(
+                f"{places_count:>8} {full_median:>16.1f}"
+                f" {first_page_median:>16.1f} {full_median / first_page_median if first_page_median else 0:>8.1f}x"
+                f" {all_pages_median:>16.1f} {full_median / all_pages_median if all_pages_median else 0:>8.1f}x"
+            )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from hosting.models import GazetteerEntry, GeocodedQuery
+from hosting.utils import geocoding_cache_stats, reset_geocoding_cache_stats
+
+
+class Command(BaseCommand):
+    help = """
+        Displays how many geocoding queries were answered locally (from the
+        cache of the geocoding service's responses or from the gazetteer),
+        and how many required consulting the geocoding service.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help="reset the counters after displaying them.")
+
+    def handle(self, *args, **options):
+        stats = geocoding_cache_stats()
+        total = stats['hit'] + stats['miss']
+        ratio = f"{stats['hit'] / total:.1%}" if total else "n/a"
+        stored = GeocodedQuery.objects.aggregate(entries=Count('pk'), hits=Sum('hits'))
+        self.stdout.write(f"Hits:              {stats['hit']} ({ratio})")
+        self.stdout.write(f"  from gazetteer:  {stats['gazetteer']}")
+        self.stdout.write(f"Misses:            {stats['miss']}")
+        self.stdout.write(f"Stored responses:  {stored['entries'] or 0} (reused {stored['hits'] or 0} times)")
+        self.stdout.write(f"Gazetteer entries: {GazetteerEntry.objects.count()}")
+        if options['reset']:
+            reset_geocoding_cache_stats()
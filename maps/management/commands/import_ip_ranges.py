@@ -0,0 +1,78 @@
+"""
+This management command converts a CSV file of IP ranges and their locations
+into the compact range database used for determining the approximate location
+of visitors without consulting a remote service.
+
+Two layouts of the CSV file (without a header row) are understood:
+  - "dbip": as the free DB-IP "IP to City Lite" export, i.e.,
+            start, end, continent, country, state, city, latitude, longitude;
+  - "plain": start, end, country, state, city, latitude, longitude.
+"""
+
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.termcolors import make_style
+
+from ...geoip import RangeDatabase
+
+CSV_LAYOUTS = {
+    # Column positions of: start, end, country, state, city, latitude, longitude.
+    'dbip': (0, 1, 3, 4, 5, 6, 7),
+    'plain': (0, 1, 2, 3, 4, 5, 6),
+}
+
+
+class Command(BaseCommand):
+    help = """
+        Imports a CSV file of IP ranges into the local IP location database.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            metavar='FILE',
+            help="path to the CSV file of IP ranges.")
+        parser.add_argument(
+            '--layout',
+            choices=CSV_LAYOUTS.keys(), default='dbip',
+            help="order of the columns in the CSV file (default: dbip).")
+        parser.add_argument(
+            '--output',
+            metavar='FILE', default=settings.IP_LOCATION_DATABASE,
+            help="path of the range database to create (default: the IP_LOCATION_DATABASE setting).")
+
+    def handle(self, *args, **options):
+        columns = CSV_LAYOUTS[options['layout']]
+        try:
+            source_file = open(options['source'], 'r', encoding='utf-8', newline='')
+        except FileNotFoundError:
+            raise CommandError("The file %s was not found" % options['source'])
+
+        def ranges():
+            for line_number, row in enumerate(csv.reader(source_file), start=1):
+                try:
+                    start, end, country, state, city, latitude, longitude = (row[i] for i in columns)
+                    location = (
+                        country.upper(), state, city,
+                        float(latitude) if latitude else None,
+                        float(longitude) if longitude else None,
+                    )
+                except (IndexError, ValueError):
+                    raise CommandError(f"Line {line_number} cannot be parsed: {row}")
+                if country in ('', 'ZZ'):
+                    # Reserved and unallocated ranges are not useful.
+                    continue
+                yield (start, end, location)
+
+        with source_file:
+            try:
+                ranges_count = RangeDatabase.write(options['output'], ranges())
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(make_style(opts=('bold',), fg='white')(
+                f"[IMPORTED {ranges_count} IP RANGES INTO {options['output']}]"
+            ))
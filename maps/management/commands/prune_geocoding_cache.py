@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from hosting.utils import prune_geocoding_cache
+
+
+class Command(BaseCommand):
+    help = """
+        Removes the expired responses of the geocoding service from the local
+        cache, and evicts the least recently used ones beyond its capacity.
+        Meant to be run periodically.
+        """
+
+    def handle(self, *args, **options):
+        removed = prune_geocoding_cache()
+        if options['verbosity'] >= 1:
+            self.stdout.write(f"Removed {removed} stored geocoding responses.")
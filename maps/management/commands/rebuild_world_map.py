@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from ...world_map import rebuild_world_map
+
+
+class Command(BaseCommand):
+    help = """
+        Renders anew the data of the world map (for unauthenticated visitors
+        and for authenticated users). Can be run periodically, to correct any
+        changes missed by the incremental updates.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'place_ids',
+            nargs='*', type=int, metavar='place id',
+            help="re-render only the features of these places; omit to render the whole map.")
+
+    def handle(self, *args, **options):
+        rebuild_world_map(options['place_ids'] or None)
+        if options['verbosity'] >= 1:
+            self.stdout.write("Done.")
@@ -0,0 +1,155 @@
+"""
+This management command fills the local gazetteer, which allows to resolve
+the most common search queries (names of cities and regions) without the
+need to consult the geocoding service.
+
+The gazetteer can be seeded from the locations already mapped in the local
+database (the Whereabouts), and from a GeoNames dump of populated places,
+such as https://download.geonames.org/export/dump/cities15000.zip (the file
+is tab-separated, without a header row).
+"""
+
+import csv
+import sys
+
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.termcolors import make_style
+
+from django_countries.data import COUNTRIES
+
+from hosting.models import GazetteerEntry, LocationType, Whereabouts
+from hosting.utils import normalize_geocoding_query
+
+from ... import SRID
+
+# Column positions in the GeoNames 'geoname' table.
+GEONAMES_NAME, GEONAMES_ASCII_NAME, GEONAMES_ALTERNATE_NAMES = 1, 2, 3
+GEONAMES_LATITUDE, GEONAMES_LONGITUDE = 4, 5
+GEONAMES_FEATURE_CLASS, GEONAMES_COUNTRY, GEONAMES_POPULATION = 6, 8, 14
+
+
+class Command(BaseCommand):
+    help = """
+        Seeds the local gazetteer of cities and regions, used for geocoding
+        search queries without consulting the geocoding service.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--geonames',
+            metavar='FILE',
+            help="path to a GeoNames dump of populated places (tab-separated).")
+        parser.add_argument(
+            '--min-population',
+            type=int, default=15000,
+            help="skip GeoNames places with a smaller population (default: 15000).")
+        parser.add_argument(
+            '--alternate-names',
+            action='store_true',
+            help="also register the alternate (e.g., translated) names of the GeoNames places.")
+        parser.add_argument(
+            '--from-whereabouts',
+            action='store_true',
+            help="register the cities and regions already mapped in the local database.")
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="remove all existing gazetteer entries before seeding.")
+        parser.add_argument(
+            '--batch-size',
+            type=int, default=2000,
+            help="number of entries written to the database at once.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        if not options['geonames'] and not options['from_whereabouts']:
+            raise CommandError("Indicate the source of the data: --geonames and/or --from-whereabouts.")
+
+        with transaction.atomic():
+            if options['clear']:
+                deleted, _ = GazetteerEntry.objects.all().delete()
+                if self.verbosity >= 2:
+                    self.stdout.write(f"- Removed {deleted} existing entries")
+            seeded_count = 0
+            if options['from_whereabouts']:
+                seeded_count += self.seed_from_whereabouts()
+            if options['geonames']:
+                seeded_count += self.seed_from_geonames(
+                    options['geonames'], options['min_population'], options['alternate_names'])
+
+        if self.verbosity >= 1:
+            self.stdout.write(make_style(opts=('bold',), fg='white')(
+                f"[SEEDED {seeded_count} GAZETTEER ENTRIES]"
+            ))
+
+    def seed_from_whereabouts(self) -> int:
+        entries = (
+            GazetteerEntry(
+                type=location.type,
+                name=location.name.title(),
+                lookup_name=normalize_geocoding_query(location.name, transliterate=True),
+                state=location.state,
+                country=location.country,
+                bbox=location.bbox,
+                center=location.center,
+            )
+            for location in Whereabouts.objects.order_by('pk').iterator(chunk_size=self.batch_size)
+        )
+        return self.write_entries(entries, "mapped locations")
+
+    def seed_from_geonames(self, file_name: str, min_population: int, with_alternate_names: bool) -> int:
+        try:
+            source_file = open(file_name, 'r', encoding='utf-8', newline='')
+        except FileNotFoundError:
+            raise CommandError("The file %s was not found" % file_name)
+
+        def entries():
+            reader = csv.reader(source_file, delimiter='\t', quoting=csv.QUOTE_NONE)
+            for row in reader:
+                # Only populated places ('P') of the known countries are relevant.
+                if row[GEONAMES_FEATURE_CLASS] != 'P' or row[GEONAMES_COUNTRY] not in COUNTRIES:
+                    continue
+                population = int(row[GEONAMES_POPULATION] or 0)
+                if population < min_population:
+                    continue
+                names = {row[GEONAMES_NAME]: None, row[GEONAMES_ASCII_NAME]: None}
+                if with_alternate_names and row[GEONAMES_ALTERNATE_NAMES]:
+                    names.update(dict.fromkeys(row[GEONAMES_ALTERNATE_NAMES].split(',')))
+                center = Point(
+                    float(row[GEONAMES_LONGITUDE]), float(row[GEONAMES_LATITUDE]), srid=SRID)
+                lookup_names = set()
+                for name in filter(None, names):
+                    lookup_name = normalize_geocoding_query(name, transliterate=True)
+                    if not lookup_name or lookup_name in lookup_names:
+                        continue
+                    lookup_names.add(lookup_name)
+                    yield GazetteerEntry(
+                        type=LocationType.CITY.value,
+                        name=row[GEONAMES_NAME][:255],
+                        lookup_name=lookup_name[:255],
+                        country=row[GEONAMES_COUNTRY],
+                        population=population,
+                        center=center,
+                    )
+
+        with source_file:
+            csv.field_size_limit(sys.maxsize)
+            return self.write_entries(entries(), file_name)
+
+    def write_entries(self, entries, source_name: str) -> int:
+        batch, written_count = [], 0
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                GazetteerEntry.objects.bulk_create(batch)
+                written_count += len(batch)
+                batch = []
+        if batch:
+            GazetteerEntry.objects.bulk_create(batch)
+            written_count += len(batch)
+        if self.verbosity >= 2:
+            self.stdout.write(make_style(fg='green')(f"+ {written_count} entries from {source_name}"))
+        return written_count
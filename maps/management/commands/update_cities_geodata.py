@@ -1,28 +1,282 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple, Optional
+
 from django.contrib.gis.geos import LineString, Point
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 from django.db.models import (
     Case, CharField, Value as V, When, functions as dbf,
 )
+from django.utils import translation
 from django.utils.termcolors import make_style
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from hosting.countries import countries_with_mandatory_region
 from hosting.models import LocationType, Place, Whereabouts
-from hosting.utils import geocode_city
+from hosting.regions import get_country_regions
+from hosting.utils import geocode_city, geocoding_confidence
 
 from ... import SRID
+from ...data import COUNTRIES_GEO
+
+# Below this number of remaining daily requests, the geocoding is stopped.
+QUOTA_RESERVE = 500
+
+
+class CityLookup(NamedTuple):
+    name: str
+    state: str
+    region_name: str
+    country: str
+
+
+class TokenBucket:
+    """
+    Limits the rate of the operations to `rate` per second, allowing bursts of
+    up to `capacity` operations. Shared by all threads.
+    """
+    def __init__(self, rate: float, capacity: Optional[int] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, round(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class RateLimitedSession(requests.Session):
+    """
+    An HTTP session (with a pool of connections) whose requests to the geocoding
+    service are throttled by a token bucket. Responses stored locally are not
+    requested via the session and thus are not limited.
+    """
+    def __init__(self, bucket: TokenBucket, pool_size: int):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.bucket = bucket
+
+    def request(self, *args, **kwargs):
+        self.bucket.acquire()
+        return super().request(*args, **kwargs)
+
+
+class StubGeocodingSession:
+    """
+    Simulates the OpenCage geocoding service offline, for benchmarking: after
+    the given latency, responds with a city within the bounding box of the
+    country (deterministically, per query), except for roughly one query in
+    ten which yields only a region. The daily quota is counted down as well.
+    """
+    simulated = True
+
+    def __init__(self, latency: float, bucket: Optional[TokenBucket] = None, daily_limit: int = 2500):
+        self.latency = latency
+        self.bucket = bucket
+        self.limit = daily_limit
+        self.remaining = daily_limit
+        self.lock = threading.Lock()
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        params = params or {}
+        if self.bucket:
+            self.bucket.acquire()
+        time.sleep(self.latency)
+        with self.lock:
+            self.remaining = max(0, self.remaining - 1)
+            remaining = self.remaining
+        query, country = params.get('query', ''), params.get('countrycode', '').upper()
+        digest = hashlib.sha1(f'{query}|{country}'.encode()).digest()
+        results = []
+        if country in COUNTRIES_GEO:
+            bbox = COUNTRIES_GEO[country]['bbox']
+            (west, south), (east, north) = bbox['southwest'], bbox['northeast']
+            lng = west + (east - west) * digest[0] / 255
+            lat = south + (north - south) * digest[1] / 255
+            bounds = {
+                'southwest': {'lat': lat - 0.05, 'lng': lng - 0.05},
+                'northeast': {'lat': lat + 0.05, 'lng': lng + 0.05},
+            }
+            results.append({
+                'components': {
+                    '_category': 'place',
+                    '_type': 'city' if digest[2] > 25 else 'state',
+                    'country_code': country.lower(),
+                },
+                'formatted': query,
+                'geometry': {'lat': lat, 'lng': lng},
+                'bounds': bounds,
+                'confidence': geocoding_confidence(bounds),
+            })
+        response = requests.Response()
+        response.status_code = requests.codes.ok
+        response.url = url
+        response.encoding = 'utf-8'
+        response._content = json.dumps({
+            'licenses': [],
+            'rate': {'limit': self.limit, 'remaining': remaining, 'reset': 0},
+            'results': results,
+            'status': {'code': requests.codes.ok, 'message': 'OK'},
+            'total_results': len(results),
+        }).encode('utf-8')
+        return response
+
+    def close(self):
+        pass
 
 
 class Command(BaseCommand):
     help = """
         Maps the cities within the current database.  Updates the geo-data
         (bounding boxes and center points) of only those cities which were
-        not mapped yet,  and up to 2000 geocoding requests (because of the
-        OpenCage's daily limit).
+        not mapped yet,  until the remaining daily geocoding requests drop
+        below 500 (because of the OpenCage's daily limit).  The cities are
+        geocoded concurrently, at a limited rate;  cities which could not be
+        mapped are recorded in the checkpoint file (if given) and skipped in
+        the next runs.
         """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int, default=4,
+            help="number of concurrent geocoding requests (default: 4).")
+        parser.add_argument(
+            '--rate',
+            type=float, default=1.0,
+            help="maximum number of geocoding requests per second (default: 1).")
+        parser.add_argument(
+            '--batch-size',
+            type=int, default=100,
+            help="number of mapped cities stored at once (default: 100).")
+        parser.add_argument(
+            '--checkpoint',
+            metavar='FILE',
+            help="file recording the cities which could not be mapped.")
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help="geocode again also the cities recorded in the checkpoint file.")
+        parser.add_argument(
+            '--stub',
+            nargs='?', type=float, const=0.2, metavar='LATENCY',
+            help="use a simulated geocoding service responding after LATENCY "
+                 "seconds (default: 0.2), without storing the results.")
+
     def handle(self, *args, **options):
         self.verbosity = options['verbosity']
+        if options['workers'] < 1 or options['rate'] <= 0:
+            raise CommandError("The number of workers and the rate must be positive.")
+        self.dry_run = options['stub'] is not None
+        self.checkpoint_path = options['checkpoint']
+        unmappable = self.load_checkpoint() if not options['retry_failed'] else set()
+
+        city_list = {
+            lookup_key: city
+            for lookup_key, city in self.get_unmapped_cities().items()
+            if lookup_key not in unmappable
+        }
+        if self.verbosity >= 2:
+            self.stdout.write(f"{len(city_list)} cities to geocode ({len(unmappable)} skipped).")
+
+        bucket = TokenBucket(options['rate'])
+        if self.dry_run:
+            session = StubGeocodingSession(latency=options['stub'], bucket=bucket)
+        else:
+            session = RateLimitedSession(bucket, pool_size=options['workers'])
+        language = translation.get_language()
 
+        def geocode(city: CityLookup):
+            try:
+                with translation.override(language):
+                    return geocode_city(
+                        city.name, state_province=city.region_name, country=city.country,
+                        session=session)
+            finally:
+                # Each thread of the pool has its own connection to the database.
+                connection.close()
+
+        success_counter, failure_counter = 0, 0
+        pending_whereabouts = []
+        quota_exhausted = False
+        started = time.perf_counter()
+        queue = iter(city_list.items())
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                in_flight = {}
+                while True:
+                    # Only a few lookups are submitted ahead, so that the geocoding
+                    # can stop soon once the daily quota is exhausted.
+                    while not quota_exhausted and len(in_flight) < options['workers'] * 2:
+                        lookup_key, city = next(queue, (None, None))
+                        if city is None:
+                            break
+                        in_flight[executor.submit(geocode, city)] = (lookup_key, city)
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        lookup_key, city = in_flight.pop(future)
+                        city_location = future.result()
+                        if city_location:
+                            pending_whereabouts.append(self.make_whereabouts(city, city_location))
+                            success_counter += 1
+                            if city_location.remaining_api_calls < QUOTA_RESERVE:
+                                quota_exhausted = True
+                        else:
+                            unmappable.add(lookup_key)
+                            failure_counter += 1
+                            if self.verbosity >= 2:
+                                region = f"R:{city.region_name}, " if city.region_name else ""
+                                self.stdout.write(f"- {city.name} ({region}{city.country}) could not be mapped")
+                    if len(pending_whereabouts) >= options['batch_size']:
+                        self.store(pending_whereabouts, unmappable)
+                        pending_whereabouts = []
+        finally:
+            # The progress made so far is kept also when the run is interrupted.
+            self.store(pending_whereabouts, unmappable)
+            session.close()
+
+        if quota_exhausted:
+            self.stdout.write(self.style.ERROR(
+                "Daily geocoding requests limit exhausted. Please continue on a different day!"
+            ))
+        if self.verbosity >= 1:
+            elapsed = time.perf_counter() - started
+            processed = success_counter + failure_counter
+            self.stdout.write(make_style(opts=('bold',), fg='white')(
+                f"[MAPPED {success_counter} CITIES]"
+                + (" [SIMULATED]" if self.dry_run else "")
+            ))
+            self.stdout.write(
+                f"{processed} cities geocoded in {elapsed:.1f}s"
+                f" ({processed / elapsed if elapsed else 0:.1f} cities/s)."
+            )
+
+    def get_unmapped_cities(self) -> dict[str, CityLookup]:
+        """
+        Returns the distinct cities of the places which were not mapped yet,
+        by their lookup key.
+        """
         mapped_cities = (
             Whereabouts.objects
             .annotate(lookup=dbf.Concat(
@@ -31,13 +285,14 @@ class Command(BaseCommand):
             .filter(type=LocationType.CITY)
             .values_list('lookup', flat=True)
         )
+        mandatory_region_countries = countries_with_mandatory_region()
         city_list = (
             Place.all_objects
             .annotate(city_lookup=dbf.Concat(
                 dbf.Upper('city'),
                 V('###'),
                 Case(
-                    When(country__in=countries_with_mandatory_region(), then=dbf.Upper('state_province')),
+                    When(country__in=mandatory_region_countries, then=dbf.Upper('state_province')),
                     default=V('')
                 ),
                 V('###'),
@@ -45,52 +300,64 @@ class Command(BaseCommand):
                 output_field=CharField()))
             .exclude(city='')
             .exclude(city_lookup__in=mapped_cities)
+            .select_related(None)
+            .order_by('-pk')
+            .values_list('city_lookup', 'city', 'state_province', 'country')
         )
+        cities = {}
+        for lookup_key, city, state_province, country in city_list:
+            cities.setdefault(lookup_key, (city, state_province, country))
 
-        success_counter = 0
-        mapped_set = set()
-        for place in city_list:
-            if place.city_lookup not in mapped_set:
-                city_location = geocode_city(
-                    place.city,
-                    state_province=place.subregion.latin_name or place.subregion.latin_code,
-                    country=place.country.code)
-                if city_location:
-                    whereabouts = Whereabouts.objects.create(
-                        type=LocationType.CITY,
-                        name=place.city.upper(),
-                        state=(
-                            place.state_province.upper()
-                            if place.country in countries_with_mandatory_region()
-                            else ''),
-                        country=place.country,
-                        bbox=LineString(
-                            city_location.bbox['southwest'], city_location.bbox['northeast'],
-                            srid=SRID),
-                        center=Point(city_location.xy, srid=SRID),
-                    )
-                    if self.verbosity >= 2:
-                        self.stdout.write(make_style(fg='green')(f"+ Mapped {whereabouts!r}"))
-                    success_counter += 1
-                else:
-                    if self.verbosity >= 2:
-                        region = f"R:{place.subregion.iso_code}, " if place.subregion.pk else ""
-                        self.stdout.write(f"- {place.city} ({region}{place.country}) could not be mapped")
-                mapped_set.add(place.city_lookup)
-            else:
-                city_location = None
-                if self.verbosity >= 3:
-                    self.stdout.write(
-                        f"* {place.city} ({place.country}) skipped (already processed in this session)"
-                    )
-
-            if city_location is not None and city_location.remaining_api_calls < 500:
-                self.stdout.write(self.style.ERROR(
-                    "Daily geocoding requests limit exhausted. Please continue on a different day!"
-                ))
-                break
+        # The regions are loaded at once for all the cities.
+        regions = get_country_regions({country for _, _, country in cities.values()})
+        return {
+            lookup_key: CityLookup(
+                name=city,
+                state=state_province.upper() if country in mandatory_region_countries else '',
+                region_name=(
+                    region.latin_name or region.latin_code
+                    if (region := regions[country].get(state_province)) else state_province
+                ),
+                country=country,
+            )
+            for lookup_key, (city, state_province, country) in cities.items()
+        }
 
-        if self.verbosity >= 1:
-            self.stdout.write(make_style(opts=('bold',), fg='white')(
-                f"[MAPPED {success_counter} CITIES]"
-            ))
+    def make_whereabouts(self, city: CityLookup, city_location) -> Whereabouts:
+        whereabouts = Whereabouts(
+            type=LocationType.CITY,
+            name=city.name.upper(),
+            state=city.state,
+            country=city.country,
+            bbox=LineString(
+                city_location.bbox['southwest'], city_location.bbox['northeast'],
+                srid=SRID),
+            center=Point(city_location.xy, srid=SRID),
+        )
+        if self.verbosity >= 2:
+            self.stdout.write(make_style(fg='green')(f"+ Mapped {whereabouts!r}"))
+        return whereabouts
+
+    def store(self, whereabouts: list[Whereabouts], unmappable: set[str]):
+        if not self.dry_run:
+            Whereabouts.objects.bulk_create(whereabouts)
+            self.save_checkpoint(unmappable)
+
+    def load_checkpoint(self) -> set[str]:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return set()
+        try:
+            with open(self.checkpoint_path) as checkpoint_file:
+                return set(json.load(checkpoint_file)['unmappable'])
+        except (OSError, ValueError, KeyError) as err:
+            raise CommandError(f"The checkpoint file could not be read: {err}")
+
+    def save_checkpoint(self, unmappable: set[str]):
+        if not self.checkpoint_path:
+            return
+        # The file is replaced atomically, so that an interrupted run does not
+        # leave it corrupted.
+        temporary_path = f'{self.checkpoint_path}.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump({'unmappable': sorted(unmappable)}, checkpoint_file, indent=1)
+        os.replace(temporary_path, self.checkpoint_path)
@@ -11,7 +11,6 @@ Note: The OpenCage's database is very volatile and there is no guarantee
 """
 
 import json
-import re
 from collections import OrderedDict
 
 from django.core.management.base import BaseCommand
@@ -19,9 +18,7 @@ from django.core.management.base import BaseCommand
 from django_countries.data import COUNTRIES
 
 from hosting.utils import geocode
-from maps.data import COUNTRIES_GEO
-
-COUNTRIES_GEODATA_FILE = 'maps/data.py'
+from maps.data import COUNTRIES_GEO, COUNTRIES_GEODATA_FILE
 
 
 class Command(BaseCommand):
@@ -47,13 +44,7 @@ class Command(BaseCommand):
         if not update_countries or update_countries == 'ALL' or 'ALL' in update_countries:
             update_countries = COUNTRIES.keys()
 
-        # Read existing local database file.
-        with open(COUNTRIES_GEODATA_FILE, 'r') as source_file:
-            file_old_contents = source_file.read()
-        bits = re.match(
-            '(.*\nCOUNTRIES_GEO = )(?:\\{\n.*?\n\\})(.*)', file_old_contents, re.DOTALL).groups()
-
-        # Make countries dict.
+        # Make countries dict from the existing local database file.
         country_list = OrderedDict(COUNTRIES_GEO)
         update_succeeded, update_failed = [], []
         name_replacements = {
@@ -157,11 +148,10 @@ class Command(BaseCommand):
                 update_failed.append(country_code)
 
         # Generate new local database file.
-        file_new_contents = bits[0]
-        file_new_contents += json.dumps(country_list, indent=4).replace('null', str(None))
-        file_new_contents += bits[1]
         with open(COUNTRIES_GEODATA_FILE, 'w') as output_file:
-            output_file.write(file_new_contents)
+            json.dump(country_list, output_file, indent=4)
+            output_file.write('\n')
+        COUNTRIES_GEO.reload()
 
         # Print command execution summary.
         if self.verbosity >= 1:
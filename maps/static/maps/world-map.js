@@ -69,13 +69,77 @@ window.addEventListener('load', function() {
         });
         map.addControl(loc, 'top-left');
 
+        // The places are clustered on the server and loaded per tile, only for
+        // the tiles currently in view; the loaded tiles are kept for reuse.
         map.addSource("lokoj", {
             type: "geojson",
-            data: GIS_ENDPOINTS['world_map_data'],
-            cluster: true,
-            clusterMaxZoom: 14, // Max zoom to cluster points on
-            clusterRadius: 50 // Radius of each cluster when clustering points (defaults to 50)
+            data: { type: "FeatureCollection", features: [] }
         });
+        var loadedTiles = {};
+        var latestTilesRequest = 0;
+
+        function visibleTiles() {
+            var zoom = Math.max(0, Math.min(Math.floor(map.getZoom()), GIS_ENDPOINTS['world_map_tiles_max_zoom']));
+            var tilesPerSide = Math.pow(2, zoom);
+            function tileX(lng) {
+                return Math.floor((lng + 180) / 360 * tilesPerSide);
+            }
+            function tileY(lat) {
+                lat = Math.max(-85.0511, Math.min(85.0511, lat)) * Math.PI / 180;
+                var y = (1 - Math.log(Math.tan(lat) + 1 / Math.cos(lat)) / Math.PI) / 2;
+                return Math.max(0, Math.min(tilesPerSide - 1, Math.floor(y * tilesPerSide)));
+            }
+            var bounds = map.getBounds();
+            var fromX = tileX(bounds.getWest()), toX = tileX(bounds.getEast());
+            if (toX - fromX >= tilesPerSide) {
+                fromX = 0;
+                toX = tilesPerSide - 1;
+            }
+            var tiles = [];
+            for (var x = fromX; x <= toX; x++) {
+                for (var y = tileY(bounds.getNorth()); y <= tileY(bounds.getSouth()); y++) {
+                    var wrappedX = ((x % tilesPerSide) + tilesPerSide) % tilesPerSide;
+                    tiles.push(zoom + "/" + wrappedX + "/" + y);
+                }
+            }
+            return tiles.filter(function(tile, i) { return tiles.indexOf(tile) == i; });
+        }
+
+        function loadTile(tile) {
+            if (!loadedTiles[tile]) {
+                var parts = tile.split("/");
+                var url = GIS_ENDPOINTS['world_map_tiles']
+                          .replace("{z}", parts[0]).replace("{x}", parts[1]).replace("{y}", parts[2]);
+                loadedTiles[tile] = fetch(url, { credentials: "same-origin" })
+                    .then(function(response) {
+                        if (!response.ok) {
+                            throw new Error(response.statusText);
+                        }
+                        return response.json();
+                    })
+                    .then(function(collection) { return collection.features; })
+                    .catch(function() {
+                        delete loadedTiles[tile];
+                        return [];
+                    });
+            }
+            return loadedTiles[tile];
+        }
+
+        function refreshPlaces() {
+            var request = ++latestTilesRequest;
+            Promise.all(visibleTiles().map(loadTile)).then(function(tilesFeatures) {
+                if (request != latestTilesRequest) {
+                    return;
+                }
+                map.getSource("lokoj").setData({
+                    type: "FeatureCollection",
+                    features: [].concat.apply([], tilesFeatures)
+                });
+            });
+        }
+        map.on('moveend', refreshPlaces);
+        refreshPlaces();
 
         map.addLayer({
             id: "clusters",
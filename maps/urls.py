@@ -3,8 +3,8 @@ from django.utils.text import format_lazy
 from django.utils.translation import pgettext_lazy
 
 from .views import (
-    CountryDataView, EndpointsView, MapStyleView,
-    MapTypeConfigureView, PublicDataView, WorldMapView,
+    CountryDataView, EndpointsView, MapStyleView, MapTypeConfigureView,
+    PublicDataView, PublicTileDataView, WorldMapView,
 )
 
 
@@ -28,6 +28,11 @@ urlpatterns = [
     path(
         format_lazy('{places}.geojson', places=pgettext_lazy("URL", 'locations')),
         PublicDataView.as_view(), name='world_map_public_data'),
+    path(
+        format_lazy(
+            '{places}/<int:zoom>/<int:x>/<int:y>.geojson',
+            places=pgettext_lazy("URL", 'locations')),
+        PublicTileDataView.as_view(), name='world_map_public_tile'),
     re_path(
         format_lazy(
             r'^(?P<country_code>[A-Z]{{2}})'
@@ -1,5 +1,9 @@
 import decimal
+import math
 
+from django.contrib.gis.geos import Polygon
+
+from . import SRID
 from .data import COUNTRIES_GEO, COUNTRIES_TINIEST, COUNTRIES_WITH_NO_BUFFER
 
 
@@ -23,3 +27,51 @@ def bufferize_country_boundaries(country_code):
         ],
     }
     return {'bbox': bbox, 'center': COUNTRIES_GEO[country_code]['center']}
+
+
+# Mean radius of the Earth, in meters.
+EARTH_RADIUS = 6371008.8
+
+
+def great_circle_distance(lng_a: float, lat_a: float, lng_b: float, lat_b: float) -> float:
+    """
+    Returns the distance (in meters) between two points on the surface of the
+    Earth, assuming it is a sphere.
+    """
+    lng_a, lat_a, lng_b, lat_b = map(math.radians, (lng_a, lat_a, lng_b, lat_b))
+    haversine = (
+        math.sin((lat_b - lat_a) / 2) ** 2
+        + math.cos(lat_a) * math.cos(lat_b) * math.sin((lng_b - lng_a) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(haversine)))
+
+
+def bounding_boxes_for_radius(lng: float, lat: float, radius: float) -> list[Polygon] | None:
+    """
+    Calculates the bounding box (in degrees) enclosing the circle of the given
+    radius (in meters) around a point. When the box crosses the antimeridian,
+    it is split in two. None is returned when the circle encloses a pole or is
+    too large to be bounded meaningfully, i.e., the whole world is covered.
+    """
+    angular_radius = radius / EARTH_RADIUS
+    lat_delta = math.degrees(angular_radius)
+    south, north = lat - lat_delta, lat + lat_delta
+    if south <= -90 or north >= 90 or angular_radius >= math.pi / 2:
+        return None
+    # The longitudinal extent of the circle widens as the latitude grows.
+    lng_delta = math.degrees(math.asin(min(1.0, math.sin(angular_radius) / math.cos(math.radians(lat)))))
+    if lng_delta >= 180:
+        return None
+    west, east = lng - lng_delta, lng + lng_delta
+    if west < -180:
+        extents = [(west + 360, south, 180, north), (-180, south, east, north)]
+    elif east > 180:
+        extents = [(west, south, 180, north), (-180, south, east - 360, north)]
+    else:
+        extents = [(west, south, east, north)]
+    boxes = []
+    for extent in extents:
+        box = Polygon.from_bbox(extent)
+        box.srid = SRID
+        boxes.append(box)
+    return boxes
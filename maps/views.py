@@ -1,18 +1,23 @@
+import gzip
+
 from django.conf import settings
 from django.contrib.gis.geos import Point
 from django.db.models import Q
 from django.http import (
-    HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse,
+    Http404, HttpRequest, HttpResponse, HttpResponseNotModified,
+    HttpResponseRedirect, JsonResponse,
 )
 from django.urls import reverse
 from django.utils import translation
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
+from django.utils.http import parse_etags, quote_etag
 from django.views import generic
 from django.views.decorators.cache import cache_control, cache_page
-from django.views.decorators.vary import vary_on_headers
 
 from django_countries.fields import Country
+from djgeojson.http import HttpGeoJSONResponse
 from djgeojson.views import GeoJSONLayerView
 
 from core import PasportaServoHttpRequest
@@ -22,6 +27,11 @@ from core.utils import request_asks_for_json, sanitize_next
 from hosting.models import Place
 from hosting.templatetags.profile import avatar_dimension
 
+from .world_map import (
+    TILE_MAX_ZOOM, get_world_map_document,
+    get_world_map_tile, get_world_map_version,
+)
+
 HOURS = 3600
 DAYS = 24 * HOURS
 
@@ -73,6 +83,11 @@ class EndpointsView(generic.View):
             endpoints.update({
                 'world_map_style': reverse('map_style', kwargs={'style': 'positron'}),
                 'world_map_data': reverse('world_map_public_data'),
+                'world_map_tiles': (
+                    reverse('world_map_public_tile', kwargs={'zoom': 0, 'x': 0, 'y': 0})
+                    .replace('/0/0/0.', '/{z}/{x}/{y}.')
+                ),
+                'world_map_tiles_max_zoom': TILE_MAX_ZOOM,
             })
         if map_type == 'region':
             # This usage of GET params is safe, because the values are restricted by the
@@ -153,6 +168,11 @@ class PlottablePlace(Place):
 
     @property
     def owner_avatar(self):
+        # The popups show the avatar in a slot of 30 pixels; the thumbnail for
+        # double density (in the format supported by all browsers) suffices.
+        for url, size, _ in self.owner.avatar_thumbnail_urls('jpg'):
+            if size >= 60:
+                return url
         return self.owner.avatar_url
 
     @cached_property
@@ -160,49 +180,55 @@ class PlottablePlace(Place):
         return avatar_dimension(self.owner)
 
 
-@method_decorator(
-    [cache_control(private=True, max_age=12 * HOURS), cache_page(12 * HOURS)],
-    name='genuine_dispatch'
-)
-class PublicDataView(GeoJSONLayerView):
-    geometry_field = 'location'
-    precision = 2  # 0.01
-    properties = [
-        'url',
-        'owner_name',
-        'owner_avatar',
-        'owner_avatar_params',
-    ]
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+class MaterializedWorldMapView(generic.View):
+    """
+    Serves a part of the materialized GeoJSON of the world map (see the module
+    `maps.world_map`), pre-compressed and identified by an ETag; the variant
+    depends on whether the user is authenticated.
+    """
+    def get_document(self, variant: str, version: str) -> bytes:
+        raise NotImplementedError
+
+    def get(self, request: PasportaServoHttpRequest, *args, **kwargs):
+        variant = 'authenticated' if request.user.is_authenticated else 'anonymous'
+        version = get_world_map_version(variant)
+        etag = quote_etag(f'{variant}-{translation.get_language()}-{version}')
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            document = self.get_document(variant, version)
+            if 'gzip' in request.headers.get('Accept-Encoding', ''):
+                response = HttpGeoJSONResponse(content=document)
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpGeoJSONResponse(content=gzip.decompress(document))
+        response.headers['ETag'] = etag
+        patch_vary_headers(response, ['Accept-Encoding', 'Cookie'])
+        return response
 
-    def dispatch(self, request: PasportaServoHttpRequest, *args, **kwargs):
-        request.META['HTTP_X_USER_STATUS'] = (
-            'Authenticated' if request.user.is_authenticated
-            else 'Anonymous')
-        return self.genuine_dispatch(request, *args, **kwargs)
-
-    @vary_on_headers('X-User-Status')
-    def genuine_dispatch(self, request: PasportaServoHttpRequest, *args, **kwargs):
-        # Caching will take into account the header (via the Vary instruction), but
-        # it must be added before the cache framework calculates the hashmap key.
-        if request.user.is_authenticated:
-            self.properties = ['city'] + self.properties
-        return super().dispatch(request, *args, **kwargs)
 
-    def get_queryset(self):
-        by_visibility = Q(visibility__visible_online_public=True)
-        if not self.request.user.is_authenticated:
-            by_visibility &= Q(owner__pref__public_listing=True)
-        return (
-            PlottablePlace.objects_raw
-            .filter(available=True)
-            .exclude(
-                Q(location__isnull=True)
-                | Q(location=Point([]))
-                | Q(owner__death_date__isnull=False))
-            .filter(by_visibility)
-            .select_related('owner')
-            .defer('address', 'description', 'short_description', 'owner__description')
-        )
+class PublicDataView(MaterializedWorldMapView):
+    """
+    All the plottable places of the world map, in one document.
+    """
+    def get_document(self, variant, version):
+        return get_world_map_document(variant, version)
+
+
+class PublicTileDataView(MaterializedWorldMapView):
+    """
+    The plottable places within one tile of the world map (addressed by the
+    zoom level and the x and y coordinates of the tile), clustered server-side.
+    """
+    def get(self, request, *args, **kwargs):
+        self.zoom, self.x, self.y = kwargs['zoom'], kwargs['x'], kwargs['y']
+        if self.zoom > TILE_MAX_ZOOM or self.x >= 2**self.zoom or self.y >= 2**self.zoom:
+            raise Http404("No such tile.")
+        return super().get(request, *args, **kwargs)
+
+    def get_document(self, variant, version):
+        return get_world_map_tile(variant, version, self.zoom, self.x, self.y)
 
 
 class CountryDataView(AuthMixin[PlottablePlace], GeoJSONLayerView):
@@ -0,0 +1,300 @@
+"""
+Materialized data of the world map: the GeoJSON of all plottable places, in
+two variants (for unauthenticated visitors and for authenticated users).
+
+The features of the places are rendered once and stored in a file per variant;
+when a place, its owner, or their visibility settings change, only the features
+of the affected places are re-rendered (in a background task). The complete
+GeoJSON document is assembled from the stored features per language and kept
+in the cache, gzip-compressed, identified by the version of the stored data.
+
+For the tiled access, the places are additionally clustered on a grid aligned
+with the map tiles, for each zoom level: every cell of the grid holding more
+than one place becomes a single cluster feature, located at the centroid of
+the places, so that a tile never contains more features than cells.
+"""
+
+import fcntl
+import gzip
+import io
+import json
+import math
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import translation
+
+from django_q.tasks import async_task
+from djgeojson import GEOJSON_DEFAULT_SRID
+from djgeojson.serializers import Serializer as GeoJSONSerializer
+
+WORLD_MAP_VARIANTS = ('anonymous', 'authenticated')
+
+# Places are clustered on a grid of TILE_CLUSTER_GRID_SIZE x TILE_CLUSTER_GRID_SIZE
+# cells per tile (i.e., of cells of 64 pixels for tiles of 256 pixels), up to
+# the zoom level TILE_CLUSTER_MAX_ZOOM; tiles are not available beyond the zoom
+# level TILE_MAX_ZOOM.
+TILE_CLUSTER_GRID_SIZE = 4
+TILE_CLUSTER_MAX_ZOOM = 14
+TILE_MAX_ZOOM = 15
+
+MERCATOR_MAX_LATITUDE = 85.0511287798
+
+DOCUMENT_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+PLACE_PROPERTIES = [
+    'url',
+    'owner_name',
+    'owner_avatar',
+    'owner_avatar_params',
+]
+
+
+def get_world_map_queryset(variant: str):
+    from .views import PlottablePlace
+
+    by_visibility = Q(visibility__visible_online_public=True)
+    if variant != 'authenticated':
+        by_visibility &= Q(owner__pref__public_listing=True)
+    return (
+        PlottablePlace.objects_raw
+        .filter(available=True)
+        .exclude(
+            Q(location__isnull=True)
+            | Q(location=Point([]))
+            | Q(owner__death_date__isnull=False))
+        .filter(by_visibility)
+        .select_related('owner')
+        .defer('address', 'description', 'short_description', 'owner__description')
+    )
+
+
+def render_world_map_features(variant: str, place_ids: Optional[Iterable[int]] = None) -> dict[str, Any]:
+    """
+    Renders the GeoJSON features of the plottable places (all of them, or only
+    those with the given IDs). The name of the owners without one is left empty,
+    to be filled in the language of the user when the document is assembled.
+    """
+    queryset = get_world_map_queryset(variant)
+    if place_ids is not None:
+        queryset = queryset.filter(pk__in=place_ids)
+    properties = (['city'] if variant == 'authenticated' else []) + PLACE_PROPERTIES
+    stream = io.StringIO()
+    GeoJSONSerializer().serialize(
+        queryset,
+        stream=stream,
+        properties=properties,
+        precision=2,
+        srid=GEOJSON_DEFAULT_SRID,
+        geometry_field='location',
+        crs_type='name',
+        ensure_ascii=False)
+    collection = json.loads(stream.getvalue())
+    unnamed_owners_places = set(queryset.filter(owner__first_name__regex=r'^\s*$').values_list('pk', flat=True))
+    features = {}
+    for feature in collection['features']:
+        if feature['id'] in unnamed_owners_places:
+            feature['properties']['owner_name'] = None
+        features[str(feature['id'])] = feature
+    return {'crs': collection.get('crs'), 'features': features}
+
+
+def _features_path(variant: str) -> str:
+    return os.path.join(settings.WORLD_MAP_DATA_DIR, f'world-map-{variant}.json')
+
+
+def _load_features(variant: str) -> dict[str, Any] | None:
+    try:
+        with open(_features_path(variant), 'r', encoding='utf-8') as features_file:
+            return json.load(features_file)
+    except FileNotFoundError:
+        return None
+
+
+def _save_features(variant: str, data: dict[str, Any]):
+    path = _features_path(variant)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as features_file:
+        json.dump(data, features_file, ensure_ascii=False)
+    os.replace(f'{path}.tmp', path)
+
+
+@contextmanager
+def _exclusive_access():
+    os.makedirs(settings.WORLD_MAP_DATA_DIR, exist_ok=True)
+    with open(os.path.join(settings.WORLD_MAP_DATA_DIR, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def rebuild_world_map(place_ids: Optional[Iterable[int]] = None):
+    """
+    Re-renders the stored features of the world map: all of them, or only those
+    of the given places (which are removed when the places are no longer to be
+    shown). A partial update of a never materialized map does nothing.
+    """
+    with _exclusive_access():
+        for variant in WORLD_MAP_VARIANTS:
+            if place_ids is None:
+                data = render_world_map_features(variant)
+            else:
+                place_ids = list(place_ids)
+                data = _load_features(variant)
+                if data is None:
+                    continue
+                for pk in place_ids:
+                    data['features'].pop(str(pk), None)
+                data['features'].update(render_world_map_features(variant, place_ids)['features'])
+            _save_features(variant, data)
+
+
+def world_map_is_materialized() -> bool:
+    return all(os.path.exists(_features_path(variant)) for variant in WORLD_MAP_VARIANTS)
+
+
+def schedule_world_map_update(place_ids: Iterable[int]):
+    """
+    Updates the features of the given places in the background, once the
+    current transaction is committed.
+    """
+    if not world_map_is_materialized():
+        return
+    place_ids = list(place_ids)
+    if not place_ids:
+        return
+    transaction.on_commit(
+        lambda: async_task(rebuild_world_map, place_ids, group='world map'))
+
+
+def get_world_map_version(variant: str) -> str:
+    """
+    Returns the identifier of the current version of the stored features,
+    materializing them if this was not done yet.
+    """
+    try:
+        modified = os.stat(_features_path(variant)).st_mtime_ns
+    except FileNotFoundError:
+        rebuild_world_map()
+        modified = os.stat(_features_path(variant)).st_mtime_ns
+    return f'{modified:x}'
+
+
+def get_world_map_document(variant: str, version: str) -> bytes:
+    """
+    Returns the gzip-compressed GeoJSON document of the world map in the
+    current language, assembling it from the stored features when needed.
+    """
+    language = translation.get_language()
+    cache_key = f'world-map:{variant}:{language}:{version}'
+    document = cache.get(cache_key)
+    if document is None:
+        data = _load_features(variant) or {'crs': None, 'features': {}}
+        features = [data['features'][pk] for pk in sorted(data['features'], key=int)]
+        document = _compressed_collection(features, data['crs'])
+        cache.set(cache_key, document, timeout=DOCUMENT_CACHE_TIMEOUT)
+    return document
+
+
+def _compressed_collection(features: list[dict[str, Any]], crs: dict[str, Any] | None) -> bytes:
+    from hosting.models import Profile
+
+    unnamed_owner = str(Profile.INCOGNITO)
+    localized_features = []
+    for feature in features:
+        if 'owner_name' in feature['properties'] and feature['properties']['owner_name'] is None:
+            feature = {**feature, 'properties': {**feature['properties'], 'owner_name': unnamed_owner}}
+        localized_features.append(feature)
+    collection = {'type': 'FeatureCollection', 'features': localized_features}
+    if crs:
+        collection['crs'] = crs
+    return gzip.compress(json.dumps(collection, ensure_ascii=False).encode('utf-8'))
+
+
+def _mercator_position(longitude: float, latitude: float) -> tuple[float, float]:
+    """
+    Projects the geographical coordinates onto the Web Mercator square, with
+    both resulting coordinates in the range [0, 1) and the origin at top-left.
+    """
+    latitude = max(-MERCATOR_MAX_LATITUDE, min(MERCATOR_MAX_LATITUDE, latitude))
+    x = (longitude + 180) / 360
+    sin_latitude = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * math.pi)
+    return (min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12))
+
+
+def build_tile_index(features: Iterable[dict[str, Any]]) -> list[dict[tuple[int, int], list[dict[str, Any]]]]:
+    """
+    Distributes the features among the map tiles of each zoom level, up to the
+    maximal one. Up to TILE_CLUSTER_MAX_ZOOM, the features within the same cell
+    of the grid are replaced by a cluster feature.
+    """
+    positioned_features = [
+        (feature, _mercator_position(*feature['geometry']['coordinates'][:2]))
+        for feature in features
+        if feature.get('geometry') and feature['geometry'].get('coordinates')
+    ]
+    index = []
+    for zoom in range(TILE_MAX_ZOOM + 1):
+        tiles = defaultdict(list)
+        if zoom > TILE_CLUSTER_MAX_ZOOM:
+            for feature, (x, y) in positioned_features:
+                tiles[(int(x * 2**zoom), int(y * 2**zoom))].append(feature)
+        else:
+            cells_per_side = 2**zoom * TILE_CLUSTER_GRID_SIZE
+            cells = defaultdict(list)
+            for feature, (x, y) in positioned_features:
+                cells[(int(x * cells_per_side), int(y * cells_per_side))].append(feature)
+            for (cell_x, cell_y), cell_features in cells.items():
+                tile = (cell_x // TILE_CLUSTER_GRID_SIZE, cell_y // TILE_CLUSTER_GRID_SIZE)
+                if len(cell_features) == 1:
+                    tiles[tile].append(cell_features[0])
+                    continue
+                coordinates = [feature['geometry']['coordinates'] for feature in cell_features]
+                tiles[tile].append({
+                    'type': 'Feature',
+                    'geometry': {
+                        'type': 'Point',
+                        'coordinates': [
+                            round(sum(point[0] for point in coordinates) / len(coordinates), 2),
+                            round(sum(point[1] for point in coordinates) / len(coordinates), 2),
+                        ],
+                    },
+                    'properties': {'cluster': True, 'point_count': len(cell_features)},
+                })
+        for tile_features in tiles.values():
+            tile_features.sort(key=lambda feature: feature.get('id', 0))
+        index.append(dict(tiles))
+    return index
+
+
+@lru_cache(maxsize=len(WORLD_MAP_VARIANTS) * 2)
+def _get_tile_index(variant: str, version: str):
+    # The index is kept in memory of the process for the current version of
+    # the stored features only (older versions are evicted by newer ones).
+    data = _load_features(variant) or {'crs': None, 'features': {}}
+    return data['crs'], build_tile_index(data['features'].values())
+
+
+def get_world_map_tile(variant: str, version: str, zoom: int, x: int, y: int) -> bytes:
+    """
+    Returns the gzip-compressed GeoJSON of the (clustered) places within the
+    given tile of the world map, in the current language.
+    """
+    language = translation.get_language()
+    cache_key = f'world-map-tile:{variant}:{language}:{version}:{zoom}:{x}:{y}'
+    document = cache.get(cache_key)
+    if document is None:
+        crs, index = _get_tile_index(variant, version)
+        document = _compressed_collection(index[zoom].get((x, y), []), crs)
+        cache.set(cache_key, document, timeout=DOCUMENT_CACHE_TIMEOUT)
+    return document
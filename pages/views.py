@@ -1,8 +1,6 @@
 import re
 
-from django.contrib.flatpages.models import FlatPage
 from django.core.cache import cache
-from django.db.models import Count, Q
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
@@ -14,10 +12,12 @@ from django.views import generic
 from django_countries.fields import Country
 
 from core.auth import PERM_SUPERVISOR
+from core.flatpages import get_flat_page
 from core.mixins import FlatpageAsTemplateMixin, flatpages_as_templates
 from core.models import Policy
 from core.utils import sort_by
-from hosting.models import Place, Profile
+from hosting.models import Place, PlaceStatistics, Profile
+from hosting.statistics import get_place_statistics
 
 
 class AboutView(generic.TemplateView):
@@ -25,15 +25,17 @@ class AboutView(generic.TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        all_places = Place.available_objects.filter(visibility__visible_online_public=True)
+        statistics = SimpleLazyObject(
+            lambda: get_place_statistics(PlaceStatistics.Listing.ONLINE)
+        )
         context['num_of_hosts'] = SimpleLazyObject(
-            lambda: all_places.values('owner').distinct().count()
+            lambda: statistics.totals.host_count
         )
         context['num_of_countries'] = SimpleLazyObject(
-            lambda: all_places.values('country').distinct().count()
+            lambda: len(statistics.countries)
         )
         context['num_of_cities'] = SimpleLazyObject(
-            lambda: all_places.values('city').distinct().count()
+            lambda: statistics.totals.city_count
         )
         return context
 
@@ -44,9 +46,8 @@ class TermsAndConditionsView(FlatpageAsTemplateMixin, generic.TemplateView):
 
     @cached_property
     def content(self):
-        try:
-            tcpage = FlatPage.objects.only('content').get(url='/terms-conditions/')
-        except FlatPage.DoesNotExist:
+        tcpage = get_flat_page('/terms-conditions/')
+        if tcpage is None:
             raise Http404
         terms = self.render_flat_page(tcpage).rstrip()
         if not terms:
@@ -167,45 +168,28 @@ class SupervisorsView(generic.TemplateView):
 
     def get_countries(self, filter_for_book=False, filter_for_supervisor=False):
         """
-        Calculates the counts and the supervisors for each country.
+        Returns the counts and the supervisors for each country.
         """
-        book_filter = Q(in_book=True, visibility__visible_in_book=True)
-        online_filter = Q(visibility__visible_online_public=True)
-        counts_filtered = {
-            'place_count': Count('pk'),
-            'checked_count': Count('pk', filter=Q(checked=True)),
-            'only_confirmed_count': Count('pk', filter=Q(confirmed=True, checked=False)),
-        }
-        place_counts = (
-            Place.available_objects
-            .filter(
-                book_filter if filter_for_book else
-                ((book_filter | online_filter) if filter_for_supervisor else online_filter)
-            )
-            .exclude(
-                (Q(owner__deleted_on__isnull=False) | Q(owner__death_date__isnull=False))
-                if not filter_for_supervisor else Q()
-            )
-            # QuerySet.values(...).annotate(...).order_by() performs a GROUP BY query,
-            # removing the default ordering fields of the model, if any.
-            .select_related(None)
-            .values('country')
-            .annotate(**counts_filtered)
-            .order_by()
+        # The counts of the places are materialized; the public listing does not
+        # include the places of owners who are deleted or who passed away.
+        statistics = get_place_statistics(
+            PlaceStatistics.Listing.IN_BOOK if filter_for_book else
+            PlaceStatistics.Listing.SUPERVISED if filter_for_supervisor else
+            PlaceStatistics.Listing.PUBLIC
         )
 
         # Sort the countries by their name and enrich with information about supervisors
         # and total number of available places, as well as count of confirmed (by owners)
         # and checked (by supervisors) places.
-        countries = sort_by(['name'], {Country(p['country']) for p in place_counts})
+        countries = sort_by(['name'], {Country(code) for code in statistics.countries})
         for country in countries:
             try:
                 country.supervisors = sorted(self.supervisors_per_country[country.code])
             except KeyError:
                 pass
-            counts_for_country = next(filter(lambda p: p['country'] == country, place_counts))
-            for count_name in counts_filtered:
-                setattr(country, count_name, counts_for_country[count_name])
+            counts_for_country = statistics.countries[country.code]
+            for count_name in ('place_count', 'checked_count', 'only_confirmed_count'):
+                setattr(country, count_name, getattr(counts_for_country, count_name))
         return countries
 
     def get_context_data(self, **kwargs):
@@ -160,7 +160,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
 
-                'postman.context_processors.inbox',
+                'chat.context_processors.inbox',
                 'core.context_processors.expose_selected_settings',
                 'shop.context_processors.reservation_check',
             ],
@@ -174,6 +174,7 @@ ROOT_URLCONF = 'pasportaservo.urls'
 
 WSGI_APPLICATION = 'pasportaservo.wsgi.application'
 
+SESSION_ENGINE = 'core.sessions'
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
@@ -361,6 +362,44 @@ INVALID_PREFIX = "INVALID_"
 # for support or when things go wrong
 SUPPORT_EMAIL = "saluton [cxe] pasportaservo.org"
 
+# For how long (in seconds) a response of the geocoding service is reused,
+# and how many distinct queries are kept (the least recently used ones are
+# evicted first, by the `prune_geocoding_cache` command)
+GEOCODING_CACHE_TIMEOUT = 90 * 24 * 60 * 60
+GEOCODING_CACHE_MAX_ENTRIES = 50000
+
+# The sources consulted, in order, for the approximate location of a visitor;
+# the remote service (maps.geoip.RemoteServiceBackend) can be appended as a
+# fallback, at the cost of a network round-trip within the request
+IP_LOCATION_BACKENDS = ['maps.geoip.RangeDatabaseBackend']
+IP_LOCATION_DATABASE = path.join(path.dirname(BASE_DIR), 'geodata', 'ip_ranges.db')
+IP_LOCATION_CACHE_SIZE = 10000
+
+# The sources consulted, in order, for the ranges of hashes of the passwords
+# compromised in breaches (Pwned Passwords); the local database is created by
+# the `import_pwned_passwords` command, and the remote service is limited to
+# a strict timeout (in seconds), with its responses cached
+PWNED_PASSWORDS_BACKENDS = [
+    'core.pwned_passwords.HashDatabaseBackend',
+    'core.pwned_passwords.RemoteServiceBackend',
+]
+PWNED_PASSWORDS_DATABASE = path.join(path.dirname(BASE_DIR), 'pwned_passwords', 'hashes.db')
+PWNED_PASSWORDS_TIMEOUT = 3
+PWNED_PASSWORDS_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Where the pre-rendered data of the world map is stored
+WORLD_MAP_DATA_DIR = path.join(path.dirname(BASE_DIR), 'geodata', 'world_map')
+
+# Where the per-country builds of the book (`makelatexfor`, `makepdffor`) are
+# kept, with the manifest used to skip the countries whose data did not change
+BOOK_BUILD_DIR = path.join(path.dirname(BASE_DIR), 'book_build')
+
+# Whether the search by distance first looks for the places within a radius
+# (in meters) around the found location, expanding it until the first page of
+# results is filled, instead of calculating the distance to every place
+SEARCH_DISTANCE_PREFILTER = True
+SEARCH_DISTANCE_PREFILTER_RADIUS = 50000
+
 
 from djangocodemirror.settings import *  # noqa isort:skip
 
@@ -447,5 +486,6 @@ del MAPBOX_GL_BASE_STATIC
 MAPBOX_GL_RTL_PLUGIN = 'https://api.mapbox.com/mapbox-gl-js/plugins/mapbox-gl-rtl-text/v0.2.3/mapbox-gl-rtl-text.js'
 
 GITHUB_GRAPHQL_HOST = 'https://api.github.com/graphql'
+GITHUB_GRAPHQL_TRANSPORT = 'gql.transport.requests.RequestsHTTPTransport'
 GITHUB_ACCESS_TOKEN = ('Bearer', environ.get('GITHUB_ACCESS_TOKEN', "personal.access.token"))
 GITHUB_DISCUSSION_BASE_URL = 'https://github.com/tejoesperanto/pasportaservo/discussions/'
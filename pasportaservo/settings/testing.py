@@ -31,3 +31,4 @@ DATABASES['default'] = {
 }
 
 GITHUB_DISABLE_PREFETCH = True
+GITHUB_GRAPHQL_TRANSPORT = 'core.feedback.StubGitHubTransport'
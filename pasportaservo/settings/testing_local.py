@@ -29,3 +29,4 @@ EMAIL_SUBJECT_PREFIX = '[PS test] '
 EMAIL_SUBJECT_PREFIX_FULL = '[Pasporta Servo][{}] '.format(ENVIRONMENT)
 
 GITHUB_DISABLE_PREFETCH = True
+GITHUB_GRAPHQL_TRANSPORT = 'core.feedback.StubGitHubTransport'
@@ -7,8 +7,9 @@ from django.utils.translation import pgettext_lazy
 from django.views.generic import RedirectView
 
 from .views import (
-    ExtendedConversationView, ExtendedMessageView,
-    ExtendedReplyView, ExtendedWriteView,
+    ExtendedArchiveView, ExtendedConversationView, ExtendedDeleteView,
+    ExtendedMarkReadView, ExtendedMarkUnreadView, ExtendedMessageView,
+    ExtendedReplyView, ExtendedUndeleteView, ExtendedWriteView,
 )
 
 urlpatterns = [
@@ -43,7 +44,10 @@ url_index_debug = '/__debug__/'
 for module in (m for m in urlpatterns if isinstance(m, URLResolver) and m.app_name == 'postman'):
     for pattern in (
             p for p in module.url_patterns
-            if isinstance(p, URLPattern) and p.name in ['write', 'reply', 'view', 'view_conversation']
+            if isinstance(p, URLPattern) and p.name in [
+                'write', 'reply', 'view', 'view_conversation',
+                'archive', 'delete', 'undelete', 'mark-read', 'mark-unread',
+            ]
     ):
         # TODO: clean up this quick-and-dirty hack, during the chat overhaul.
         pattern.callback = {
@@ -51,4 +55,9 @@ for module in (m for m in urlpatterns if isinstance(m, URLResolver) and m.app_na
             'reply': ExtendedReplyView,
             'view': ExtendedMessageView,
             'view_conversation': ExtendedConversationView,
+            'archive': ExtendedArchiveView,
+            'delete': ExtendedDeleteView,
+            'undelete': ExtendedUndeleteView,
+            'mark-read': ExtendedMarkReadView,
+            'mark-unread': ExtendedMarkUnreadView,
         }[pattern.name].as_view()
@@ -14,11 +14,15 @@ from django.views.defaults import (
 )
 
 from postman.views import (
+    ArchiveView as PostmanArchiveView,
     ConversationView as PostmanConversationView,
-    MessageView as PostmanMessageView,
-    ReplyView as PostmanReplyView, WriteView as PostmanWriteView,
+    DeleteView as PostmanDeleteView, MarkReadView as PostmanMarkReadView,
+    MarkUnreadView as PostmanMarkUnreadView,
+    MessageView as PostmanMessageView, ReplyView as PostmanReplyView,
+    UndeleteView as PostmanUndeleteView, WriteView as PostmanWriteView,
 )
 
+from chat.unread import forget_unread_count
 from core.utils import request_asks_for_json
 from hosting.models import Phone, Place, Profile
 
@@ -162,9 +166,45 @@ class ChatMixin(object):
         return context
 
 
-class ExtendedMessageView(ChatMixin, PostmanMessageView):
+class ReadMessagesMixin(object):
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        # Viewing the messages marks them as read (directly in the database).
+        if any(m.recipient_id == request.user.pk and m.read_at is None for m in self.msgs):
+            forget_unread_count([request.user.pk])
+        return response
+
+
+class ExtendedMessageView(ChatMixin, ReadMessagesMixin, PostmanMessageView):
+    pass
+
+
+class ExtendedConversationView(ChatMixin, ReadMessagesMixin, PostmanConversationView):
+    pass
+
+
+class UpdateMessagesMixin(object):
+    def _action(self, user, filter):
+        super()._action(user, filter)
+        # The messages are updated directly in the database.
+        forget_unread_count([user.pk])
+
+
+class ExtendedArchiveView(UpdateMessagesMixin, PostmanArchiveView):
+    pass
+
+
+class ExtendedDeleteView(UpdateMessagesMixin, PostmanDeleteView):
+    pass
+
+
+class ExtendedUndeleteView(UpdateMessagesMixin, PostmanUndeleteView):
+    pass
+
+
+class ExtendedMarkReadView(UpdateMessagesMixin, PostmanMarkReadView):
     pass
 
 
-class ExtendedConversationView(ChatMixin, PostmanConversationView):
+class ExtendedMarkUnreadView(UpdateMessagesMixin, PostmanMarkUnreadView):
     pass
@@ -1,6 +1,14 @@
 from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings, tag
+from django.urls import reverse
 
 from django_webtest import WebTest
+from postman.models import STATUS_ACCEPTED, Message
+
+from chat.unread import get_unread_count
+
+from ..factories import ProfileFactory
 
 
 class CoreContextProcessorTests(WebTest):
@@ -19,3 +27,57 @@ class CoreContextProcessorTests(WebTest):
         with self.subTest(setting=setting):
             self.assertTrue(setting in response.context, msg="'{}' not present in the context".format(setting))
             self.assertEqual(response.context[setting], 3600)
+
+
+@tag('chat')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ChatContextProcessorTests(WebTest):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = ProfileFactory().user
+        cls.recipient = ProfileFactory().user
+
+    def setUp(self):
+        cache.clear()
+
+    def send_message(self):
+        return Message.objects.create(
+            subject="Saluton", body="Ĉu vi gastigus min?",
+            sender=self.sender, recipient=self.recipient, moderation_status=STATUS_ACCEPTED)
+
+    def get_unread_count(self):
+        response = self.app.get(reverse('home'), user=self.recipient)
+        return int(response.context['postman_unread_count'])
+
+    def mark_message(self, action, message):
+        page = self.app.get(reverse('postman:inbox'), user=self.recipient)
+        self.app.post(
+            reverse(f'postman:{action}'),
+            {'pks': [message.pk], 'csrfmiddlewaretoken': page.context['csrf_token']},
+            user=self.recipient)
+
+    def test_unread_count(self):
+        message = self.send_message()
+        self.assertEqual(self.get_unread_count(), 1)
+        # The number is expected to be kept in the cache.
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.recipient), 1)
+        # Sending a new message is expected to update the number.
+        another_message = self.send_message()
+        self.assertEqual(self.get_unread_count(), 2)
+        # Viewing a message is expected to update the number.
+        self.app.get(reverse('postman:view', kwargs={'message_id': message.pk}), user=self.recipient)
+        self.assertEqual(self.get_unread_count(), 1)
+        # Marking the messages as unread or read is expected to update the number.
+        self.mark_message('mark-unread', message)
+        self.assertEqual(self.get_unread_count(), 2)
+        self.mark_message('mark-read', message)
+        self.assertEqual(self.get_unread_count(), 1)
+        # Archiving a message is expected to update the number.
+        self.mark_message('archive', another_message)
+        self.assertEqual(self.get_unread_count(), 0)
+        # Deleting a message is expected to update the number.
+        another_message = self.send_message()
+        self.assertEqual(self.get_unread_count(), 1)
+        another_message.delete()
+        self.assertEqual(self.get_unread_count(), 0)
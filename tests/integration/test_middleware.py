@@ -3,16 +3,21 @@ from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.test import override_settings, tag
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings, tag
 from django.urls import reverse
 from django.utils import timezone
 
 from django_webtest import WebTest
 
-from core.models import Policy, UserBrowser
+from core.middleware import AccountFlagsMiddleware
+from core.models import Agreement, Policy, UserBrowser
+from maps.geoip import UNKNOWN_LOCATION, IPLocation
 
 from ..assertions import AdditionalAsserts
-from ..factories import PolicyFactory, UserFactory
+from ..factories import AgreementFactory, PolicyFactory, UserFactory
 
 
 @tag('integration', 'middleware')
@@ -89,15 +94,13 @@ class ConnectionInfoTests(WebTest):
         self.assertNotIn('connection_id', self.app.session, msg=self.app.session.items())
         self.assertNotIn('connection_browser', self.app.session, msg=self.app.session.items())
 
-    @patch('core.middleware.geocoder.ip')
+    @patch('core.middleware.locate_ip')
     def test_connection_logged(self, mock_geoip):
         number_existing_conn_objects = UserBrowser.objects.count()
-        mock_geoip.return_value.ok = mock_geoip.return_value.current_result.ok = True
 
         # Accessing the website from a browser (that sends a user agent string)
         # is expected to log a new connection.
-        mock_geoip.return_value.state = None
-        mock_geoip.return_value.country = 'AQ'
+        mock_geoip.return_value = IPLocation(country='AQ')
         self.app.get(
             self.general_url,
             user=self.user,
@@ -114,8 +117,7 @@ class ConnectionInfoTests(WebTest):
 
         # Accessing the website from the same browser and a different location
         # is expected to log a new connection.
-        mock_geoip.return_value.state = None
-        mock_geoip.return_value.country = 'GL'
+        mock_geoip.return_value = IPLocation(country='GL')
         self.app.get(
             self.general_url,
             user=self.user,
@@ -127,11 +129,9 @@ class ConnectionInfoTests(WebTest):
         self.assertEqual(self.app.session['connection_browser'], "Other")
         self.assertEqual(UserBrowser.objects.count(), number_existing_conn_objects + 2)
 
-    @patch('core.middleware.geocoder.ip')
+    @patch('core.middleware.locate_ip')
     def test_connection_not_logged(self, mock_geoip):
-        mock_geoip.return_value.ok = mock_geoip.return_value.current_result.ok = True
-        mock_geoip.return_value.state = 'Saskatchewan'
-        mock_geoip.return_value.country = 'CA'
+        mock_geoip.return_value = IPLocation(country='CA', state='Saskatchewan')
         self.app.get(
             self.general_url,
             user=self.user,
@@ -158,7 +158,7 @@ class ConnectionInfoTests(WebTest):
 
         # Accessing the website from the same browser and an unknown location is
         # not expected to log a new connection.
-        mock_geoip.return_value.current_result.ok = False
+        mock_geoip.return_value = UNKNOWN_LOCATION
         self.app.get(
             self.general_url,
             user=self.user,
@@ -168,7 +168,7 @@ class ConnectionInfoTests(WebTest):
         self.assertEqual(self.app.session['connection_id'], user_conn_id)
         self.assertEqual(UserBrowser.objects.count(), number_existing_conn_objects)
 
-    @patch('core.middleware.geocoder.ip')
+    @patch('core.middleware.locate_ip')
     def test_connection_reuse(self, mock_geoip):
         mock_geoip.return_value.ok = mock_geoip.return_value.current_result.ok = False
         self.app.get(
@@ -207,3 +207,72 @@ class ConnectionInfoTests(WebTest):
         mock_geoip.assert_called_once()
         self.assertNotEqual(self.app.session['connection_id'], user_conn_id)
         self.assertEqual(UserBrowser.objects.count(), number_existing_conn_objects + 1)
+
+
+@tag('integration', 'middleware')
+class AccountStateCacheTests(AdditionalAsserts, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Policy.objects.all().delete()
+        cls.policy = PolicyFactory(from_past_date=True, with_summary=False)
+        cls.user = UserFactory()
+        cls.protected_url = reverse('account_settings')
+
+    def setUp(self):
+        cache.clear()
+        self.middleware = AccountFlagsMiddleware(lambda request: HttpResponse())
+
+    def make_request(self):
+        request = RequestFactory().get(self.protected_url)
+        request.user = self.user
+        request.DNT = False
+        # The analytics and connection flags are set once per session and
+        # are thus considered already done.
+        request.session = {
+            'flag_analytics_setup': str(timezone.now()),
+            'flag_connection_logged': str(timezone.now()),
+        }
+        return request
+
+    def test_steady_state_queries(self):
+        request = self.make_request()
+        response = self.middleware.process_request(request)
+        self.assertIsNone(response)
+        self.assertTrue(request.user_has_profile)
+
+        # The repeated requests of the same user are expected to be checked
+        # without querying the database.
+        for _ in range(3):
+            request = self.make_request()
+            with self.assertNumQueries(0):
+                response = self.middleware.process_request(request)
+            self.assertIsNone(response)
+            self.assertTrue(request.user_has_profile)
+            self.assertEqual(request.user.consent_obtained['given_for'], self.policy.version)
+
+    def test_invalidation_on_profile_change(self):
+        self.middleware.process_request(self.make_request())
+        self.user.profile.birth_date = timezone.now().date() - timezone.timedelta(days=365 * 10)
+        self.user.profile.save()
+        with self.assertRaises(PermissionDenied):
+            self.middleware.process_request(self.make_request())
+
+        self.user.profile.delete()
+        request = self.make_request()
+        self.middleware.process_request(request)
+        self.assertFalse(request.user_has_profile)
+
+    def test_invalidation_on_agreement_change(self):
+        self.middleware.process_request(self.make_request())
+        Agreement.objects.filter(user=self.user).delete()
+        response = self.middleware.process_request(self.make_request())
+        self.assertIsNotNone(response)
+        self.assertEqual(response.status_code, 302)
+        self.assertStartsWith(response.url, reverse('agreement'))
+
+        AgreementFactory(user=self.user, policy_version=self.policy.version)
+        request = self.make_request()
+        with self.assertNumQueries(2):
+            # The state of the account is expected to be reloaded.
+            self.assertIsNone(self.middleware.process_request(request))
+        self.assertEqual(request.user.consent_obtained['given_for'], self.policy.version)
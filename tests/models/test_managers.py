@@ -3,19 +3,21 @@ from datetime import timedelta
 from typing import TYPE_CHECKING, ClassVar, TypeVar
 from unittest.mock import MagicMock, patch
 
+from django.core.signals import request_finished, request_started
 from django.db import DatabaseError
-from django.test import TestCase
+from django.test import TestCase, tag
 from django.utils.timezone import make_aware
 
 from factory import Faker
 from waffle.testutils import override_switch
 
 from hosting.managers import (
-    NotDeletedManager, NotDeletedRawManager, TrackingManager,
+    NotDeletedManager, NotDeletedRawManager,
+    TrackingManager, get_tracking_stats,
 )
-from hosting.models import TrackingModel
+from hosting.models import Phone, Place, Profile, TrackingModel
 
-from ..factories import TypedDjangoModelFactory
+from ..factories import PlaceFactory, TypedDjangoModelFactory
 
 TrackingModelT = TypeVar('TrackingModelT', bound=TrackingModel)
 
@@ -157,3 +159,47 @@ class TrackingManagersTests(TestCase if TYPE_CHECKING else object):
         self.assertTrue(qs[0].checked)
         self.assertTrue(qs[1].confirmed)
         self.assertTrue(qs[1].checked)
+
+
+@tag('models', 'managers')
+class TrackingConfigurationScopeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.place = PlaceFactory(confirmed_on=make_aware(Faker._get_faker().date_time_between('-400d', '-350d')))
+
+    def start_request(self):
+        request_started.send(sender=self.__class__)
+        self.addCleanup(request_finished.send, sender=self.__class__)
+
+    @patch('hosting.managers.SiteConfiguration.get_solo')
+    def test_memoized_within_request(self, mock_config: MagicMock):
+        mock_config.return_value = (
+            namedtuple('DummyConfig', 'confirmation_validity_period')(timedelta(days=35))
+        )
+        # Outside of a request, the configuration is expected to be resolved
+        # each time a queryset is built.
+        Place.all_objects.count()
+        Profile.all_objects.count()
+        self.assertEqual(mock_config.call_count, 2)
+        self.assertIsNone(get_tracking_stats())
+
+        mock_config.reset_mock()
+        self.start_request()
+        for _ in range(5):
+            Place.all_objects.count()
+            Profile.objects.count()
+            Phone.objects_raw.count()
+        self.assertEqual(mock_config.call_count, 1)
+        self.assertEqual(get_tracking_stats(), {'querysets_built': 10, 'configuration_lookups': 1})
+
+        request_finished.send(sender=self.__class__)
+        self.assertIsNone(get_tracking_stats())
+
+    def test_configuration_change_within_request(self):
+        self.start_request()
+        with override_switch('HOSTING_DATA_CONFIRMATION_EXPIRY', False):
+            self.assertTrue(Place.all_objects.get(pk=self.place.pk).confirmed)
+            self.assertTrue(Place.all_objects.get(pk=self.place.pk).confirmed)
+        with override_switch('HOSTING_DATA_CONFIRMATION_EXPIRY', True):
+            self.assertFalse(Place.all_objects.get(pk=self.place.pk).confirmed)
+        self.assertEqual(get_tracking_stats()['configuration_lookups'], 2)
@@ -14,7 +14,7 @@ from hosting.fields import RangeIntegerField
 from hosting.managers import AvailableManager
 
 from ..assertions import AdditionalAsserts
-from ..factories import PlaceFactory
+from ..factories import CountryRegionFactory, PlaceFactory
 from .test_managers import TrackingManagersTests
 
 
@@ -69,6 +69,46 @@ class PlaceModelTests(AdditionalAsserts, TrackingManagersTests, TestCase):
         self.assertSurrounding(place.icon, "<span ", "></span>")
         self.assertIn(" title=", place.icon)
 
+    def test_subregion(self):
+        region = CountryRegionFactory(country='IT')
+        place = self.factory.build(country=Country('IT'), state_province=region.iso_code)
+        # For a place in a known region, the subregion is expected to be that region.
+        self.assertEqual(place.subregion.pk, region.pk)
+        self.assertEqual(place.subregion.latin_code, region.latin_code)
+        # For a place in an unknown region, the subregion is expected to be a
+        # placeholder named by the state/province of the place.
+        place = self.factory.build(country=Country('IT'), state_province="Lazio")
+        self.assertIsNone(place.subregion.pk)
+        self.assertEqual(place.subregion.iso_code, 'X-00')
+        self.assertEqual(place.subregion.latin_code, "Lazio")
+        # The subregion is expected to be read-only.
+        with self.assertNumQueries(0):
+            place.subregion.save()
+
+    def test_with_subregions(self):
+        regions = [
+            CountryRegionFactory(country='IT'),
+            CountryRegionFactory(country='IT'),
+            CountryRegionFactory(country='FR'),
+        ]
+        owner = self.basic_place.owner
+        for region in regions:
+            self.factory(owner=owner, country=Country(region.country.code), state_province=region.iso_code)
+        self.factory(owner=owner, country=Country('FR'), state_province="Bretagne")
+        # The subregions of all the places are expected to be resolved using
+        # a single query.
+        with self.assertNumQueries(2):
+            places = list(
+                self.basic_place._meta.model.objects
+                .filter(owner=owner, country__in=['IT', 'FR'])
+                .with_subregions()
+                .order_by('id')
+            )
+        with self.assertNumQueries(0):
+            subregions = [place.subregion for place in places]
+        self.assertEqual([region.pk for region in subregions], [region.pk for region in regions] + [None])
+        self.assertEqual(subregions[-1].latin_code, "Bretagne")
+
     def test_owner_available(self):
         place = self.basic_place
         # A place's owner who does not meet and does not guide is expected
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, tag
+from django.utils import timezone
+
+from hosting.models import PlaceStatistics
+from hosting.statistics import (
+    STATISTICS_MAX_AGE, get_place_statistics, refresh_place_statistics,
+)
+
+from ..factories import PlaceFactory, ProfileFactory
+
+
+@tag('models', 'place', 'statistics')
+class PlaceStatisticsTests(TestCase):
+    @staticmethod
+    def make_place(country, visible_online=True, **kwargs):
+        place = PlaceFactory(country=country, **kwargs)
+        place.visibility.visible_online_public = visible_online
+        place.visibility.save()
+        return place
+
+    @classmethod
+    def setUpTestData(cls):
+        host = ProfileFactory()
+        cls.make_place('NL', owner=host, city="Amsterdam")
+        cls.make_place('NL', owner=host, city="Rotterdam", checked_on=timezone.now())
+        cls.make_place('NL', city="Amsterdam", confirmed_on=timezone.now())
+        cls.make_place('NL', city="Utrecht", visible_online=False, in_book=True)
+        cls.make_place('BE', city="Gent", deleted_profile=True)
+        cls.make_place('BE', city="Brugge", available=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_calculation(self):
+        online = get_place_statistics(PlaceStatistics.Listing.ONLINE)
+        self.assertEqual(set(online.countries), {'BE', 'NL'})
+        self.assertEqual(online.countries['NL'].place_count, 3)
+        self.assertEqual(online.countries['NL'].checked_count, 1)
+        self.assertEqual(online.countries['NL'].only_confirmed_count, 1)
+        self.assertEqual(online.countries['NL'].host_count, 2)
+        self.assertEqual(online.countries['NL'].city_count, 2)
+        self.assertEqual(online.totals.place_count, 4)
+        self.assertEqual(online.totals.host_count, 3)
+
+        # The places of deleted profiles are expected not to be listed publicly.
+        public = get_place_statistics(PlaceStatistics.Listing.PUBLIC)
+        self.assertEqual(set(public.countries), {'NL'})
+        self.assertEqual(public.totals.place_count, 3)
+
+        supervised = get_place_statistics(PlaceStatistics.Listing.SUPERVISED)
+        self.assertEqual(set(supervised.countries), {'BE', 'NL'})
+        self.assertEqual(supervised.countries['NL'].place_count, 4)
+        self.assertEqual(supervised.totals.city_count, 4)
+
+        in_book = get_place_statistics(PlaceStatistics.Listing.IN_BOOK)
+        self.assertEqual(set(in_book.countries), {'NL'})
+        self.assertEqual(in_book.totals.place_count, 1)
+
+    def test_materialization(self):
+        # The statistics are expected to be calculated on first use only.
+        self.assertFalse(PlaceStatistics.objects.exists())
+        get_place_statistics(PlaceStatistics.Listing.PUBLIC)
+        self.assertTrue(PlaceStatistics.objects.exists())
+        with self.assertNumQueries(1):
+            get_place_statistics(PlaceStatistics.Listing.PUBLIC)
+
+    def test_update_on_change(self):
+        refresh_place_statistics()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_place('BE', city="Antwerpen")
+        statistics = get_place_statistics(PlaceStatistics.Listing.PUBLIC)
+        self.assertEqual(set(statistics.countries), {'BE', 'NL'})
+        self.assertEqual(statistics.countries['BE'].place_count, 1)
+        self.assertEqual(statistics.totals.place_count, 4)
+        # The statistics of the other countries are expected to be kept.
+        PlaceStatistics.objects.filter(country='NL').update(place_count=99)
+        refresh_place_statistics(['BE'])
+        statistics = get_place_statistics(PlaceStatistics.Listing.PUBLIC)
+        self.assertEqual(statistics.countries['NL'].place_count, 99)
+        self.assertEqual(statistics.countries['BE'].place_count, 1)
+
+    def test_update_on_profile_change(self):
+        host = ProfileFactory()
+        with patch('hosting.statistics.schedule_place_statistics_update') as mock_schedule:
+            # Saving details of the profile not affecting the statistics is
+            # expected not to update them.
+            host.save(update_fields=['first_name', 'avatar_thumbnails'])
+            mock_schedule.assert_not_called()
+            host.deleted_on = timezone.now()
+            host.save(update_fields=['deleted_on'])
+            mock_schedule.assert_called_once()
+
+    def test_partial_update_without_statistics(self):
+        # Statistics of only some countries are expected never to be stored
+        # on their own.
+        refresh_place_statistics(['NL'])
+        self.assertFalse(PlaceStatistics.objects.exists())
+
+    def test_outdated_statistics(self):
+        refresh_place_statistics()
+        PlaceStatistics.objects.update(updated_on=timezone.now() - STATISTICS_MAX_AGE - timedelta(minutes=1))
+        with patch('hosting.statistics.schedule_place_statistics_update') as mock_schedule:
+            statistics = get_place_statistics(PlaceStatistics.Listing.ONLINE)
+            # Outdated statistics are expected to be returned, while they are
+            # updated in the background, just once.
+            self.assertEqual(statistics.totals.place_count, 4)
+            get_place_statistics(PlaceStatistics.Listing.ONLINE)
+            mock_schedule.assert_called_once_with()
@@ -250,21 +250,57 @@ class ProfileModelTests(AdditionalAsserts, TrackingManagersTests, TestCase):
         # Profile with no uploaded profile picture is expected to return False.
         profile = self.basic_profile
         self.assertFalse(profile.avatar_exists())
+        self.assertIsNone(profile.avatar_dimensions)
 
-        # Profile with uploaded profile picture not saved on disk is expected to return False.
+        # Profile with a profile picture assigned but not yet saved is expected
+        # to consult the storage about the picture.
         faker = Faker._get_faker()
         upfile = SimpleUploadedFile(
-            faker.file_name(extension='png'), faker.image(image_format='png'), 'image/png')
-        mock_storage_save.return_value = "test_avatars/xyz.png"
-        mock_storage_exists.return_value = False
+            faker.file_name(extension='png'), faker.image(size=(60, 80), image_format='png'), 'image/png')
         profile.avatar = upfile
-        profile.save()
+        mock_storage_exists.return_value = False
         self.assertFalse(profile.avatar_exists())
-
-        # Profile with uploaded profile picture properly saved on disk is expected to return True.
         mock_storage_exists.return_value = True
         self.assertTrue(profile.avatar_exists())
 
+        # Profile with uploaded profile picture is expected to return True
+        # based on the recorded metadata, without consulting the storage.
+        mock_storage_save.return_value = "test_avatars/xyz.png"
+        profile.save()
+        mock_storage_exists.reset_mock()
+        mock_storage_exists.return_value = False
+        self.assertTrue(profile.avatar_exists())
+        self.assertEqual(profile.avatar_dimensions, (60, 80))
+        self.assertEqual(len(profile.avatar_hash), 64)
+        profile = type(profile).all_objects.get(pk=profile.pk)
+        self.assertTrue(profile.avatar_exists())
+        self.assertEqual(profile.avatar_dimensions, (60, 80))
+        mock_storage_exists.assert_not_called()
+
+        # Profile whose profile picture is missing from the storage is expected
+        # to return False once the metadata is updated.
+        profile.update_avatar_metadata()
+        self.assertFalse(profile.avatar_exists())
+        self.assertIsNone(profile.avatar_dimensions)
+        self.assertEqual(profile.avatar_hash, "")
+
+    @tag('avatar')
+    @patch('hosting.models.schedule_avatar_thumbnails')
+    def test_save_without_avatar_change(self, mock_schedule):
+        # A new profile without a profile picture is expected to be saved
+        # without recording the metadata and without generating thumbnails.
+        profile = ProfileFactory.create()
+        self.assertIsNone(profile.avatar_present)
+        mock_schedule.assert_not_called()
+
+        # A profile loaded without its profile picture is expected to be saved
+        # without loading the picture and without generating thumbnails.
+        profile = type(profile).all_objects.only('first_name').get(pk=profile.pk)
+        profile.first_name = "Zamenhof"
+        profile.save()
+        self.assertIn('avatar', profile.get_deferred_fields())
+        mock_schedule.assert_not_called()
+
     def test_icon(self):
         profile = self.basic_profile
         self.assertSurrounding(profile.icon, "<span ", "></span>")
@@ -8,6 +8,7 @@ from django_countries import Countries
 from django_webtest import WebTest
 from factory import Faker
 
+from hosting.advices import get_active_travel_advices
 from hosting.fields import CountryField
 from hosting.managers import ActiveStatusManager
 from hosting.models import TravelAdvice
@@ -108,6 +109,7 @@ class TravelAdviceModelTests(AdditionalAsserts, WebTest):
         advice.save(update_fields=['countries'])
         advice.refresh_from_db()
         self.assertEqual(advice.countries, expected_countries)
+        self.assertEqual(advice.country_codes, [country.code for country in expected_countries])
         self.assertNotEqual(advice.content, "")
         self.assertNotEqual(advice.description, "")
 
@@ -147,6 +149,24 @@ class TravelAdviceModelTests(AdditionalAsserts, WebTest):
             self.assertQuerysetEqual(
                 TravelAdvice.get_for_country('AA', None), tags.values(), ordered=False, transform=_tag)
 
+    def test_active_travel_advices(self):
+        faker = Faker._get_faker()
+        tags = {
+            TravelAdviceFactory(countries='AA,BB', in_present=True, active_until=None).pk: 'aabb_now',
+            TravelAdviceFactory(countries='AA', in_past=True).pk: 'aa_past',
+            TravelAdviceFactory(
+                countries='AA', in_present=True, active_until=faker.date_between('+2d', '+9d')).pk: 'aa_now',
+            TravelAdviceFactory(
+                countries='', in_present=True, active_until=faker.date_between('+10d', '+30d')).pk: 'any_now',
+            TravelAdviceFactory(countries='', in_future=True).pk: 'any_future',
+        }
+        for country, expected in (('aa', ['aabb_now', 'any_now', 'aa_now']),
+                                  ('BB', ['aabb_now', 'any_now']),
+                                  ('CC', ['any_now'])):
+            with self.subTest(country=country):
+                self.assertEqual(
+                    [tags[advice.pk] for advice in get_active_travel_advices(country)], expected)
+
 
 @tag('models')
 class ActiveStatusManagerTests(WebTest):
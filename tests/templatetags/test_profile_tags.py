@@ -1,4 +1,6 @@
+import os
 import string
+import tempfile
 from itertools import product
 from random import choice, sample
 from unittest.mock import patch
@@ -9,7 +11,9 @@ from django.core.exceptions import FieldDoesNotExist
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models import CharField, Model, TextChoices
 from django.template import Context, Template
-from django.test import TestCase, modify_settings, override_settings, tag
+from django.test import (
+    RequestFactory, TestCase, modify_settings, override_settings, tag,
+)
 from django.utils import timezone
 from django.views import generic
 
@@ -345,6 +349,90 @@ class AvatarDimensionFilterTests(TestCase):
         self.assertEqual(page, "[width=\"76.54%\" data-tall]")
 
 
+@tag('templatetags')
+class AvatarSrcsetTagTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.template = Template("{% load avatar_srcset from profile %}[{% avatar_srcset obj 80 %}]")
+        cls.source_template = Template("{% load avatar_webp_source from profile %}[{% avatar_webp_source obj 80 %}]")
+        cls.faker = Faker._get_faker()
+
+    def setUp(self):
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_dir.name, WORLD_MAP_DATA_DIR=media_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_dir = media_dir.name
+
+    def upload_avatar(self, profile, size):
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.avatar = SimpleUploadedFile(
+                self.faker.file_name(extension='png'),
+                self.faker.image(size=size, image_format='png'),
+                'image/png')
+            profile.save()
+        return Profile.all_objects.get(pk=profile.pk)
+
+    def test_missing_thumbnails(self):
+        profile = ProfileFactory()
+        self.assertEqual(self.template.render(Context()), "[]")
+        self.assertEqual(self.template.render(Context({'obj': profile})), "[]")
+        self.assertEqual(self.source_template.render(Context({'obj': profile})), "[]")
+
+        # The thumbnails are expected to be generated only once the avatar
+        # is saved (and the transaction is committed).
+        profile.avatar = SimpleUploadedFile(
+            self.faker.file_name(extension='png'), self.faker.image(image_format='png'), 'image/png')
+        self.assertEqual(self.template.render(Context({'obj': profile})), "[]")
+        profile.save()
+        self.assertEqual(profile.avatar_thumbnails, [])
+        self.assertEqual(self.template.render(Context({'obj': profile})), "[]")
+
+    def test_generated_thumbnails(self):
+        profile = self.upload_avatar(ProfileFactory(), (300, 200))
+        # The shorter side of the thumbnails is expected to be of the fixed
+        # sizes, without enlarging the avatar.
+        self.assertEqual(profile.avatar_thumbnails, [[40, 60], [80, 120], [140, 210]])
+        for size in (40, 80, 140):
+            for extension in ('webp', 'jpg'):
+                thumbnail_name = profile.avatar.field.upload_to.thumbnail_name(profile.avatar.name, size, extension)
+                self.assertTrue(os.path.isfile(os.path.join(self.media_dir, thumbnail_name)))
+
+        def expected_srcset(extension):
+            thumbnail_url = profile.avatar.url.rsplit('/', 1)[0] + '/thumbnails/' + os.path.splitext(
+                os.path.basename(profile.avatar.name))[0]
+            return (
+                f'srcset="{thumbnail_url}-40.{extension} 60w, {thumbnail_url}-80.{extension} 120w, '
+                f'{thumbnail_url}-140.{extension} 210w, {profile.avatar.url} 300w" sizes="120px"'
+            )
+
+        # The JPEG thumbnails are expected to be offered by the image itself,
+        # regardless of the formats accepted by the browser.
+        request = RequestFactory().get('/', HTTP_ACCEPT='image/avif,image/webp,*/*')
+        page = self.template.render(Context({'obj': profile, 'request': request}))
+        self.assertEqual(page, f'[ {expected_srcset("jpg")}]')
+        page = self.template.render(Context({'obj': profile}))
+        self.assertEqual(page, f'[ {expected_srcset("jpg")}]')
+        # The WebP thumbnails are expected to be offered by a source of the picture.
+        page = self.source_template.render(Context({'obj': profile}))
+        self.assertEqual(page, f'[<source type="image/webp" {expected_srcset("webp")} />]')
+
+    def test_replaced_avatar(self):
+        profile = self.upload_avatar(ProfileFactory(), (100, 160))
+        self.assertEqual(profile.avatar_thumbnails, [[40, 40], [80, 80]])
+        previous_thumbnail = os.path.join(
+            self.media_dir,
+            profile.avatar.field.upload_to.thumbnail_name(profile.avatar.name, 80, 'webp'))
+        self.assertTrue(os.path.isfile(previous_thumbnail))
+
+        # The thumbnails of the replaced avatar are expected to be removed.
+        profile = self.upload_avatar(profile, (30, 30))
+        self.assertEqual(profile.avatar_thumbnails, [])
+        self.assertFalse(os.path.isfile(previous_thumbnail))
+        self.assertEqual(self.template.render(Context({'obj': profile})), "[]")
+
+
 @tag('templatetags')
 @override_settings(INVALID_PREFIX='NULL_', DEFAULT_AVATAR_URL='xyz')
 class GravatarFilterTests(TestCase):
@@ -0,0 +1,50 @@
+from django.contrib.flatpages.models import FlatPage
+from django.core.cache import cache
+from django.test import TestCase, override_settings, tag
+
+from core.flatpages import _index, get_compiled_template, get_flat_page
+from core.models import Policy
+
+
+@tag('flatpages')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FlatPagesCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _index.invalidate()
+        self.addCleanup(_index.invalidate)
+
+    def test_compiled_template(self):
+        page = FlatPage.objects.create(url='/test-block/', title="Test", content="Saluton {{ name }}!")
+        template = get_compiled_template(page)
+        self.assertEqual(template.render({'name': "Zamenhof"}), "Saluton Zamenhof!")
+        # The same content is expected to reuse the compiled template.
+        self.assertIs(get_compiled_template(page), template)
+        self.assertIs(get_compiled_template(FlatPage.objects.get(pk=page.pk)), template)
+
+        # A changed content is expected to be compiled again.
+        page.content = "Ĝis {{ name }}!"
+        page.save()
+        changed_template = get_compiled_template(page)
+        self.assertIsNot(changed_template, template)
+        self.assertEqual(changed_template.render({'name': "Zamenhof"}), "Ĝis Zamenhof!")
+
+        # The contents of policies are expected to be cached separately.
+        policy = Policy.objects.create(version='test', effective_date='2024-01-01', content=page.content)
+        self.assertIsNot(get_compiled_template(policy), changed_template)
+        self.assertIs(get_compiled_template({'content': "Ĝis!"}), get_compiled_template({'content': "Ĝis!"}))
+
+    def test_flat_page_by_url(self):
+        self.assertIsNone(get_flat_page('/test-block/'))
+        page = FlatPage.objects.create(url='/test-block/', title="Test", content="Saluton!")
+        self.assertEqual(get_flat_page('/test-block/').content, "Saluton!")
+        # The page is expected to be kept in the index.
+        with self.assertNumQueries(0):
+            self.assertEqual(get_flat_page('/test-block/').content, "Saluton!")
+
+        # Changing the page is expected to replace the index.
+        page.content = "Ĝis!"
+        page.save()
+        self.assertEqual(get_flat_page('/test-block/').content, "Ĝis!")
+        page.delete()
+        self.assertIsNone(get_flat_page('/test-block/'))
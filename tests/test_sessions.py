@@ -0,0 +1,61 @@
+from django.contrib.sessions.models import Session
+from django.test import TestCase, tag
+
+from core.sessions import SessionStore
+
+
+@tag('sessions')
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        store = SessionStore()
+        store['flag_book_reservation'] = False
+        store['connection'] = {'id': 7, 'browser': "Firefox"}
+        store.create()
+        self.session_key = store.session_key
+
+    def stored_data(self):
+        return Session.objects.get(session_key=self.session_key).get_decoded()
+
+    def test_unchanged_data(self):
+        store = SessionStore(self.session_key)
+        store['flag_book_reservation'] = False
+        store['connection'] = {'id': 7, 'browser': "Firefox"}
+        self.assertTrue(store.modified)
+        # Assigning the same values is expected to not write the session.
+        with self.assertNumQueries(0):
+            store.save()
+
+    def test_changed_data(self):
+        store = SessionStore(self.session_key)
+        store['flag_book_reservation'] = True
+        store.save()
+        self.assertEqual(
+            self.stored_data(),
+            {'flag_book_reservation': True, 'connection': {'id': 7, 'browser': "Firefox"}})
+        # Assigning the same values after a save is expected to not write the
+        # session again.
+        store['flag_book_reservation'] = True
+        with self.assertNumQueries(0):
+            store.save()
+
+        # A change within a stored value is expected to be written.
+        store = SessionStore(self.session_key)
+        store['connection']['id'] = 8
+        store.modified = True
+        store.save()
+        self.assertEqual(self.stored_data()['connection'], {'id': 8, 'browser': "Firefox"})
+
+        # Removing a value is expected to be written.
+        store = SessionStore(self.session_key)
+        del store['connection']
+        store.save()
+        self.assertEqual(self.stored_data(), {'flag_book_reservation': True})
+
+    def test_new_session(self):
+        store = SessionStore()
+        store['flag_analytics_setup'] = "2024-01-01"
+        store.save()
+        self.assertIsNotNone(store.session_key)
+        self.assertEqual(
+            Session.objects.get(session_key=store.session_key).get_decoded(),
+            {'flag_analytics_setup': "2024-01-01"})
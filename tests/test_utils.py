@@ -1,16 +1,19 @@
 import copy
 import logging
 import operator
+import os
 import random
+import tempfile
 from decimal import Decimal
 from typing import NamedTuple, cast
 from unittest import skipUnless
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from django.conf import settings
 from django.contrib.gis.geos import Point as GeoPoint
 from django.core import mail
 from django.test import RequestFactory, TestCase, override_settings, tag
+from django.utils import timezone, translation
 from django.utils.functional import SimpleLazyObject, lazy, lazystr
 
 from anymail.message import AnymailMessage
@@ -21,6 +24,11 @@ from requests.exceptions import (
     ConnectionError as HTTPConnectionError, HTTPError,
 )
 
+from core.lazy_data import LazyJSONData
+from core.pwned_passwords import (
+    HashDatabase, HashDatabaseBackend,
+    get_backends as get_pwned_passwords_backends, get_pwned_passwords_range,
+)
 from core.utils import (
     camel_case_split, getattr_, is_password_compromised,
     join_lazy, request_asks_for_json, send_mass_html_mail,
@@ -28,13 +36,22 @@ from core.utils import (
 )
 from hosting.countries import countries_with_mandatory_region
 from hosting.gravatar import email_to_gravatar
+from hosting.models import GazetteerEntry, GeocodedQuery, LocationType
 from hosting.utils import (
-    RenameAndPrefixAvatar, emulate_geocode_country, geocode,
-    geocode_city, title_with_particule, value_without_invalid_marker,
+    RenameAndPrefixAvatar, emulate_geocode_country, geocode, geocode_city,
+    geocoding_cache_stats, normalize_geocoding_query, prune_geocoding_cache,
+    title_with_particule, value_without_invalid_marker,
 )
 from links.utils import create_unique_url
-from maps import data as geodata
-from maps.utils import bufferize_country_boundaries
+from maps import SRID, data as geodata
+from maps.geoip import (
+    UNKNOWN_LOCATION, IPLocation, RangeDatabase,
+    RangeDatabaseBackend, get_backends, get_client_ip, locate_ip,
+)
+from maps.utils import (
+    bounding_boxes_for_radius,
+    bufferize_country_boundaries, great_circle_distance,
+)
 
 from .assertions import AdditionalAsserts
 from .factories import ProfileFactory, ProfileSansAccountFactory
@@ -364,8 +381,13 @@ class UtilityFunctionsTests(AdditionalAsserts, TestCase):
                         expected
                     )
 
-    @patch('core.utils.requests.get')
+    @override_settings(
+        PWNED_PASSWORDS_BACKENDS=['core.pwned_passwords.RemoteServiceBackend'],
+        CACHES=settings.TEST_CACHES)
+    @patch('core.pwned_passwords.requests.Session.get')
     def test_is_password_compromised(self, mock_get):
+        get_pwned_passwords_backends.cache_clear()
+        self.addCleanup(get_pwned_passwords_backends.cache_clear)
         test_data = (
             ("NoConnection", 500, (None, None), HTTPConnectionError),
             ("ServerError!", 500, (None, None), None),
@@ -395,6 +417,8 @@ class UtilityFunctionsTests(AdditionalAsserts, TestCase):
                 self.assertIsInstance(result, tuple)
                 self.assertLength(result, 2)
                 self.assertEqual(result, expected_result)
+        # The remote service is expected to be queried with a timeout.
+        self.assertEqual(mock_get.call_args.kwargs['timeout'], settings.PWNED_PASSWORDS_TIMEOUT)
 
     @tag('external')
     @skipUnless(settings.TEST_EXTERNAL_SERVICES, 'External services are tested only explicitly')
@@ -423,6 +447,31 @@ class UtilityFunctionsTests(AdditionalAsserts, TestCase):
                 self.assertStartsWith(result[0], '/ligilo/{}.'.format(token_prefix))
                 self.assertStartsWith(result[1], '{}.'.format(token_prefix))
                 self.assertEqual(result[1].count('.'), 3 if token_prefix.startswith('.') else 2)
+        # When the salt is given, the site configuration is not expected to be consulted.
+        with patch('links.utils.SiteConfiguration.get_solo') as mock_config:
+            create_unique_url(payload={}, salt="bbbb")
+        mock_config.assert_not_called()
+
+    def test_lazy_json_data(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as data_file:
+            data_file.write('{"AA": {"name": "Ĉi-tie", "population": null}, "BB": {}}')
+        self.addCleanup(os.remove, data_file.name)
+        data = LazyJSONData(data_file.name)
+        # The data is expected to be loaded only on first access.
+        self.assertIsNone(data._data)
+        self.assertIn('AA', data)
+        self.assertEqual(data['AA'], {'name': "Ĉi-tie", 'population': None})
+        self.assertEqual(list(data), ['AA', 'BB'])
+        self.assertLength(data, 2)
+        self.assertEqual(data.get('CC', {}), {})
+        with self.assertRaises(KeyError):
+            data['CC']
+        # Reloading is expected to read the modified file on next access.
+        with open(data_file.name, 'w') as modified_file:
+            modified_file.write('{"CC": {}}')
+        self.assertNotIn('CC', data)
+        data.reload()
+        self.assertIn('CC', data)
 
 
 @tag('utils')
@@ -873,6 +922,167 @@ class GeographicUtilityFunctionsTests(AdditionalAsserts, TestCase):
         self.assertEqual(mock_get.call_count, 2)
         self.assertEqual([result.state, result.city, result.village], ["Cordoba", "Monteria", "Varsovia"])
 
+    def test_normalize_geocoding_query(self):
+        test_data = (
+            ("Roterdamo", "roterdamo", "roterdamo"),
+            ("  Roterdamo ,Nederlando. ", "roterdamo, nederlando", "roterdamo, nederlando"),
+            ("São\tPaulo", "são paulo", "sao paulo"),
+            ("ZÜRICH", "zürich", "zurich"),
+            ("", "", ""),
+        )
+        for query, expected_value, expected_latin_value in test_data:
+            with self.subTest(query=query):
+                self.assertEqual(normalize_geocoding_query(query), expected_value)
+                self.assertEqual(
+                    normalize_geocoding_query(query, transliterate=True),
+                    expected_latin_value)
+
+    @patch('geocoder.base.requests.Session.get')
+    def test_geocode_cached(self, mock_get):
+        mock_get.return_value.json.return_value = {
+            "rate": {"limit": 2500, "remaining": 2100, "reset": 1586908800},
+            "licenses": [{"name": "see attribution guide", "url": "https://opencagedata.com/credits"}],
+            "results": [{
+                "components": {
+                    "_category": "place", "_type": "city",
+                    "city": "Roterdamo", "country": "Nederlando", "country_code": "nl",
+                },
+                "confidence": 5,
+                "formatted": "Roterdamo, Nederlando",
+                "geometry": {"lat": 51.9228958, "lng": 4.4631727}
+            }],
+            "status": {"code": 200, "message": "OK"}, "total_results": 1
+        }
+        mock_get.return_value.status_code = 200
+        stats_before = geocoding_cache_stats()
+
+        # The first query is expected to be sent to the geocoding service.
+        result = geocode("Roterdamo", 'NL')
+        mock_get.assert_called_once()
+        self.assertEqual(result.status, 'OK')
+        self.assertEqual(GeocodedQuery.objects.count(), 1)
+
+        # A repeated query (up to letter case and spacing) is expected to be
+        # answered from the local cache, with an identical result.
+        mock_get.reset_mock()
+        cached_result = geocode("  roterdamo ", 'nl')
+        mock_get.assert_not_called()
+        self.assertIs(type(cached_result), OpenCageQuery)
+        self.assertEqual(cached_result.status, 'OK')
+        self.assertEqual(cached_result.city, result.city)
+        self.assertEqual(cached_result.xy, result.xy)
+        self.assertEqual(cached_result.point, result.point)
+        self.assertEqual(cached_result.remaining_api_calls, 999999)
+        self.assertEqual(GeocodedQuery.objects.get().hits, 1)
+        stats_after = geocoding_cache_stats()
+        self.assertEqual(stats_after['hit'] - stats_before['hit'], 1)
+        self.assertEqual(stats_after['miss'] - stats_before['miss'], 1)
+
+        # A query for a different country or in a different language is
+        # expected to be sent to the geocoding service.
+        for country, language in (('BE', 'eo'), ('NL', 'en')):
+            with self.subTest(country=country, language=language):
+                mock_get.reset_mock()
+                with translation.override(language):
+                    geocode("Roterdamo", country)
+                mock_get.assert_called_once()
+
+        # A stale response is expected to not be reused.
+        GeocodedQuery.objects.update(
+            created_on=timezone.now() - timezone.timedelta(seconds=settings.GEOCODING_CACHE_TIMEOUT + 1))
+        mock_get.reset_mock()
+        geocode("Roterdamo", 'NL')
+        mock_get.assert_called_once()
+
+        # A failed query is expected to not be stored.
+        GeocodedQuery.objects.all().delete()
+        mock_get.reset_mock()
+        mock_get.side_effect = HTTPConnectionError("Failed to establish a new connection.")
+        null_handler = logging.NullHandler()
+        logging.getLogger('geocoder').addHandler(null_handler)
+        geocode("Roterdamo", 'NL')
+        logging.getLogger('geocoder').removeHandler(null_handler)
+        self.assertEqual(GeocodedQuery.objects.count(), 0)
+
+    @patch('geocoder.base.requests.Session.get')
+    def test_geocode_private_not_cached(self, mock_get):
+        mock_get.return_value.json.return_value = {
+            "licenses": [], "results": [],
+            "status": {"code": 200, "message": "OK"}, "total_results": 0
+        }
+        mock_get.return_value.status_code = 200
+        for i in range(2):
+            geocode("Nieuwe Binnenweg 176, Rotterdam", 'NL', private=True)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(GeocodedQuery.objects.count(), 0)
+
+    @override_settings(GEOCODING_CACHE_MAX_ENTRIES=2)
+    @patch('geocoder.base.requests.Session.get')
+    def test_geocode_cache_eviction(self, mock_get):
+        mock_get.return_value.json.return_value = {
+            "licenses": [], "results": [],
+            "status": {"code": 200, "message": "OK"}, "total_results": 0
+        }
+        mock_get.return_value.status_code = 200
+        geocode("Roterdamo")
+        geocode("Amsterdamo")
+        # Using the first query makes the second one the least recently used.
+        geocode("Roterdamo")
+        geocode("Hago")
+        # Storing a response is expected to not evict any of the others; this
+        # is left to the periodic pruning.
+        self.assertEqual(GeocodedQuery.objects.count(), 3)
+        self.assertEqual(prune_geocoding_cache(), 1)
+        self.assertEqual(
+            set(GeocodedQuery.objects.values_list('query', flat=True)),
+            {"roterdamo", "hago"}
+        )
+
+        # A stale response is expected to be removed by the pruning.
+        GeocodedQuery.objects.filter(query="hago").update(
+            created_on=timezone.now() - timezone.timedelta(seconds=settings.GEOCODING_CACHE_TIMEOUT + 1))
+        self.assertEqual(prune_geocoding_cache(), 1)
+        self.assertEqual(list(GeocodedQuery.objects.values_list('query', flat=True)), ["roterdamo"])
+
+    @patch('geocoder.base.requests.Session.get')
+    def test_geocode_gazetteer(self, mock_get):
+        GazetteerEntry.objects.create(
+            type=LocationType.CITY.value, name="Zürich", state="ZH", country='CH', population=420000,
+            center=GeoPoint(8.5410422, 47.3744489, srid=SRID))
+        GazetteerEntry.objects.create(
+            type=LocationType.CITY.value, name="Zurich", country='CA', population=800,
+            center=GeoPoint(-81.6249, 43.4215, srid=SRID))
+        stats_before = geocoding_cache_stats()
+
+        # The most populous namesake is expected to be selected.
+        result = geocode("zurich")
+        mock_get.assert_not_called()
+        self.assertIs(type(result), OpenCageQuery)
+        self.assertEqual(result.status, 'OK')
+        self.assertEqual(result.city, "Zürich")
+        self.assertEqual(result.state, "ZH")
+        self.assertEqual(result.country_code.upper(), 'CH')
+        self.assertEqual(result._components['_type'], 'city')
+        self.assertEqual(result.xy, [8.5410422, 47.3744489])
+        self.assertIsNotNone(result.point)
+        self.assertEqual(geocoding_cache_stats()['gazetteer'] - stats_before['gazetteer'], 1)
+
+        # A country restriction is expected to be respected.
+        result = geocode("ZURICH", 'CA')
+        mock_get.assert_not_called()
+        self.assertEqual(result.country_code.upper(), 'CA')
+
+        # Queries requesting multiple results or annotations are expected to
+        # bypass the gazetteer.
+        mock_get.return_value.json.return_value = {
+            "licenses": [], "results": [],
+            "status": {"code": 200, "message": "OK"}, "total_results": 0
+        }
+        mock_get.return_value.status_code = 200
+        geocode("Zurich", multiple=True)
+        geocode("Zurich", annotations=True)
+        self.assertEqual(mock_get.call_count, 2)
+
     @patch('geocoder.base.requests.Session.get')
     def test_emulate_geocode_country(self, mock_get):
         result = emulate_geocode_country('HK')
@@ -915,6 +1125,43 @@ class GeographicUtilityFunctionsTests(AdditionalAsserts, TestCase):
     def test_bufferize_country_boundaries_unknown(self):
         self.assertIsNone(bufferize_country_boundaries('XYZ'))
 
+    def test_great_circle_distance(self):
+        test_data = (
+            ((4.47917, 51.9225, 4.47917, 51.9225), 0),
+            ((0, 0, 1, 0), 111195),
+            ((4.47917, 51.9225, 4.89707, 52.377956), 58119),
+            ((-179.5, 10, 179.5, 10), 109500),
+            ((0, 90, 0, -90), 20015114),
+        )
+        for points, expected_distance in test_data:
+            with self.subTest(points=points):
+                self.assertAlmostEqual(great_circle_distance(*points), expected_distance, delta=200)
+
+    def test_bounding_boxes_for_radius(self):
+        # A circle around a point near the equator.
+        boxes = bounding_boxes_for_radius(10, 0, 111195)
+        self.assertEqual(len(boxes), 1)
+        self.assertEqual(boxes[0].srid, SRID)
+        for coord, expected_coord in zip(boxes[0].extent, (9, -1, 11, 1)):
+            self.assertAlmostEqual(coord, expected_coord, places=3)
+        # At higher latitudes, the longitudinal extent is expected to widen.
+        boxes = bounding_boxes_for_radius(10, 60, 111195)
+        self.assertEqual(len(boxes), 1)
+        self.assertAlmostEqual(boxes[0].extent[1], 59, places=3)
+        self.assertAlmostEqual(boxes[0].extent[3], 61, places=3)
+        self.assertGreater(boxes[0].extent[2] - 10, 1.99)
+        self.assertLess(boxes[0].extent[2] - 10, 2.1)
+        # A box crossing the antimeridian is expected to be split.
+        boxes = bounding_boxes_for_radius(179.5, -17, 111195)
+        self.assertEqual(len(boxes), 2)
+        self.assertEqual(boxes[0].extent[2], 180)
+        self.assertEqual(boxes[1].extent[0], -180)
+        self.assertAlmostEqual(boxes[1].extent[2], -179.4544, places=3)
+        # A circle enclosing a pole, or half of the globe, is expected to
+        # result in no bounding box.
+        self.assertIsNone(bounding_boxes_for_radius(0, 89.5, 111195))
+        self.assertIsNone(bounding_boxes_for_radius(0, 0, 10100000))
+
     def test_bufferize_country_boundaries(self):
         country = random.choice(list(geodata.COUNTRIES_GEO))
         with self.subTest(country=country):
@@ -926,6 +1173,192 @@ class GeographicUtilityFunctionsTests(AdditionalAsserts, TestCase):
             self.assertEqual(res['center'], geodata.COUNTRIES_GEO[country]['center'])
 
 
+@tag('utils')
+class IPLocationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.database_dir = tempfile.TemporaryDirectory()
+        cls.database_path = os.path.join(cls.database_dir.name, 'ip_ranges.db')
+        RangeDatabase.write(cls.database_path, [
+            ("5.0.0.0", "5.0.255.255", ("NL", "Zuid-Holland", "Rotterdam", 51.9225, 4.47917)),
+            ("2.16.0.0", "2.16.3.255", ("GL", "", "", None, None)),
+            ("5.1.0.0", "5.1.0.255", ("NL", "Zuid-Holland", "Rotterdam", 51.9225, 4.47917)),
+            ("2a02:1:2::", "2a02:1:2:ffff:ffff:ffff:ffff:ffff", ("CA", "Saskatchewan", "", None, None)),
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database_dir.cleanup()
+        super().tearDownClass()
+
+    def test_range_database_lookup(self):
+        database = RangeDatabase(self.database_path)
+        self.assertEqual(database.size, 4)
+        test_data = (
+            ("5.0.0.0", IPLocation("NL", "Zuid-Holland", "Rotterdam", 51.9225, 4.47917)),
+            ("5.0.18.27", IPLocation("NL", "Zuid-Holland", "Rotterdam", 51.9225, 4.47917)),
+            ("5.0.255.255", IPLocation("NL", "Zuid-Holland", "Rotterdam", 51.9225, 4.47917)),
+            ("5.1.0.128", IPLocation("NL", "Zuid-Holland", "Rotterdam", 51.9225, 4.47917)),
+            (" 2.16.2.1 ", IPLocation("GL")),
+            ("2a02:1:2::18", IPLocation("CA", "Saskatchewan")),
+            ("1.1.1.1", UNKNOWN_LOCATION),
+            ("5.0.256.0", None),
+            ("5.1.1.0", UNKNOWN_LOCATION),
+            ("200.0.0.1", UNKNOWN_LOCATION),
+            ("2a02:1:3::", UNKNOWN_LOCATION),
+        )
+        for ip_address, expected_location in test_data:
+            with self.subTest(ip=ip_address):
+                if expected_location is None:
+                    with self.assertRaises(ValueError):
+                        database.lookup(ip_address)
+                else:
+                    self.assertEqual(database.lookup(ip_address), expected_location)
+        self.assertEqual(database.lookup("5.0.0.1").address, "Rotterdam, Zuid-Holland, NL")
+        self.assertEqual(database.lookup("5.0.0.1").xy, [4.47917, 51.9225])
+        self.assertIsNone(database.lookup("2.16.0.1").point)
+
+    def test_range_database_backend(self):
+        backend = RangeDatabaseBackend(self.database_path, cache_size=2)
+        self.assertEqual(backend.locate("5.0.0.1").country, "NL")
+        self.assertEqual(backend.locate("5.0.0.1").country, "NL")
+        self.assertEqual(backend.locate.cache_info().hits, 1)
+        self.assertIsNone(backend.locate("not an IP address"))
+        # A missing database is expected to result in no information.
+        backend = RangeDatabaseBackend(os.path.join(self.database_dir.name, 'missing.db'))
+        self.assertIsNone(backend.locate("5.0.0.1"))
+
+    @patch('maps.geoip.geocoder.ip')
+    def test_locate_ip(self, mock_geoip):
+        mock_geoip.return_value.ok = mock_geoip.return_value.current_result.ok = True
+        mock_geoip.return_value.country = 'AQ'
+        mock_geoip.return_value.state = None
+        mock_geoip.return_value.city = None
+        mock_geoip.return_value.latlng = [-77.85, 166.67]
+        get_backends.cache_clear()
+        self.addCleanup(get_backends.cache_clear)
+
+        with override_settings(
+                IP_LOCATION_BACKENDS=['maps.geoip.RangeDatabaseBackend'],
+                IP_LOCATION_DATABASE=self.database_path):
+            get_backends.cache_clear()
+            self.assertEqual(locate_ip("5.0.0.1").country, "NL")
+            # When the remote service is not configured, it is not expected
+            # to be consulted for the unknown addresses.
+            self.assertFalse(locate_ip("1.1.1.1").ok)
+            self.assertFalse(locate_ip("").ok)
+            mock_geoip.assert_not_called()
+
+        with override_settings(
+                IP_LOCATION_BACKENDS=['maps.geoip.RangeDatabaseBackend', 'maps.geoip.RemoteServiceBackend'],
+                IP_LOCATION_DATABASE=self.database_path,
+                CACHES=settings.TEST_CACHES):
+            get_backends.cache_clear()
+            self.assertEqual(locate_ip("5.0.0.1").country, "NL")
+            mock_geoip.assert_not_called()
+            location = locate_ip("1.1.1.1")
+            mock_geoip.assert_called_once_with("1.1.1.1")
+            self.assertEqual(location, IPLocation("AQ", latitude=-77.85, longitude=166.67))
+            # An unavailable remote service is expected to result in an unknown location.
+            mock_geoip.reset_mock()
+            mock_geoip.side_effect = HTTPConnectionError("Failed to establish a new connection.")
+            with self.assertLogs('PasportaServo.geo', level='WARNING'):
+                self.assertFalse(locate_ip("1.1.1.1").ok)
+
+    def test_get_client_ip(self):
+        request = RequestFactory().get('/', HTTP_X_REAL_IP="5.0.0.1")
+        self.assertEqual(get_client_ip(request), "188.166.58.162")
+        with override_settings(ENVIRONMENT='PROD'):
+            self.assertEqual(get_client_ip(request), "5.0.0.1")
+            self.assertEqual(get_client_ip(RequestFactory().get('/')), "")
+
+
+@tag('utils')
+class PwnedPasswordsTests(AdditionalAsserts, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.database_dir = tempfile.TemporaryDirectory()
+        cls.database_path = os.path.join(cls.database_dir.name, 'hashes.db')
+        HashDatabase.write(cls.database_path, [
+            ("0000000A1B2C3D4E5F60718293A4B5C6D7E8F901", 3),
+            ("907560037A46DA96ED9243AA3C0F328E59F7230A", 5),
+            ("90756455901A589F33D5EC929257DAC716133E29", 17000),
+            ("9075F5679F473CE6B5ED41A00166519D09808CD5", 1),
+            ("907600000000000000000000000000000000000B", 2),
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database_dir.cleanup()
+        super().tearDownClass()
+
+    def test_hash_database_range(self):
+        database = HashDatabase(self.database_path)
+        self.assertEqual(database.size, 5)
+        self.assertEqual(
+            database.get_range("90756"),
+            "0037A46DA96ED9243AA3C0F328E59F7230A:5\n"
+            "455901A589F33D5EC929257DAC716133E29:17000"
+        )
+        self.assertEqual(database.get_range("9075F"), "5679F473CE6B5ED41A00166519D09808CD5:1")
+        self.assertEqual(database.get_range("00000"), "00A1B2C3D4E5F60718293A4B5C6D7E8F901:3")
+        self.assertEqual(database.get_range("90757"), "")
+        self.assertEqual(database.get_range("FFFFF"), "")
+
+    def test_hash_database_unsorted(self):
+        with self.assertRaises(ValueError):
+            HashDatabase.write(os.path.join(self.database_dir.name, 'unsorted.db'), [
+                ("907600000000000000000000000000000000000B", 2),
+                ("0000000A1B2C3D4E5F60718293A4B5C6D7E8F901", 3),
+            ])
+
+    @patch('core.pwned_passwords.requests.Session.get')
+    def test_backends(self, mock_get):
+        get_pwned_passwords_backends.cache_clear()
+        self.addCleanup(get_pwned_passwords_backends.cache_clear)
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.text = "0000000000000000000000000000000000F:0"
+
+        with override_settings(
+                PWNED_PASSWORDS_BACKENDS=[
+                    'core.pwned_passwords.HashDatabaseBackend',
+                    'core.pwned_passwords.RemoteServiceBackend',
+                ],
+                PWNED_PASSWORDS_DATABASE=self.database_path):
+            get_pwned_passwords_backends.cache_clear()
+            # The password "esperanto" has the hash 90756455901A589F33D5EC...
+            self.assertEqual(is_password_compromised("esperanto"), (True, 17000))
+            self.assertEqual(is_password_compromised("Zamenhof1887"), (False, 0))
+            # The remote service is expected not to be consulted when the local
+            # database is available.
+            mock_get.assert_not_called()
+
+        with override_settings(
+                PWNED_PASSWORDS_BACKENDS=[
+                    'core.pwned_passwords.HashDatabaseBackend',
+                    'core.pwned_passwords.RemoteServiceBackend',
+                ],
+                PWNED_PASSWORDS_DATABASE=os.path.join(self.database_dir.name, 'missing.db'),
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            get_pwned_passwords_backends.cache_clear()
+            self.assertEqual(get_pwned_passwords_range("abcde"), "0000000000000000000000000000000000F:0")
+            self.assertEqual(get_pwned_passwords_range("ABCDE"), "0000000000000000000000000000000000F:0")
+            # The range is expected to be requested once and then to be reused.
+            mock_get.assert_called_once()
+            self.assertEndsWith(mock_get.call_args.args[0], '/range/ABCDE')
+            # An unavailable remote service is expected to result in no range.
+            mock_get.side_effect = HTTPConnectionError("Failed to establish a new connection.")
+            with self.assertLogs('PasportaServo.auth', level='WARNING'):
+                self.assertIsNone(get_pwned_passwords_range("12345"))
+                self.assertEqual(is_password_compromised("Zamenhof1887"), (None, None))
+
+    def test_backend_without_database(self):
+        backend = HashDatabaseBackend(os.path.join(self.database_dir.name, 'missing.db'))
+        self.assertIsNone(backend.get_range("90756"))
+
+
 @tag('utils')
 class MassMailTests(AdditionalAsserts, TestCase):
     def test_empty_list(self):
@@ -1049,6 +1482,51 @@ class MassMailTests(AdditionalAsserts, TestCase):
             self.assertTrue(outbox_item.anymail_test_params.get('is_batch_send'))
             self.assertFalse(outbox_item.anymail_test_params.get('track_opens'))
 
+    @override_settings(**settings.TEST_EMAIL_BACKENDS['remote-test'])
+    @patch('core.utils.requests')
+    def test_bulk_sending(self, mock_requests: MagicMock):
+        mock_requests.post.return_value.json.return_value = {'TemplateId': 1887}
+        test_data = {
+            'subject': "[[news]] Saluton {nomo}",
+            'text_content': "Kara {nomo}, {age} {xyz:6!}",
+            'html_content': "<p>Kara <b>{ nomo }</b></p>",
+            'from_email': "test@ps",
+            'customizations': {
+                f"user{i}@ps ": {'nomo': f"Uzanto<{i}>"} for i in range(5)
+            },
+        }
+        test_data['customizations']["user5@ps"] = {'nomo': "Ludoviko", 'age': 58}
+
+        def esp_response(payload, message):
+            return MagicMock(status_code=200, json=MagicMock(return_value=[
+                {'ErrorCode': 0, 'Message': "OK", 'MessageID': str(i), 'To': recipient.address}
+                for i, recipient in enumerate(payload.to_emails)
+            ]))
+
+        with patch('anymail.backends.postmark.EmailBackend.post_to_esp', side_effect=esp_response) as mock_esp:
+            result = send_mass_html_mail(**test_data)
+        self.assertEqual(result, 6)
+        # A single temporary template is expected to be created and then deleted.
+        mock_requests.post.assert_called_once()
+        template = mock_requests.post.call_args.kwargs['json']
+        self.assertEqual(template['Subject'], "Saluton {{{nomo}}}")
+        self.assertEqual(template['TextBody'], "Kara {{{nomo}}}, {{{age}}} {xyz:6!}")
+        self.assertEqual(template['HtmlBody'], "<p>Kara <b>{{nomo}}</b></p>")
+        mock_requests.delete.assert_called_once()
+        self.assertTrue(mock_requests.delete.call_args.args[0].endswith('/templates/1887'))
+        # A single batch is expected to be sent, with the variables of each recipient.
+        mock_esp.assert_called_once()
+        payload = mock_esp.call_args.args[0]
+        self.assertEqual(payload.get_api_endpoint(), 'email/batchWithTemplates')
+        batch = [payload.data_for_recipient(recipient) for recipient in payload.to_emails]
+        self.assertEqual([item['To'] for item in batch], [f"user{i}@ps" for i in range(6)])
+        for item in batch:
+            self.assertEqual(item['TemplateId'], 1887)
+            self.assertEqual(item['Tag'], "news")
+            self.assertEqual(item['MessageStream'], "broadcast")
+        self.assertEqual(batch[0]['TemplateModel'], {'nomo': "Uzanto<0>", 'age': "{age}"})
+        self.assertEqual(batch[5]['TemplateModel'], {'nomo': "Ludoviko", 'age': "58"})
+
     def test_invalid_values(self):
         faker = Faker._get_faker()
         expected_subject = faker.sentence()
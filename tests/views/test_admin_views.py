@@ -604,6 +604,52 @@ class MassMailViewTests(AdministratorUserSetupMixin, FormViewTestsMixin, BasicVi
                 self.assertEqual(mailitem.to, [expected_recipients[i]._clean_email])
                 self.assertIn(expected_recipients[i].profile.first_name, mailitem.body)
 
+    def test_submit_for_shared_email(self):
+        # Accounts sharing an email address (possibly marked as invalid) are
+        # expected to result in a single email to this address, also when the
+        # recipients are handled in different batches.
+        test_users = UserFactory.create_batch(
+            4,
+            email=factory.Iterator(['x.x@esperanto.net', 'y.y@esperanto.net']),
+            username=factory.Iterator(string.ascii_uppercase),
+            invalid_email=factory.Iterator([False, False, True, False]),
+        )
+        test_data = {
+            'subject': self.faker.sentence(),
+            'preheader': self.faker.sentence(),
+            'heading': self.faker.word().capitalize() * 2,
+            'body': "Monthly update for {nomo}.",
+            'alignment': 'justify',
+            'categories': 'specified',
+            'test_email': f"Lazaro.{self.faker.email().capitalize()}",
+            'include_users': ",".join(user.username for user in test_users),
+        }
+
+        page = self.view_page.open(self, user=self.user)
+        success_task_id = self.faker.hexify('12345678^^^^^^^^^^^^abcdef123456')
+        with (
+            patch('django_q.tasks.uuid', return_value=('keke-meke', success_task_id)),
+            patch.object(self.view_page.view_class, 'batch_size', 1),
+        ):
+            page.submit(
+                {
+                    f'massmail-{key}': value for key, value in test_data.items()
+                }
+            )
+        self.assertEqual(page.response.status_code, 302)
+        expected_result_url = self.view_page.success_page.get_complete_url(
+            'via_async_task', {'task_id': success_task_id})
+        self.assertEqual(page.response.location, f'{expected_result_url}?nb=2')
+        # The email is expected to be addressed to the earliest of the profiles
+        # sharing the address.
+        self.assertEqual(
+            sorted((m.to, m.body) for m in mail.outbox),
+            [
+                (['x.x@esperanto.net'], f"Monthly update for {test_users[0].profile.first_name}."),
+                (['y.y@esperanto.net'], f"Monthly update for {test_users[1].profile.first_name}."),
+            ]
+        )
+
     @patch('core.utils.get_connection')
     def test_submit_for_invalid_email_at_esp(self, mock_get_connection: MagicMock):
         test_user = UserFactory.create(email=f"Ludoviko.L_Z-hof+{self.faker.email().capitalize()}")
@@ -0,0 +1,62 @@
+import csv
+import io
+
+from django.db import connection
+from django.test import tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_webtest import WebTest
+
+from ..factories import (
+    ConditionFactory, PhoneFactory, PlaceFactory, ProfileFactory, UserFactory,
+)
+
+
+@tag('views', 'views-book')
+class ContactExportViewTests(WebTest):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UserFactory(is_superuser=True, profile=None)
+        cls.url = reverse('contact_export')
+        cls.places = [cls.create_host() for _ in range(2)]
+
+    @classmethod
+    def create_host(cls):
+        place = PlaceFactory(available=True)
+        PhoneFactory(profile=place.owner)
+        PhoneFactory(profile=place.owner, deleted=True)
+        place.family_members.add(ProfileFactory(user=None))
+        place.conditions.add(ConditionFactory())
+        return place
+
+    def get_rows(self):
+        response = self.app.get(self.url, user=self.admin)
+        self.assertEqual(response.content_type, 'text/csv')
+        return list(csv.DictReader(io.StringIO(response.text)))
+
+    def test_contents(self):
+        rows = self.get_rows()
+        self.assertEqual(len(rows), len(self.places))
+        for place in self.places:
+            row = next(row for row in rows if row['username'] == place.owner.user.username)
+            self.assertEqual(row['city'], place.city)
+            self.assertEqual(row['phones'], place.owner.rawdisplay_phones())
+            self.assertEqual(row['family_members'], place.rawdisplay_family_members())
+            self.assertEqual(row['conditions'], place.rawdisplay_conditions())
+            self.assertEqual(row['state_province'], place.subregion.latin_code)
+            self.assertTrue(row['update_url'])
+            self.assertNotEqual(row['update_url'], row['confirm_url'])
+
+    def test_number_of_queries(self):
+        # The number of queries is not expected to depend on the number of
+        # exported hosts. (The first request warms up the per-user caches.)
+        self.get_rows()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_rows()
+        for _ in range(3):
+            self.create_host()
+        with CaptureQueriesContext(connection) as more_queries:
+            rows = self.get_rows()
+        self.assertEqual(len(rows), len(self.places) + 3)
+        self.assertEqual(len(more_queries), len(queries))
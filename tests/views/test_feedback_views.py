@@ -10,6 +10,7 @@ from django_webtest import WebTest
 from faker import Faker
 from graphql import GraphQLError
 
+from core.feedback import submit_feedback_publicly
 from core.models import FEEDBACK_TYPES
 from hosting.models import PasportaServoUser
 from tests.factories import UserFactory
@@ -19,7 +20,7 @@ from ..assertions import AdditionalAsserts
 
 
 @tag('views', 'views-feedback')
-@patch('core.views.GQLClient')
+@patch('core.feedback.StubGitHubTransport.respond')
 class FeedbackViewTests(AdditionalAsserts, WebTest):
     @classmethod
     def setUpTestData(cls):
@@ -65,7 +66,7 @@ class FeedbackViewTests(AdditionalAsserts, WebTest):
             },
         }
 
-    def test_get_method(self, mock_gql_client):
+    def test_get_method(self, mock_gql_respond):
         """
         Tests that GET requests to the feedback view are not allowed.
         """
@@ -402,90 +403,141 @@ class FeedbackViewTests(AdditionalAsserts, WebTest):
                 self.expected_strings[lang]['page_content'][None]
             )
 
-    def test_private_feedback(self, mock_gql_client: MagicMock):
+    def test_private_feedback(self, mock_gql_respond: MagicMock):
         """
         Tests that both anonymous and authenticated users can submit private feedback.
         """
         self.submission_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=True, empty_feedback=False,
         )
 
-    def test_private_empty_feedback(self, mock_gql_client: MagicMock):
+    def test_private_empty_feedback(self, mock_gql_respond: MagicMock):
         """
         Tests that empty private feedback from both anonymous and authenticated users
         is ignored (not sent to the admins).
         """
         self.submission_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=True, empty_feedback=True,
         )
 
-    def test_private_feedback_gql_error(self, mock_gql_client: MagicMock):
+    def test_private_feedback_gql_error(self, mock_gql_respond: MagicMock):
         """
         Tests that a GQL error during private submission does not influence it.
         """
-        mock_gql_client.return_value.execute.side_effect = GraphQLError("Mock Exception")
+        mock_gql_respond.side_effect = GraphQLError("Mock Exception")
         self.submission_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=True, empty_feedback=False, gql_error=True,
         )
 
-    def test_private_feedback_form_error(self, mock_gql_client: MagicMock):
+    def test_private_feedback_form_error(self, mock_gql_respond: MagicMock):
         """
         Tests that an invalid form submission is handled correctly and that the feedback
         message is truncated in the log.
         """
         self.tampering_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=True, empty_feedback=False,
         )
 
         self.tampering_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=True, empty_feedback=True,
         )
 
-    def test_public_feedback(self, mock_gql_client: MagicMock):
+    def test_public_feedback(self, mock_gql_respond: MagicMock):
         """
         Tests that both anonymous and authenticated users can submit public feedback.
         """
         self.submission_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=False, empty_feedback=False,
         )
 
-    def test_public_empty_feedback(self, mock_gql_client: MagicMock):
+    def test_public_empty_feedback(self, mock_gql_respond: MagicMock):
         """
         Tests that empty public feedback from both anonymous and authenticated users
         is ignored (not sent to the admins).
         """
         self.submission_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=False, empty_feedback=True,
         )
 
-    def test_public_feedback_gql_error(self, mock_gql_client: MagicMock):
+    def test_public_feedback_gql_error(self, mock_gql_respond: MagicMock):
         """
         Tests that a GQL error during public submission results in a private submission.
         """
-        mock_gql_client.return_value.execute.side_effect = GraphQLError("Mock Exception")
+        mock_gql_respond.side_effect = GraphQLError("Mock Exception")
         self.submission_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=False, empty_feedback=False, gql_error=True,
         )
 
-    def test_public_feedback_form_error(self, mock_gql_client: MagicMock):
+    def test_public_feedback_form_error(self, mock_gql_respond: MagicMock):
         """
         Tests that an invalid form submission is handled correctly and that the feedback
         message is truncated in the log.
         """
         self.tampering_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=False, empty_feedback=False,
         )
 
         self.tampering_scenarios_tests(
-            mock_gql_client.return_value.execute,
+            mock_gql_respond,
             private_feedback=False, empty_feedback=True,
         )
+
+    def test_public_feedback_status(self, mock_gql_respond: MagicMock):
+        """
+        Tests that the outcome of a queued public submission can be verified by
+        the same session only.
+        """
+        mock_gql_respond.return_value = {
+            'addDiscussionComment': {'comment': {'id': "DC_1887", 'url': "https://github.com/d/1"}},
+        }
+        self.app.set_user(self.user)
+        for public_error in [False, True]:
+            with self.subTest(error=public_error):
+                mock_gql_respond.side_effect = GraphQLError("Mock Exception") if public_error else None
+                response = self.perform_request_and_verify(
+                    self.faker.sentence(), 'application/json', private_feedback=False)
+                self.assertIn('status_url', response.json)
+                # The submission is expected to be completed (the tasks are
+                # performed synchronously in tests).
+                status_response = self.app.get(response.json['status_url'])
+                self.assertEqual(status_response.json['done'], True)
+                self.assertEqual(status_response.json['public'], not public_error)
+                self.assertEqual(
+                    status_response.json['url'], "https://github.com/d/1" if not public_error else None)
+                # Another session is expected to not be able to verify the outcome.
+                self.app.reset()
+                self.app.get(response.json['status_url'], user=self.user, status=404)
+
+        # A private submission is not queued and is not expected to have a status.
+        response = self.perform_request_and_verify(
+            self.faker.sentence(), 'application/json', private_feedback=True)
+        self.assertNotIn('status_url', response.json)
+
+    def test_public_feedback_previous_queued(self, mock_gql_respond: MagicMock):
+        """
+        Tests that a public submission does not wait for the previous one of the
+        same person while that one is still queued, and posts the feedback as a
+        new comment instead.
+        """
+        mock_gql_respond.return_value = {
+            'addDiscussionComment': {'comment': {'id': "DC_1905", 'url': "https://github.com/d/2"}},
+        }
+        with patch('core.feedback.fetch_task', return_value=None) as mock_fetch:
+            result = submit_feedback_publicly(
+                self.feedback_type, self.faker.sentence(),
+                author="Anonymous", signature="Sent from the tests", language='en',
+                previous_task_id=self.faker.hexify('^' * 32))
+        mock_fetch.assert_called_once()
+        self.assertEqual(result, {'comment_id': "DC_1905", 'url': "https://github.com/d/2"})
+        mock_gql_respond.assert_called_once()
+        self.assertEqual(getattr(mock_gql_respond.call_args.args[0], 'operation'), 'addDiscussionComment')
+        self.assertLength(mail.outbox, 0)
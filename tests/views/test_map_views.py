@@ -0,0 +1,158 @@
+import gzip
+import json
+import tempfile
+
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.test import override_settings, tag
+from django.urls import reverse
+
+from django_webtest import WebTest
+
+from maps import SRID
+from maps.world_map import world_map_is_materialized
+
+from ..factories import PlaceFactory, ProfileFactory, UserFactory
+
+
+@tag('views', 'views-maps')
+class WorldMapDataViewTests(WebTest):
+    @classmethod
+    def setUpTestData(cls):
+        cls.place_public = PlaceFactory(owner=ProfileFactory(first_name="Zamenhof"))
+        cls.place_unnamed = PlaceFactory(owner=ProfileFactory(first_name=""))
+        cls.place_unlisted = PlaceFactory()
+        cls.place_unlisted.owner.pref.public_listing = False
+        cls.place_unlisted.owner.pref.save()
+        for place in (cls.place_public, cls.place_unnamed, cls.place_unlisted):
+            place.visibility.visible_online_public = True
+            place.visibility.save()
+        cls.user = UserFactory()
+        cls.url = reverse('world_map_public_data')
+
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        settings_override = override_settings(WORLD_MAP_DATA_DIR=data_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def get_features(self, response):
+        return {feature['id']: feature for feature in json.loads(response.body)['features']}
+
+    def test_variants(self):
+        self.assertFalse(world_map_is_materialized())
+        response = self.app.get(self.url)
+        self.assertTrue(world_map_is_materialized())
+        self.assertEqual(response.content_type, 'application/geo+json')
+        features = self.get_features(response)
+        self.assertEqual(set(features), {self.place_public.pk, self.place_unnamed.pk})
+        self.assertEqual(features[self.place_public.pk]['properties']['owner_name'], "Zamenhof")
+        self.assertEqual(features[self.place_unnamed.pk]['properties']['owner_name'], "Anonimo")
+        self.assertNotIn('city', features[self.place_public.pk]['properties'])
+        self.assertEqual(
+            features[self.place_public.pk]['properties']['url'], self.place_public.get_absolute_url())
+
+        response = self.app.get(self.url, user=self.user)
+        features = self.get_features(response)
+        self.assertEqual(
+            set(features), {self.place_public.pk, self.place_unnamed.pk, self.place_unlisted.pk})
+        self.assertEqual(features[self.place_public.pk]['properties']['city'], self.place_public.city)
+
+    def test_etag_and_compression(self):
+        response = self.app.get(self.url)
+        etag = response.headers['ETag']
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        response = self.app.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        # The authenticated variant is expected to have a different tag.
+        response = self.app.get(self.url, user=self.user, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.app.reset()
+
+        response = self.app.get(self.url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            set(feature['id'] for feature in json.loads(gzip.decompress(response.body))['features']),
+            {self.place_public.pk, self.place_unnamed.pk}
+        )
+
+    def test_incremental_update(self):
+        response = self.app.get(self.url)
+        etag = response.headers['ETag']
+
+        # Hiding a place is expected to remove it from the materialized map.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place_unnamed.visibility.visible_online_public = False
+            self.place_unnamed.visibility.save()
+        response = self.app.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(set(self.get_features(response)), {self.place_public.pk})
+
+        # Renaming the owner is expected to update the features of their places.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place_public.owner.first_name = "Ludoviko"
+            self.place_public.owner.save()
+        features = self.get_features(self.app.get(self.url))
+        self.assertEqual(features[self.place_public.pk]['properties']['owner_name'], "Ludoviko")
+
+
+@tag('views', 'views-maps')
+class WorldMapTileViewTests(WebTest):
+    @classmethod
+    def setUpTestData(cls):
+        cls.places_nearby = [
+            PlaceFactory(country='NL', location=Point(5.10, 52.10, srid=SRID)),
+            PlaceFactory(country='NL', location=Point(5.12, 52.11, srid=SRID)),
+        ]
+        cls.place_far = PlaceFactory(country='BR', location=Point(-47.88, -15.79, srid=SRID))
+        for place in cls.places_nearby + [cls.place_far]:
+            place.visibility.visible_online_public = True
+            place.visibility.save()
+
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        settings_override = override_settings(WORLD_MAP_DATA_DIR=data_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def get_tile(self, zoom, x, y, **kwargs):
+        url = reverse('world_map_public_tile', kwargs={'zoom': zoom, 'x': x, 'y': y})
+        return json.loads(self.app.get(url, **kwargs).body)['features']
+
+    def test_clustering(self):
+        # At the lowest zoom level, the nearby places are expected to be
+        # clustered and the far away place to be kept as is.
+        features = self.get_tile(0, 0, 0)
+        self.assertEqual(len(features), 2)
+        cluster = next(feature for feature in features if feature['properties'].get('cluster'))
+        self.assertEqual(cluster['properties']['point_count'], 2)
+        self.assertAlmostEqual(cluster['geometry']['coordinates'][0], 5.11, places=2)
+        place = next(feature for feature in features if not feature['properties'].get('cluster'))
+        self.assertEqual(place['id'], self.place_far.pk)
+        self.assertIn('owner_name', place['properties'])
+
+        # At the highest zoom level, the nearby places are expected to be in
+        # distinct tiles (of about 1 km).
+        features = self.get_tile(15, 16848, 10808) + self.get_tile(15, 16850, 10807)
+        self.assertEqual(
+            set(feature['id'] for feature in features),
+            set(place.pk for place in self.places_nearby)
+        )
+        self.assertEqual(self.get_tile(15, 0, 0), [])
+
+    def test_nonexistent_tiles(self):
+        for zoom, x, y in [(16, 0, 0), (1, 2, 0), (1, 0, 2)]:
+            with self.subTest(tile=f'{zoom}/{x}/{y}'):
+                url = reverse('world_map_public_tile', kwargs={'zoom': zoom, 'x': x, 'y': y})
+                self.app.get(url, status=404)
+
+    def test_etag(self):
+        url = reverse('world_map_public_tile', kwargs={'zoom': 1, 'x': 1, 'y': 0})
+        response = self.app.get(url)
+        response = self.app.get(url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
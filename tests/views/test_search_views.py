@@ -0,0 +1,128 @@
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.test import TestCase, override_settings, tag
+from django.urls import reverse
+
+from django_webtest import WebTest
+
+from hosting.models import Place
+from hosting.views.listing import CachedSearchResults, SearchView
+from maps import SRID
+
+from ..factories import PlaceFactory, UserFactory
+
+
+@tag('views', 'views-search')
+class SearchResultsCacheTests(WebTest):
+    @classmethod
+    def setUpTestData(cls):
+        cls.places = [PlaceFactory(country='NL') for _ in range(3)]
+        PlaceFactory(country='BE')
+        cls.user = UserFactory()
+        cls.search_url = reverse('search', kwargs={'query': 'countrycode:NL'})
+
+    @classmethod
+    def make_visible(cls, place):
+        place.visibility.visible_online_public = True
+        place.visibility.save()
+        return place
+
+    def setUp(self):
+        cache.clear()
+        for place in self.places:
+            self.make_visible(place)
+
+    def test_results_shared_within_tier(self):
+        page = self.app.get(self.search_url)
+        cache_id = page.context['queryset_cache_id']
+        self.assertIsInstance(page.context['object_list'], CachedSearchResults)
+        self.assertEqual(
+            set(place.pk for place in page.context['object_list']),
+            set(place.pk for place in self.places)
+        )
+
+        # The same search by another unauthenticated visitor is expected to
+        # reuse the stored results (thus, not include a newly added place).
+        new_place = self.make_visible(PlaceFactory(country='NL'))
+        self.app.reset()
+        page = self.app.get(self.search_url)
+        self.assertEqual(page.context['queryset_cache_id'], cache_id)
+        self.assertEqual(len(page.context['object_list']), 3)
+
+        # The same search by an authenticated user is expected to be stored
+        # separately.
+        page = self.app.get(self.search_url, user=self.user)
+        self.assertNotEqual(page.context['queryset_cache_id'], cache_id)
+        self.assertIn(new_place.pk, [place.pk for place in page.context['object_list']])
+
+    def test_paging_by_cache_id(self):
+        page = self.app.get(self.search_url, user=self.user)
+        cache_id = page.context['queryset_cache_id']
+        expected_order = [place.pk for place in page.context['object_list']]
+
+        paging_url = reverse('search', kwargs={'cache': cache_id})
+        page = self.app.get(paging_url, user=self.user)
+        self.assertEqual([place.pk for place in page.context['object_list']], expected_order)
+
+        # A place hidden in the meanwhile is expected to be skipped.
+        self.places[0].visibility.visible_online_public = False
+        self.places[0].visibility.save()
+        page = self.app.get(paging_url, user=self.user)
+        self.assertNotIn(self.places[0].pk, [place.pk for place in page.context['object_list']])
+
+        # The results are not expected to be available for a visitor of
+        # another tier, nor once they expire.
+        self.app.reset()
+        page = self.app.get(paging_url)
+        self.assertEqual(len(page.context['object_list']), 0)
+        cache.clear()
+        page = self.app.get(paging_url, user=self.user)
+        self.assertEqual(len(page.context['object_list']), 0)
+
+
+@tag('views', 'views-search')
+@override_settings(SEARCH_DISTANCE_PREFILTER_RADIUS=50000)
+class NearestPlacesSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Places at growing distances (of about 11 km per step) to the east of
+        # the searched point, listed in random order.
+        cls.point = Point(5, 52, srid=SRID)
+        cls.places = {
+            step: PlaceFactory(location=Point(5 + step * 0.16, 52, srid=SRID))
+            for step in (7, 1, 12, 4, 9, 0, 3, 11, 2, 8, 10, 6, 5)
+        }
+
+    def test_remaining_places_by_page(self):
+        view = SearchView()
+        view.paginate_first_by = 3
+        queryset = Place.objects.filter(pk__in=[p.pk for p in self.places.values()])
+        places, remaining = view.find_nearest_places(queryset, self.point)
+        # The places within the radius are expected to be known in advance,
+        # ordered by their distance.
+        self.assertEqual([pk for pk, _ in places], [self.places[step].pk for step in range(5)])
+        self.assertEqual(remaining, {'point': [5.0, 52.0], 'start': 5, 'count': 13})
+
+        stored = []
+        results = CachedSearchResults(
+            queryset, places, 'distance', remaining, lambda: stored.append(True),
+            lambda remaining, known_place_ids: view.nearest_places_queryset(
+                queryset, Point(*remaining['point'], srid=SRID), known_place_ids),
+        )
+        self.assertEqual(len(results), 13)
+        # The following places are expected to be retrieved only when needed,
+        # limited to the requested page.
+        with self.assertNumQueries(2):
+            page = results[5:8]
+        self.assertEqual([place.pk for place in page], [self.places[step].pk for step in range(5, 8)])
+        self.assertEqual(len(results.places), 8)
+        self.assertEqual(len(stored), 1)
+        with self.assertNumQueries(1):
+            results[0:8]
+        self.assertEqual(len(stored), 1)
+        # The last places are expected to complete the results.
+        self.assertEqual(
+            [place.pk for place in results],
+            [self.places[step].pk for step in range(13)])
+        self.assertEqual(results.remaining, {})
+        self.assertEqual(len(results), 13)
@@ -4,16 +4,24 @@ from random import sample
 from unittest.mock import MagicMock, patch
 
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
 from django.http import Http404
 from django.test import RequestFactory, override_settings, tag
-from django.urls import NoReverseMatch, reverse_lazy
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse, reverse_lazy
 from django.utils.timezone import make_aware
 
 from django_countries.data import COUNTRIES
+from django_webtest import WebTest
 from django_webtest.backends import WebtestUserBackend
 from factory import Faker
 from waffle.testutils import override_switch
 
+from core.auth import (
+    AuthorizationContext, SupervisorAuthBackend,
+    authorization_request_finished, authorization_request_started,
+)
 from hosting.models import TrackingModel
 from hosting.views.verification import InfoStaffCheckStatusDisplayView
 
@@ -225,3 +233,116 @@ class InfoStaffCheckStatusDisplayViewTests(ViewAsserts, ViewTestingBase):
                         self.assertEqual(response.status_code, 404)
                         self.assertEqual(response.content_type, 'application/json')
                         self.assertEqual(response.body, b"")
+
+
+@tag('views', 'views-supervisor')
+@override_settings(
+    WEBTEST_AUTHENTICATION_BACKEND=(
+        'tests.views.test_supervisor_views.WebtestUserPassthroughBackend'
+    ),
+)
+class SupervisorAuthorizationQueriesTests(WebTest):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supervisor = UserFactory()
+        Group.objects.get_or_create(name='NL')[0].user_set.add(cls.supervisor)
+        cls.other_supervisor = UserFactory()
+        Group.objects.get_or_create(name='BE')[0].user_set.add(cls.other_supervisor)
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def make_place(country='NL'):
+        place = PlaceFactory(country=country)
+        place.visibility.visible_online_public = True
+        place.visibility.save()
+        return place
+
+    def get_authorization_queries(self, url, user):
+        with CaptureQueriesContext(connection) as context:
+            self.app.get(url, user=user)
+        return {
+            'supervised_countries': sum(
+                query['sql'].startswith('SELECT "auth_group"."id", "auth_group"."name" FROM "auth_group"')
+                for query in context.captured_queries
+            ),
+            'profile_countries': sum(
+                query['sql'].startswith('SELECT "hosting_place"."owner_id", "hosting_place"."country"')
+                for query in context.captured_queries
+            ),
+        }
+
+    def test_resolution_of_profiles(self):
+        owners = [self.make_place(country).owner for country in ('NL', 'BE', 'NL')]
+        PlaceFactory(owner=owners[1], country='FR')
+        family_member = ProfileFactory()
+        authorization_context = AuthorizationContext()
+        authorization_context.prefetch_profiles(owners + [family_member])
+        with self.assertNumQueries(1):
+            self.assertEqual(authorization_context.get_profile_countries(owners[0]), {'NL'})
+            self.assertEqual(authorization_context.get_profile_countries(owners[1]), {'BE', 'FR'})
+            self.assertEqual(authorization_context.get_profile_countries(owners[2]), {'NL'})
+            self.assertEqual(authorization_context.get_profile_countries(family_member), set())
+
+        # A change of the places of a profile is expected to be taken into
+        # account within the same request.
+        authorization_request_started()
+        self.addCleanup(authorization_request_finished)
+        backend = SupervisorAuthBackend()
+        with self.assertNumQueries(2):
+            self.assertFalse(backend.is_user_supervisor_of(self.supervisor, owners[1]))
+            self.assertFalse(backend.is_user_supervisor_of(self.supervisor, owners[1]))
+        PlaceFactory(owner=owners[1], country='NL')
+        self.assertTrue(backend.is_user_supervisor_of(self.supervisor, owners[1]))
+
+    def test_staff_place_list(self):
+        url = reverse('staff_place_list', kwargs={'country_code': 'NL'})
+        for _ in range(2):
+            self.make_place()
+        self.assertEqual(
+            self.get_authorization_queries(url, self.supervisor),
+            {'supervised_countries': 1, 'profile_countries': 0}
+        )
+        for _ in range(3):
+            self.make_place()
+        self.assertEqual(
+            self.get_authorization_queries(url, self.supervisor),
+            {'supervised_countries': 1, 'profile_countries': 0}
+        )
+
+    def test_supervisors_list(self):
+        url = reverse('supervisors')
+        for country in ('NL', 'BE', 'FR', 'DE'):
+            self.make_place(country)
+        for user in (self.supervisor, self.other_supervisor):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    self.get_authorization_queries(url, user),
+                    {'supervised_countries': 1, 'profile_countries': 0}
+                )
+
+    def test_place_family_members(self):
+        # The supervision of each of the family members is verified when the
+        # place is viewed by a supervisor of another country; the countries of
+        # all family members are expected to be resolved at once.
+        place = self.make_place()
+        place.family_members_visibility.visible_online_public = True
+        place.family_members_visibility.save()
+        place.family_members.add(*[UserFactory().profile for _ in range(3)])
+        queries = self.get_authorization_queries(place.get_absolute_url(), self.other_supervisor)
+        self.assertEqual(queries, {'supervised_countries': 1, 'profile_countries': 1})
+
+    def test_profile_edit_family_members(self):
+        # The supervision of each of the family members of a place in another
+        # country is verified when the profile is edited by a supervisor; the
+        # countries of all family members are expected to be resolved at once
+        # (after those of the profile itself, verified for the access).
+        profile = self.make_place('NL').owner
+        place = PlaceFactory(owner=profile, country='BE')
+        place.family_members.add(*[UserFactory().profile for _ in range(3)])
+        queries = self.get_authorization_queries(profile.get_edit_url(), self.supervisor)
+        self.assertEqual(queries, {'supervised_countries': 1, 'profile_countries': 2})
+        place.family_members.add(*[UserFactory().profile for _ in range(2)])
+        queries = self.get_authorization_queries(profile.get_edit_url(), self.supervisor)
+        self.assertEqual(queries, {'supervised_countries': 1, 'profile_countries': 2})